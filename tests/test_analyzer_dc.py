@@ -1,9 +1,10 @@
 #! /usr/bin/env python
 
 from unit_timeside import *
-from timeside.decoder import FileDecoder
+from timeside.decoder import FileDecoder, ArrayDecoder
 from timeside.analyzer.dc import MeanDCShift
 import os
+import numpy as np
 
 class TestAnalyzerDC(unittest.TestCase):
 
@@ -28,5 +29,25 @@ class TestAnalyzerDC(unittest.TestCase):
         for key in self.expected.keys():
             self.assertEquals(results[key].data_object.value, self.expected[key])
 
+
+class TestAnalyzerDCFramewise(unittest.TestCase):
+
+    def testFramewise(self):
+        "returns the DC shift of each block"
+        samples = np.random.randn(44100 * 4, 2) / 4 + 0.01
+        blocks = [samples[index:index + 4096]
+                  for index in range(0, len(samples), 4096)]
+        analyzer = MeanDCShift(framewise=True)
+        (ArrayDecoder(samples) | analyzer).run(blocksize=4096)
+        results = analyzer.results
+
+        means = np.array([0] + [np.mean(b) for b in blocks])
+        self.assertAlmostEqual(results['mean_dc_shift'].data_object.value,
+                               np.round(np.mean(100 * means), 3))
+        self.assertTrue(np.array_equal(
+            results['mean_dc_shift.framewise'].data_object.value,
+            np.round(100 * means[1:], 3)))
+
+
 if __name__ == '__main__':
     unittest.main(testRunner=TestRunner())
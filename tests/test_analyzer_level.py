@@ -3,6 +3,7 @@
 from unit_timeside import *
 from timeside.decoder import *
 from timeside.analyzer.level import Level
+import numpy as np
 
 class TestAnalyzerLevel(unittest.TestCase):
 
@@ -39,5 +40,44 @@ class TestAnalyzerLevel(unittest.TestCase):
         #print results.to_json()
         #print results.to_xml()
 
+
+class TestAnalyzerLevelFramewise(unittest.TestCase):
+
+    def testFramewise(self):
+        "returns the levels of each block"
+        samples = np.random.randn(44100 * 4, 2) / 4
+        blocks = [samples[index:index + 4096]
+                  for index in range(0, len(samples), 4096)]
+        analyzer = Level(framewise=True)
+        (ArrayDecoder(samples) | analyzer).run(blocksize=4096)
+        results = analyzer.results
+
+        mean_squares = np.array([np.mean(np.square(b)) for b in blocks])
+        maxs = np.array([b.max() for b in blocks])
+        self.assertEquals(results['level.rms'].data_object.value,
+                          np.round(10*np.log10(np.mean(mean_squares)), 3))
+        self.assertEquals(results['level.max'].data_object.value,
+                          np.round(20*np.log10(maxs.max()), 3))
+        self.assertTrue(np.array_equal(
+            results['level.rms_framewise'].data_object.value,
+            np.round(10*np.log10(mean_squares), 3)))
+        self.assertTrue(np.array_equal(
+            results['level.max_framewise'].data_object.value,
+            np.round(20*np.log10(maxs), 3)))
+
+
+class TestAnalyzerLevelEmpty(unittest.TestCase):
+
+    def testEmpty(self):
+        "runs on an empty source"
+        decoder = ArrayDecoder(np.zeros((0, 2), dtype='float32'))
+        analyzer = Level()
+        (decoder | analyzer).run()
+        self.assertEqual(analyzer.results['level.max'].data_object.value,
+                         -np.inf)
+        self.assertTrue(np.isnan(
+            analyzer.results['level.rms'].data_object.value))
+
+
 if __name__ == '__main__':
     unittest.main(testRunner=TestRunner())
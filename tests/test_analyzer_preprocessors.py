@@ -4,7 +4,9 @@
 
 from unit_timeside import *
 from timeside.decoder import *
-from timeside.analyzer.preprocessors import downmix_to_mono, frames_adapter
+from timeside.analyzer.spectrogram import Spectrogram
+from timeside.analyzer.preprocessors import downmix_to_mono, frames_adapter, \
+    batch_frames_adapter, subscribe_preprocessors
 import numpy as np
 
 BLOCKSIZE = 1024
@@ -144,5 +146,96 @@ class TestFramesAdapter(TestAnalyzerPreProcessors, unittest.TestCase):
                                           np.arange(2560, 4608).reshape(-1, 2),
                                           last_frames])
 
+
+class TestBatchFramesAdapter(unittest.TestCase):
+
+    def setUp(self):
+        self.analyzer = FakeAnalyzer()
+        self.process = batch_frames_adapter(FakeAnalyzer.process)
+
+    def test_on_mono_eod_true(self):
+        "Pass the frames of each block at once, last eod = True"
+        input_frames = np.arange(0, 2500).reshape(5, -1)
+        for index, frames in enumerate(input_frames):
+            self.process(self.analyzer, frames, index == 4)
+        # no frame is complete in the first two blocks
+        self.assertEqual([len(frames) for frames in self.analyzer.frames],
+                         [2, 2, 3])
+        expected = np.concatenate([np.arange(0, 2500), np.zeros(60)])
+        for index, frames in enumerate(np.concatenate(self.analyzer.frames)):
+            self.assertEqual(frames.tolist(),
+                             expected[index * 256:index * 256 + 1024].tolist())
+
+    def test_on_stereo(self):
+        "Pass strided views of the stereo frames"
+        frames = np.arange(0, 5000).reshape(-1, 2)
+        self.process(self.analyzer, frames, False)
+        adapted_frames = self.analyzer.frames[0]
+        self.assertEqual(adapted_frames.shape, (6, 1024, 2))
+        self.assertFalse(adapted_frames.flags.owndata)
+        self.assertEqual(adapted_frames[5].tolist(),
+                         frames[1280:2304].tolist())
+
+class TestSharedPreprocessors(unittest.TestCase):
+
+    def setUp(self):
+        self.samples = np.random.randn(44100 * 2, 2)
+
+    def run_pipe(self, threads=None):
+        first = Spectrogram(blocksize=2048, stepsize=1024)
+        second = Spectrogram(blocksize=2048, stepsize=1024)
+        other = Spectrogram(blocksize=1024, stepsize=512)
+        pipe = ArrayDecoder(self.samples, 44100) | first | second | other
+        pipe.run(threads=threads)
+        return pipe, first, second, other
+
+    def test_shared_nodes(self):
+        "Share the downmix and the framing of identical analyzers"
+        pipe, first, second, other = self.run_pipe()
+        # one downmix, one framing per blocksize and stepsize
+        self.assertEqual(len(pipe._nodes), 3)
+        self.assertIs(first.preprocessing_nodes['framing'].node,
+                      second.preprocessing_nodes['framing'].node)
+        self.assertIsNot(first.preprocessing_nodes['framing'].node,
+                         other.preprocessing_nodes['framing'].node)
+        self.assertIs(first.preprocessing_nodes['downmix'].node,
+                      other.preprocessing_nodes['downmix'].node)
+        first_data = first.values.array
+        expected = np.abs(np.fft.rfft(self.samples[1024:3072].mean(axis=-1)))
+        self.assertTrue(np.allclose(first_data[1], expected))
+        self.assertTrue(np.array_equal(first_data, second.values.array))
+
+    def test_threads(self):
+        "Share the preprocessing between processors run in threads"
+        pipe, first, second, other = self.run_pipe(threads=True)
+        self.assertTrue(np.array_equal(first.values.array,
+                                       second.values.array))
+
+    def test_read_only(self):
+        "Hand read-only frames to the subscribers"
+        frames = np.random.randn(4096, 2)
+        analyzer = FakeAnalyzer()
+        downmix_to_mono(frames_adapter(FakeAnalyzer.process))(
+            analyzer, frames, False)
+        self.assertTrue(frames.flags.writeable)
+        self.assertFalse(analyzer.frames[0].flags.writeable)
+
+    def test_keys(self):
+        "Key the nodes on the parameters of the nodes feeding them"
+        keys = []
+
+        class FramedAnalyzer(FakeAnalyzer):
+            process = frames_adapter(downmix_to_mono(FakeAnalyzer.process))
+
+            def shared_node(self, key, factory):
+                keys.append(key)
+
+        for blocksize in (1024, 2048):
+            subscribe_preprocessors(FramedAnalyzer(blocksize, blocksize // 2))
+        first_framing, first_downmix, other_framing, other_downmix = keys
+        self.assertEqual(first_downmix, ('downmix', (first_framing,)))
+        self.assertNotEqual(first_downmix, other_downmix)
+
+
 if __name__ == '__main__':
     unittest.main(testRunner=TestRunner())
@@ -0,0 +1,72 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from unit_timeside import *
+from timeside.decoder.core import FileDecoder, BlockPool
+import numpy as np
+import Queue
+
+
+class FakeBuffer(str):
+    """Appsink buffer exposing its samples through the buffer interface"""
+
+    def __new__(cls, samples):
+        return str.__new__(cls, samples.astype('float32').tostring())
+
+
+class FakeSink(object):
+
+    def __init__(self, buffers):
+        self.buffers = iter(buffers)
+
+    def emit(self, signal):
+        return self.buffers.next()
+
+
+class TestBlockPool(unittest.TestCase):
+    "Test the reuse of decoded blocks"
+
+    def testReuse(self):
+        "Reuse blocks which are not referenced anymore"
+        pool = BlockPool(size=2)
+        first = pool.get((1024, 2))
+        second = pool.get((1024, 2))
+        self.assertIsNot(first, second)
+        first_id = id(first)
+        view = second[:10]
+        del first, second
+        # Only the first block is free, the second one is still viewed
+        third = pool.get((1024, 2))
+        self.assertEqual(id(third), first_id)
+        self.assertIsNot(pool.get((1024, 2)), view.base)
+
+    def testAssembly(self):
+        "Assemble appsink buffers into blocks of the output blocksize"
+        samples = np.random.randn(10000, 2).astype('float32')
+        buffers = [FakeBuffer(samples[index:index+300])
+                   for index in range(0, len(samples), 300)]
+
+        decoder = FileDecoder.__new__(FileDecoder)
+        decoder.output_blocksize = 1024
+        decoder.output_channels = 2
+        decoder.queue = Queue.Queue()
+        decoder.block_pool = BlockPool()
+        decoder.block = None
+        decoder.block_fill = 0
+        decoder.queue_stall_time = 0.
+
+        sink = FakeSink(buffers)
+        blocks = []
+        for buf in buffers:
+            decoder._on_new_buffer_cb(sink)
+            while not decoder.queue.empty():
+                frames, eod = decoder.queue.get()
+                blocks.append(frames.copy())
+        blocks.append(decoder._last_block())
+
+        self.assertTrue(all(len(block) == 1024 for block in blocks[:-1]))
+        self.assertTrue(np.array_equal(np.concatenate(blocks), samples))
+
+
+if __name__ == '__main__':
+    unittest.main(testRunner=TestRunner())
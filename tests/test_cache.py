@@ -0,0 +1,120 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from unit_timeside import *
+from timeside.tools.cache import Cache
+import os
+import time
+import shutil
+import tempfile
+
+
+class TestCache(unittest.TestCase):
+    "Test the cache of binary files"
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def testReadWrite(self):
+        "Write and read back files in the sharded layout"
+        cache = Cache(self.path)
+        data = os.urandom(10000)
+        self.assertFalse(cache.exists('test.png'))
+        cache.write_bin(data, 'test.png')
+        self.assertTrue(cache.exists('test.png'))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertEqual(cache.read_bin('test.png'), data)
+        self.assertEqual(''.join(cache.read_stream_bin('test.png')), data)
+        self.assertTrue(os.path.isfile(cache.path('test.png')))
+        self.assertEqual(os.path.dirname(os.path.dirname(os.path.dirname(
+            cache.path('test.png')))), self.path)
+        # no temporary file is left behind
+        self.assertEqual(cache.get_files(), ['test.png'])
+        self.assertRaises(IOError, cache.read_bin, 'missing.png')
+
+    def testStream(self):
+        "Only show streamed files once complete"
+        cache = Cache(self.path)
+        writer = cache.stream_writer('test.mp3')
+        cache.write_stream_bin('abc', writer)
+        self.assertFalse(cache.exists('test.mp3'))
+        writer.close()
+        self.assertEqual(cache.read_bin('test.mp3'), 'abc')
+
+    def testOtherProcess(self):
+        "Find the files written by other caches and the legacy files"
+        cache = Cache(self.path)
+        self.assertFalse(cache.exists('test.png'))
+        Cache(self.path).write_bin('data', 'test.png')
+        self.assertTrue(cache.exists('test.png'))
+        open(os.path.join(self.path, 'legacy.png'), 'w').write('legacy')
+        self.assertEqual(cache.read_bin('legacy.png'), 'legacy')
+        self.assertEqual(sorted(Cache(self.path).files),
+                         ['legacy.png', 'test.png'])
+
+    def testEviction(self):
+        "Remove the least recently used files over max_size"
+        cache = Cache(self.path, max_size=2500)
+        for index in range(3):
+            cache.write_bin('x' * 1000, '%d.png' % index)
+            path = cache.path('%d.png' % index)
+            os.utime(path, (time.time() - 10 + index,) * 2)
+            cache._stat('%d.png' % index, path)
+        self.assertFalse(cache.exists('0.png'))
+        cache.read_bin('1.png')
+        cache.write_bin('x' * 1000, '3.png')
+        self.assertEqual(sorted(cache.files), ['1.png', '3.png'])
+        self.assertEqual(cache.size(), 2000)
+        self.assertEqual(sorted(Cache(self.path).files), ['1.png', '3.png'])
+
+    def testEvictionKeep(self):
+        "Keep the file just written, even if larger than max_size"
+        cache = Cache(self.path, max_size=1500)
+        cache.write_bin('x' * 1000, 'small.png')
+        cache.write_bin('x' * 2000, 'large.png')
+        self.assertEqual(cache.files, ['large.png'])
+        self.assertEqual(cache.read_bin('large.png'), 'x' * 2000)
+
+    def testEvictionOtherProcess(self):
+        "Account for the files written by other processes when evicting"
+        cache = Cache(self.path, max_size=2500)
+        cache.write_bin('x' * 1000, '0.png')
+        other = Cache(self.path)
+        other.write_bin('x' * 1000, '1.png')
+        other.write_bin('x' * 1000, '2.png')
+        self.assertEqual(cache.size(), 3000)
+        cache.write_bin('x' * 1000, '3.png')
+        self.assertEqual(sorted(cache.files), ['2.png', '3.png'])
+        self.assertEqual(sorted(other.files), ['2.png', '3.png'])
+        self.assertEqual(sorted(Cache(self.path).files), ['2.png', '3.png'])
+        self.assertEqual(cache.size(), 2000)
+
+    def testIndex(self):
+        "Keep the index in a file, compacted once it holds stale lines"
+        cache = Cache(self.path)
+        cache.compact_lines = 10
+        cache.write_bin('data', 'test.png')
+        for index in range(20):
+            cache.read_bin('test.png')
+        lines = open(os.path.join(self.path, cache.index_file)).readlines()
+        self.assertLessEqual(len(lines), 11)
+        self.assertEqual(Cache(self.path).files, ['test.png'])
+        # the directory of a former cache is indexed once
+        os.remove(os.path.join(self.path, cache.index_file))
+        self.assertEqual(Cache(self.path).files, ['test.png'])
+        self.assertTrue(os.path.exists(
+            os.path.join(self.path, cache.index_file)))
+
+    def testAnalyzerXml(self):
+        "Write and read back analyzer results as XML"
+        cache = Cache(self.path)
+        data = [{'name': 'Level', 'id': 'level', 'unit': 'dB', 'value': '-3'}]
+        cache.write_analyzer_xml(data, 'test.xml')
+        self.assertEqual(cache.read_analyzer_xml('test.xml'), data)
+
+
+if __name__ == '__main__':
+    unittest.main(testRunner=TestRunner())
@@ -0,0 +1,166 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from unit_timeside import *
+from timeside.decoder.cache import DecoderCache, MediaInfoCache
+from timeside.decoder import cache as decoder_cache
+from timeside.decoder.core import FileDecoder
+from timeside.decoder.utils import get_uri
+import numpy as np
+import os
+import shutil
+import tempfile
+
+
+class TestDecoderCache(unittest.TestCase):
+    "Test the cache of decoded streams"
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.source = os.path.join(os.path.dirname(__file__),
+                                   "samples/sweep.flac")
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def store(self, cache, key, samples):
+        writer = cache.writer(key)
+        for index in range(0, len(samples), 1024):
+            writer.write(samples[index:index+1024])
+        writer.commit(dict(channels=samples.shape[1]))
+
+    def testKey(self):
+        "Key streams by source and output format"
+        cache = DecoderCache(self.path)
+        uri = get_uri(os.path.abspath(__file__))
+        key = cache.key(uri, 0, None, 44100, 2)
+        self.assertEqual(key, cache.key(uri, 0, None, 44100, 2))
+        self.assertNotEqual(key, cache.key(uri, 0, None, 22050, 2))
+        self.assertNotEqual(key, cache.key(uri, 1, 2, 44100, 2))
+        self.assertIsNone(cache.key('http://localhost/sweep.wav',
+                                    0, None, 44100, 2))
+
+    def testRoundtrip(self):
+        "Read back stored samples as a read-only memory map"
+        cache = DecoderCache(self.path)
+        samples = np.random.randn(10000, 2).astype('float32')
+        self.assertIsNone(cache.get('stream'))
+        self.store(cache, 'stream', samples)
+        cached, info = cache.get('stream')
+        self.assertEqual(info['totalframes'], 10000)
+        self.assertTrue(np.array_equal(cached, samples))
+        self.assertRaises(ValueError, cached.__setitem__, 0, 0)
+
+    def testAbort(self):
+        "Drop streams which are not committed"
+        cache = DecoderCache(self.path)
+        writer = cache.writer('stream')
+        writer.write(np.zeros((1024, 2)))
+        writer.abort()
+        self.assertIsNone(cache.get('stream'))
+        self.assertEqual(os.listdir(self.path), [])
+
+    def testEviction(self):
+        "Remove the least recently used streams over max_size"
+        samples = np.zeros((1000, 2), dtype='float32')
+        cache = DecoderCache(self.path, max_size=2 * samples.nbytes)
+        self.store(cache, 'first', samples)
+        self.store(cache, 'second', samples)
+        first_file = cache.files('first')[0]
+        os.utime(first_file, (0, 0))
+        self.assertIsNotNone(cache.get('first'))
+        os.utime(cache.files('second')[0], (0, 0))
+        self.store(cache, 'third', samples)
+        self.assertIsNone(cache.get('second'))
+        self.assertIsNotNone(cache.get('first'))
+        self.assertIsNotNone(cache.get('third'))
+        self.assertEqual(cache.size(), 2 * samples.nbytes)
+
+    def testFileDecoderKey(self):
+        "Key the streams on the duration given to the decoder"
+        decoder = FileDecoder(os.path.abspath(__file__), cache=self.path)
+        key = decoder.cache_key()
+        self.assertIsNotNone(key)
+        # as done by setup() from the duration of the media
+        decoder.uri_duration = 8.
+        self.assertEqual(decoder.cache_key(), key)
+
+    def testFileDecoder(self):
+        "Decode a file once and read it back from the cache"
+        def decode():
+            decoder = FileDecoder(self.source, cache=self.path)
+            decoder.setup()
+            blocks = []
+            eod = False
+            while not eod:
+                frames, eod = decoder.process()
+                blocks.append(np.array(frames))
+            decoder.release()
+            return decoder, np.concatenate(blocks)
+
+        decoder, samples = decode()
+        cached_decoder, cached_samples = decode()
+        self.assertIsNotNone(cached_decoder.cached_frames)
+        self.assertTrue(np.array_equal(samples, cached_samples))
+        self.assertEqual(decoder.totalframes(), cached_decoder.totalframes())
+        self.assertEqual(decoder.samplerate(), cached_decoder.samplerate())
+        self.assertEqual(decoder.channels(), cached_decoder.channels())
+
+
+class TestMediaInfoCache(unittest.TestCase):
+    "Test the cache of the media information"
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.media = [os.path.join(self.path, 'media%d.wav' % index)
+                      for index in range(3)]
+        for media in self.media:
+            with open(media, 'w') as f:
+                f.write(media)
+        self.uris = [get_uri(media) for media in self.media]
+        self.discovered = []
+        self.discover_uri = decoder_cache.discover_uri
+        decoder_cache.discover_uri = self.fake_discover_uri
+
+    def tearDown(self):
+        decoder_cache.discover_uri = self.discover_uri
+        shutil.rmtree(self.path)
+
+    def fake_discover_uri(self, uri):
+        if uri.endswith('missing.wav'):
+            raise IOError('no such media')
+        self.discovered.append(uri)
+        return {'duration': 8., 'streams': [{'samplerate': 44100}]}
+
+    def testMemory(self):
+        "Discover a media again only when it changes"
+        cache = MediaInfoCache()
+        info = cache.info(self.uris[0])
+        self.assertEqual(cache.info(self.uris[0]), info)
+        self.assertEqual(self.discovered, self.uris[:1])
+        with open(self.media[0], 'a') as f:
+            f.write('more data')
+        cache.info(self.uris[0])
+        self.assertEqual(self.discovered, self.uris[:1] * 2)
+
+    def testDisk(self):
+        "Share the entries through the cache directory"
+        directory = os.path.join(self.path, 'cache')
+        info = MediaInfoCache(directory).info(self.uris[0])
+        self.assertEqual(MediaInfoCache(directory).info(self.uris[0]), info)
+        self.assertEqual(self.discovered, self.uris[:1])
+
+    def testDiscover(self):
+        "Discover many media concurrently"
+        cache = MediaInfoCache()
+        missing = get_uri(self.path) + '/missing.wav'
+        infos = cache.discover(self.uris + [missing], jobs=2)
+        self.assertEqual(sorted(self.discovered), sorted(self.uris))
+        self.assertEqual([info['duration'] for info in infos[:-1]], [8.] * 3)
+        self.assertIsInstance(infos[-1], IOError)
+        cache.discover(self.uris, jobs=2)
+        self.assertEqual(len(self.discovered), 3)
+
+
+if __name__ == '__main__':
+    unittest.main(testRunner=TestRunner())
@@ -136,6 +136,48 @@ class TestEncoding(unittest.TestCase):
                          self.encoder.num_samples/self.encoder.samplerate())
 
 
+class TestMultiEncoding(unittest.TestCase):
+    "Test encoding to several formats in one pipeline"
+
+    def testMultiEncoder(self):
+        "Encode to wav, flac and vorbis at once"
+        from timeside.encoder import WavEncoder, FlacEncoder, VorbisEncoder
+        from timeside.encoder.core import MultiEncoder
+        samplerate, duration = 44100, 5.
+        t = np.arange(int(samplerate * duration)) / samplerate
+        samples = .75 * np.sin(2 * pi * 440 * t)
+        encoders = [encoder(tmp_file_sink(prefix=self.__class__.__name__,
+                                          suffix='.' + encoder.file_extension()))
+                    for encoder in (WavEncoder, FlacEncoder, VorbisEncoder)]
+        multi_encoder = MultiEncoder(encoders)
+        (ArrayDecoder(samples, samplerate=samplerate) | multi_encoder).run()
+
+        for encoder in encoders:
+            media_info = get_media_uri_info(get_uri(encoder.filename))
+            os.unlink(encoder.filename)
+            self.assertAlmostEqual(media_info['duration'], duration, delta=0.3)
+            self.assertEqual(media_info['streams'][0]['samplerate'], samplerate)
+            self.assertEqual(encoder.num_samples, len(samples))
+
+    def testElementNames(self):
+        "Make the names of the elements unique to each branch"
+        from timeside.encoder.core import _rename_elements
+        pipe = _rename_elements("""videotestsrc ! queue ! mux.
+            queue ! vorbisenc ! queue ! mux.
+            webmmux streamable=true name=mux """, '_1')
+        self.assertEqual(pipe.split(), [
+            'videotestsrc', '!', 'queue', '!', 'mux_1.',
+            'queue', '!', 'vorbisenc', '!', 'queue', '!', 'mux_1.',
+            'webmmux', 'streamable=true', 'name=mux_1'])
+
+    def testStreaming(self):
+        "Only encode to files"
+        from timeside.encoder import WavEncoder
+        from timeside.encoder.core import MultiEncoder
+        encoder = WavEncoder(None, streaming=True)
+        self.assertRaises(ValueError, MultiEncoder, [encoder])
+
+
 class TestEncodingLongBlock(TestEncoding):
     "Test encoding features with longer blocksize"
 
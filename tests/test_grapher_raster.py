@@ -0,0 +1,71 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+
+from unit_timeside import *
+from timeside.decoder.core import ArrayDecoder
+from timeside.grapher.spectrogram_lin import SpectrogramLinear
+from timeside.grapher.waveform_simple import Waveform
+from timeside.grapher.utils import peaks, column_peaks, fill_columns
+import numpy as np
+
+
+class TestSpectrogramRaster(unittest.TestCase):
+    "Test the rasterization of the spectrograms"
+
+    def setUp(self):
+        t = np.arange(44100 * 2) / 44100
+        self.samples = np.sin(2 * np.pi * 5000 * t)[:, np.newaxis] * 0.5
+
+    def testTone(self):
+        "Draw a pure tone at its frequency"
+        width, height = 200, 128
+        grapher = SpectrogramLinear(width=width, height=height)
+        (ArrayDecoder(self.samples, 44100) | grapher).run()
+        image = grapher.render()
+        self.assertEqual(image.size, (width, height))
+        self.assertEqual(image.mode, 'P')
+
+        pixels = np.asarray(image)
+        y = (5000 - grapher.lower_freq) / (22050 - grapher.lower_freq) \
+            * (height - 1)
+        row = pixels.mean(axis=1).argmax()
+        self.assertLessEqual(abs(row - (height - 1 - y)), 1)
+
+
+class TestWaveformRaster(unittest.TestCase):
+    "Test the rasterization of the waveforms"
+
+    def testColumnPeaks(self):
+        "Find the peaks of all the columns at once"
+        columns = np.random.randn(50, 64)
+        expected = [peaks(column) for column in columns]
+        self.assertTrue(np.array_equal(column_peaks(columns), expected))
+
+    def testFillColumns(self):
+        "Fill spans with anti-aliased edges"
+        data = np.zeros((10, 3, 4), dtype=np.uint8)
+        fill_columns(data, 1, [2.5, 3], [5.25, 4], (255, 0, 0))
+        self.assertTrue((data[:, 0] == 0).all())
+        self.assertTrue((data[2:6, 1] == (255, 0, 0, 255)).all())
+        self.assertTrue((data[3:5, 2] == (255, 0, 0, 255)).all())
+        # pixels blended with the edges
+        self.assertEqual(data[1, 1, 0], 127)
+        self.assertEqual(data[6, 1, 0], 63)
+        self.assertTrue((data[[0, 7, 8, 9], 1] == 0).all())
+        self.assertTrue((data[[0, 1, 2, 5], 2] == 0).all())
+
+    def testFullScale(self):
+        "Draw a full scale signal"
+        samples = (-1.) ** np.arange(44100)
+        grapher = Waveform(width=100, height=64)
+        (ArrayDecoder(samples[:, np.newaxis], 44100) | grapher).run()
+        pixels = np.asarray(grapher.render())
+        # every column is drawn from the top to the bottom peak
+        self.assertTrue((pixels[3:61, :, :3] <= 1).all())
+        self.assertTrue((pixels[0, :, :3] == 255).all())
+
+
+if __name__ == '__main__':
+    unittest.main(testRunner=TestRunner())
@@ -0,0 +1,83 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from unit_timeside import *
+from timeside.tools.gstutils import numpy_array_to_gst_buffer, \
+    gst_buffer_to_numpy_array, get_loop_thread, PipelinePool
+import numpy as np
+
+
+class TestGstBufferConversion(unittest.TestCase):
+    "Test the conversions between numpy arrays and gstreamer buffers"
+
+    def setUp(self):
+        self.frames = np.random.uniform(-1, 1, (1024, 2)).astype('float32')
+
+    def testRoundTrip(self):
+        "Convert float32 frames back and forth"
+        buf = numpy_array_to_gst_buffer(self.frames, 1024, 0, 44100)
+        self.assertEqual(buf.duration, 1024 * 10 ** 9 // 44100)
+        frames = gst_buffer_to_numpy_array(buf, 2)
+        self.assertEqual(frames.shape, (1024, 2))
+        self.assertTrue(np.array_equal(frames, self.frames))
+
+    def testConvert(self):
+        "Convert non contiguous float64 frames"
+        frames = self.frames.astype('float64').T.copy().T
+        buf = numpy_array_to_gst_buffer(frames, 1024, 0, 44100)
+        self.assertTrue(np.array_equal(gst_buffer_to_numpy_array(buf, 2),
+                                       self.frames))
+
+    def testView(self):
+        "View the memory of the buffer without copying it"
+        buf = numpy_array_to_gst_buffer(self.frames, 1024, 0, 44100)
+        frames = gst_buffer_to_numpy_array(buf, 2)
+        self.assertFalse(frames.flags.owndata)
+        self.assertEqual(gst_buffer_to_numpy_array(buf, 1).shape, (2048, 1))
+
+    def testOutput(self):
+        "Copy the samples into an output array"
+        buf = numpy_array_to_gst_buffer(self.frames, 1024, 0, 44100)
+        out = np.zeros((4096, 2), dtype='float32')
+        frames = gst_buffer_to_numpy_array(buf, 2, out=out)
+        self.assertEqual(frames.shape, (1024, 2))
+        self.assertTrue(np.may_share_memory(frames, out))
+        self.assertTrue(np.array_equal(out[:1024], self.frames))
+        self.assertTrue((out[1024:] == 0).all())
+
+
+class TestPipelinePool(unittest.TestCase):
+    "Test the pool of idle gstreamer pipelines"
+
+    def testReuse(self):
+        "Give back the idle pipelines of the same kind"
+        pool = PipelinePool(size=1)
+        first = pool.get('file', object)
+        pool.put('file', first)
+        self.assertIsNot(pool.get('segment', object), first)
+        self.assertIs(pool.get('file', object), first)
+        self.assertIsNot(pool.get('file', object), first)
+
+    def testSize(self):
+        "Keep at most size pipelines of each kind"
+        pool = PipelinePool(size=1)
+        first, second = object(), object()
+        pool.put('file', first)
+        pool.put('file', second)
+        self.assertIs(pool.get('file', object), first)
+        self.assertIsNot(pool.get('file', object), second)
+
+
+class TestLoopThread(unittest.TestCase):
+    "Test the mainloop thread shared by the decoders and encoders"
+
+    def testShared(self):
+        "Run a single mainloop thread in the process"
+        thread = get_loop_thread()
+        self.assertTrue(thread.daemon)
+        self.assertTrue(thread.is_alive())
+        self.assertIs(get_loop_thread(), thread)
+
+
+if __name__ == '__main__':
+    unittest.main(testRunner=TestRunner())
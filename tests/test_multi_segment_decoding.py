@@ -0,0 +1,125 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from unit_timeside import *
+from timeside.decoder.core import ArrayDecoder, MultiSegmentDecoder
+from timeside.analyzer.level import Level
+from timeside.analyzer.spectrogram import Spectrogram
+from timeside.exceptions import Error
+import numpy as np
+
+
+class CountingArrayDecoder(ArrayDecoder):
+
+    @staticmethod
+    def id():
+        return "counting_array_dec"
+
+    def __init__(self, *args, **kwargs):
+        super(CountingArrayDecoder, self).__init__(*args, **kwargs)
+        self.nb_segments = 0
+
+    def segment(self, start, duration=None):
+        self.nb_segments += 1
+        return super(CountingArrayDecoder, self).segment(start, duration)
+
+
+class TestMultiSegmentDecoding(unittest.TestCase):
+    "Test the decoding of several segments of a source in a single pass"
+
+    def setUp(self):
+        self.samplerate = 8000
+        self.samples = np.random.randn(self.samplerate * 20, 2)
+        self.source = CountingArrayDecoder(self.samples, self.samplerate)
+
+    def decode(self, decoder, blocksize=1024):
+        decoder.setup(blocksize=blocksize)
+        blocks = []
+        eod = False
+        while not eod:
+            frames, eod = decoder.process()
+            blocks.append(frames.copy())
+        self.assertTrue(all(len(block) == blocksize for block in blocks[:-1]))
+        return np.concatenate(blocks)
+
+    def testSegments(self):
+        "Decode each segment as its own stream, in a single pass"
+        segments = [(1, 2), (2.5, 1), (3, 4), (10, 0.5), (15, None)]
+        multi = MultiSegmentDecoder(self.source, segments)
+        self.assertEqual(len(multi), 5)
+        for decoder, (start, duration) in zip(multi, segments):
+            frames = self.decode(decoder)
+            first = int(start * self.samplerate)
+            if duration is None:
+                last = len(self.samples)
+            else:
+                last = first + int(duration * self.samplerate)
+            self.assertTrue(np.array_equal(frames, self.samples[first:last]))
+            self.assertEqual(decoder.totalframes(), last - first)
+            info = decoder.mediainfo()
+            self.assertEqual(info['start'], start)
+            self.assertEqual(info['duration'], (last - first) /
+                             float(self.samplerate))
+            self.assertTrue(info['is_segment'])
+        self.assertEqual(self.source.nb_segments, 1)
+
+    def testOrder(self):
+        "Decode the segments in order"
+        multi = MultiSegmentDecoder(self.source, [(1, 2), (5, 1)])
+        self.decode(multi.segments[1])
+        self.assertRaises(Error, multi.segments[0].setup)
+        self.assertRaises(ValueError, MultiSegmentDecoder, self.source,
+                          [(5, 1), (1, 2)])
+
+    def testBlocks(self):
+        "Only keep the blocks not read yet by the segments"
+        multi = MultiSegmentDecoder(self.source, [(0, 15), (16, 2)])
+        decoder = multi.segments[0]
+        decoder.setup(blocksize=1024)
+        eod = False
+        while not eod:
+            frames, eod = decoder.process()
+            self.assertLessEqual(len(multi.blocks), 2)
+
+    def testRelease(self):
+        "Release the decoder once every segment is read or released"
+        multi = MultiSegmentDecoder(self.source, [(1, 2), (5, 1), (8, 1)])
+        self.decode(multi.segments[0])
+        multi.segments[0].release()
+        self.assertTrue(multi.decoding)
+        # a segment stopped early, as by a failing pipe
+        multi.segments[1].setup(blocksize=1024)
+        multi.segments[1].process()
+        multi.segments[1].release()
+        self.assertTrue(multi.decoding)
+        self.decode(multi.segments[2])
+        self.assertFalse(multi.decoding)
+        multi.segments[2].release()
+
+        # a caller stopping early
+        multi = MultiSegmentDecoder(self.source, [(1, 2), (5, 1), (8, 1)])
+        self.decode(multi.segments[0])
+        multi.release()
+        self.assertFalse(multi.decoding)
+
+    def testRunMany(self):
+        "Analyze each segment into its own results"
+        segments = [(0, 3), (4, 2.5), (12, 5)]
+        multi = MultiSegmentDecoder(self.source, segments)
+        runs = list((Level() | Spectrogram()).run_many(multi))
+        self.assertEqual(len(runs), 3)
+        for (segment, results), (start, duration) in zip(runs, segments):
+            decoder = ArrayDecoder(self.samples, self.samplerate,
+                                   start=start, duration=duration)
+            pipe = decoder | Level() | Spectrogram()
+            pipe.run()
+            self.assertEqual(sorted(results.keys()),
+                             sorted(pipe.results.keys()))
+            for key in results.keys():
+                self.assertTrue(np.allclose(results[key].data,
+                                            pipe.results[key].data))
+                self.assertEqual(results[key].audio_metadata.start, start)
+
+
+if __name__ == '__main__':
+    unittest.main(testRunner=TestRunner())
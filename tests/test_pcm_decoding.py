@@ -0,0 +1,160 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+
+from unit_timeside import *
+from timeside.decoder.core import FileDecoder, PCMFileDecoder
+from timeside.decoder.utils import get_pcm_file_info
+import numpy as np
+import aifc
+import struct
+import wave
+import os
+import shutil
+import tempfile
+
+
+class TestPCMDecoding(unittest.TestCase):
+    "Test the memory-mapped decoding of PCM files"
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.samplerate = 8000
+        self.samples = np.random.randint(-2 ** 15, 2 ** 15, (20000, 2))
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def write_wav(self, width=2):
+        path = os.path.join(self.path, 'test.wav')
+        if width == 1:
+            data = ((self.samples >> 8) + 128).astype('u1')
+        elif width == 3:
+            ints = self.samples.astype('<i4') << 8
+            # keep the three least significant bytes of each sample
+            data = ints.view('u1').reshape(-1, 4)[:, :3]
+        else:
+            data = self.samples.astype('<i2')
+        f = wave.open(path, 'wb')
+        f.setnchannels(2)
+        f.setsampwidth(width)
+        f.setframerate(self.samplerate)
+        f.writeframes(np.ascontiguousarray(data).tostring())
+        f.close()
+        return path
+
+    def write_aiff(self):
+        path = os.path.join(self.path, 'test.aiff')
+        f = aifc.open(path, 'wb')
+        f.aiff()
+        f.setnchannels(2)
+        f.setsampwidth(2)
+        f.setframerate(self.samplerate)
+        f.writeframes(self.samples.astype('>i2').tostring())
+        f.close()
+        return path
+
+    def write_aiff8(self, compression='NONE'):
+        "Write an 8-bit AIFF-C file, with samples in the given compression"
+        path = os.path.join(self.path, 'test.aifc')
+        data = (self.samples >> 8).astype('i1').tostring()
+        comm = struct.pack('>hIh', 2, len(self.samples), 8) + \
+            '\x40\x0b\xfa' + '\x00' * 7 + compression + '\x00\x00'
+        ssnd = struct.pack('>II', 0, 0) + data
+        chunks = ''.join(struct.pack('>4sI', chunk_id, len(chunk)) + chunk
+                         for chunk_id, chunk in [('COMM', comm),
+                                                 ('SSND', ssnd)])
+        with open(path, 'wb') as f:
+            f.write('FORM' + struct.pack('>I', len(chunks) + 4) + 'AIFC')
+            f.write(chunks)
+        return path
+
+    def decode(self, decoder, **kwargs):
+        decoder.setup(**kwargs)
+        blocks = []
+        eod = False
+        while not eod:
+            frames, eod = decoder.process()
+            self.assertEqual(frames.dtype, np.float32)
+            blocks.append(frames)
+        return np.concatenate(blocks)
+
+    def assertDecoded(self, path, precision=2 ** -15):
+        decoded = self.decode(PCMFileDecoder(path))
+        self.assertEqual(decoded.shape, self.samples.shape)
+        self.assertTrue(np.allclose(decoded, self.samples / 2 ** 15,
+                                    atol=precision))
+
+    def testInfo(self):
+        "Read the layout of a WAV file"
+        info = get_pcm_file_info(self.write_wav())
+        self.assertEqual(info['format'], 'wav')
+        self.assertEqual(info['samplerate'], self.samplerate)
+        self.assertEqual(info['channels'], 2)
+        self.assertEqual(info['width'], 16)
+        self.assertEqual(info['totalframes'], len(self.samples))
+        self.assertIsNone(get_pcm_file_info(__file__))
+
+    def testWav16(self):
+        "Decode 16-bit WAV files"
+        self.assertDecoded(self.write_wav(2))
+
+    def testWav8(self):
+        "Decode 8-bit WAV files"
+        self.assertDecoded(self.write_wav(1), precision=2 ** -7)
+
+    def testWav24(self):
+        "Decode 24-bit WAV files"
+        self.assertDecoded(self.write_wav(3))
+
+    def testAiff(self):
+        "Decode AIFF files"
+        self.assertDecoded(self.write_aiff())
+
+    def testAiff8(self):
+        "Decode 8-bit AIFF files as signed samples in any byte order"
+        for compression in ('NONE', 'sowt'):
+            path = self.write_aiff8(compression)
+            self.assertEqual(get_pcm_file_info(path)['dtype'], 'i1')
+            self.assertDecoded(path, precision=2 ** -7)
+
+    def testPaddedWav(self):
+        "Refuse WAV files with samples padded within larger containers"
+        path = self.write_wav(3)
+        with open(path, 'r+b') as f:
+            # a block_align of two 4-byte containers instead of 6 bytes
+            f.seek(32)
+            f.write(struct.pack('<H', 8))
+        self.assertIsNone(get_pcm_file_info(path))
+        self.assertFalse(PCMFileDecoder.can_decode('file://' + path,
+                                                 self.samplerate))
+
+    def testSegment(self):
+        "Decode a segment of a file"
+        decoder = PCMFileDecoder(self.write_wav(), start=0.5, duration=1)
+        decoded = self.decode(decoder)
+        expected = self.samples[4000:12000] / 2 ** 15
+        self.assertTrue(np.allclose(decoded, expected))
+        self.assertEqual(decoder.totalframes(), 8000)
+
+    def testMono(self):
+        "Downmix to mono"
+        decoded = self.decode(PCMFileDecoder(self.write_wav()), channels=1)
+        expected = self.samples.mean(axis=1)[:, np.newaxis] / 2 ** 15
+        self.assertTrue(np.allclose(decoded, expected))
+
+    def testFileDecoder(self):
+        "Decode PCM files without gstreamer when they need no resampling"
+        path = self.write_wav()
+        decoder = FileDecoder(path)
+        decoded = self.decode(decoder, blocksize=1024)
+        self.assertIsNotNone(decoder.pcm_decoder)
+        self.assertEqual(decoder.samplerate(), self.samplerate)
+        self.assertEqual(decoder.totalframes(), len(self.samples))
+        self.assertTrue(np.allclose(decoded, self.samples / 2 ** 15))
+        self.assertFalse(PCMFileDecoder.can_decode(decoder.uri, 44100))
+
+
+if __name__ == '__main__':
+    unittest.main(testRunner=TestRunner())
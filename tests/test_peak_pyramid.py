@@ -0,0 +1,85 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+
+from unit_timeside import *
+from timeside.decoder.core import ArrayDecoder
+from timeside.analyzer.peak_pyramid import PeakPyramid, PeakPyramidReader
+import numpy as np
+import os
+import tempfile
+
+
+class TestPeakPyramid(unittest.TestCase):
+    "Test the multi-resolution peaks"
+
+    def setUp(self):
+        self.samplerate = 8000
+        self.samples = np.random.uniform(-1, 1, (self.samplerate * 5, 2)) \
+            * np.linspace(0, 1, self.samplerate * 5)[:, np.newaxis]
+        self.analyzer = PeakPyramid(base=64)
+        (ArrayDecoder(self.samples, self.samplerate) | self.analyzer).run(
+            blocksize=1000)
+
+    def expected(self, first, last, width):
+        edges = np.linspace(first, last, width + 1).astype(int)
+        return np.array([[self.samples[a:b].min(), self.samples[a:b].max()]
+                         for a, b in zip(edges[:-1], edges[1:])])
+
+    def testLevels(self):
+        "Halve the resolution at each level"
+        levels = self.analyzer.levels
+        self.assertEqual(len(levels[0]), int(np.ceil(len(self.samples) / 64)))
+        self.assertEqual(len(levels[-1]), 1)
+        for finer, coarser in zip(levels[:-1], levels[1:]):
+            self.assertEqual(len(coarser), int(np.ceil(len(finer) / 2)))
+        self.assertEqual(levels[0].dtype, np.int16)
+        result = self.analyzer.results['peak_pyramid']
+        self.assertEqual(result.frame_metadata.stepsize, 64)
+
+    def testSlice(self):
+        "Slice the peaks of a time range at a given width"
+        reader = self.analyzer.reader()
+        # pixels aligned with the finest level
+        peaks = reader.slice(start=0.8, duration=2, width=125)
+        expected = self.expected(6400, 22400, 125)
+        self.assertTrue(np.allclose(peaks, expected, atol=2 / 2 ** 15))
+        # a coarser level must still hold the signal
+        peaks = reader.slice(width=7)
+        expected = self.expected(0, len(self.samples), 7)
+        self.assertTrue((peaks[:, 0] <= expected[:, 0]).all())
+        self.assertTrue((peaks[:, 1] >= expected[:, 1]).all())
+        self.assertEqual(reader.level(len(self.samples) / 7), 6)
+
+    def testSliceEnd(self):
+        "Slice the peaks of a time range up to the end of the levels"
+        reader = self.analyzer.reader()
+        peaks = reader.slice(start=4.2, samples_per_pixel=64)
+        expected = self.expected(33600, len(self.samples), 100)
+        self.assertTrue(np.allclose(peaks, expected, atol=2 / 2 ** 15))
+        # a single pixel
+        peaks = reader.slice(start=4.992, width=1)
+        expected = self.expected(39936, len(self.samples), 1)
+        self.assertTrue(np.allclose(peaks, expected, atol=2 / 2 ** 15))
+
+    def testFile(self):
+        "Read a pyramid back from a file"
+        fd, path = tempfile.mkstemp(suffix='.peaks')
+        os.close(fd)
+        try:
+            self.analyzer.write(path)
+            reader = PeakPyramidReader.open(path)
+            self.assertEqual(reader.samplerate, self.samplerate)
+            self.assertEqual(reader.totalframes, len(self.samples))
+            for level, expected in zip(reader.levels, self.analyzer.levels):
+                self.assertTrue(np.array_equal(level, expected))
+            self.assertTrue(np.array_equal(
+                reader.slice(2.5, 1, samples_per_pixel=100),
+                self.analyzer.reader().slice(2.5, 1, samples_per_pixel=100)))
+        finally:
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    unittest.main(testRunner=TestRunner())
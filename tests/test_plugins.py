@@ -0,0 +1,111 @@
+#! /usr/bin/env python
+
+from unit_timeside import *
+import os
+import subprocess
+import timeside
+from timeside.core import get_processor, processors, _processors
+from timeside.component import MetaComponent
+from timeside.exceptions import Error
+from timeside import plugins
+
+# Cold start target of "import timeside", relative to the import of numpy
+# it relies on, and margin in seconds
+COLD_START_RATIO = 2
+COLD_START_MARGIN = 0.1
+
+HEAVY_MODULES = ['gst', 'pygst', 'aubio', 'yaafelib', 'scipy', 'h5py', 'PIL',
+                 'timeside.decoder.core', 'timeside.analyzer.core',
+                 'timeside.grapher.core', 'timeside.encoder.core']
+
+
+def run_python(code):
+    """Run code in a new interpreter and return what it prints"""
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(path for path in sys.path if path)
+    return subprocess.check_output([sys.executable, '-c', code], env=env)
+
+
+class TestColdStart(unittest.TestCase):
+    "import timeside does not import the processors"
+
+    def testImportTime(self):
+        "import timeside within the cold start target"
+        # the same process times both imports, so that the target holds on a
+        # loaded machine, testHeavyModules checks what is imported
+        numpy_duration, duration = map(float, run_python(
+            "import time\n"
+            "start = time.time()\n"
+            "import numpy\n"
+            "middle = time.time()\n"
+            "import timeside\n"
+            "print middle - start, time.time() - middle\n").split())
+        self.assertLess(duration,
+                        COLD_START_RATIO * numpy_duration + COLD_START_MARGIN)
+
+    def testHeavyModules(self):
+        "no heavy module is imported by import timeside"
+        modules = run_python(
+            "import sys, timeside\n"
+            "print ' '.join(m for m in sys.modules if sys.modules[m])\n")
+        for module in HEAVY_MODULES:
+            self.assertNotIn(module, modules.split())
+
+    def testGetProcessor(self):
+        "get_processor only imports the module of the processor"
+        modules = run_python(
+            "import sys, timeside\n"
+            "timeside.core.get_processor('peak_pyramid')\n"
+            "print ' '.join(m for m in sys.modules if sys.modules[m])\n")
+        modules = modules.split()
+        self.assertIn('timeside.analyzer.peak_pyramid', modules)
+        self.assertNotIn('timeside.analyzer.spectrogram', modules)
+        self.assertNotIn('timeside.decoder.core', modules)
+
+
+class TestPlugins(unittest.TestCase):
+    "the plugins match the processors they declare"
+
+    def tearDown(self):
+        plugins.PLUGINS[:] = [plugin for plugin in plugins.PLUGINS
+                              if plugin.id != 'missing_plugin']
+        plugins.failed.pop('timeside.missing_plugin', None)
+
+    def testManifest(self):
+        "every processor is declared with its module, class and interface"
+        processors()
+        declared = dict((plugin.id, plugin) for plugin in plugins.PLUGINS)
+        interfaces = dict((item['class'], item['interface'])
+                          for item in MetaComponent.implementations
+                          if not item['abstract'])
+        for processor_id, processor in _processors.items():
+            if not processor.__module__.startswith('timeside.'):
+                # processors defined by the tests
+                continue
+            self.assertIn(processor_id, declared)
+            plugin = declared[processor_id]
+            self.assertEquals(processor.__module__, plugin.module)
+            self.assertEquals(processor.__name__, plugin.name)
+            self.assertIs(interfaces[processor], plugin.interface)
+
+    def testLazyPackage(self):
+        "the packages export their processors"
+        self.assertIs(timeside.analyzer.PeakPyramid,
+                      get_processor('peak_pyramid'))
+        self.assertIs(timeside.grapher.Waveform,
+                      get_processor('waveform_simple'))
+        self.assertIs(timeside.decoder.ArrayDecoder,
+                      get_processor('array_dec'))
+
+    def testMissingDependency(self):
+        "a plugin which can not be imported is skipped"
+        plugins.PLUGINS.append(plugins.Plugin(
+            'missing_plugin', 'timeside.missing_plugin', 'Missing',
+            timeside.api.IAnalyzer))
+        self.assertNotEquals(len(processors(timeside.api.IAnalyzer)), 0)
+        self.assertIn('timeside.missing_plugin', plugins.failed)
+        self.assertRaises(Error, get_processor, 'missing_plugin')
+
+
+if __name__ == '__main__':
+    unittest.main(testRunner=TestRunner())
@@ -0,0 +1,205 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from unit_timeside import *
+from timeside.decoder.core import ArrayDecoder
+from timeside.analyzer.level import Level
+from timeside.analyzer.dc import MeanDCShift
+from timeside.analyzer.spectrogram import Spectrogram
+from timeside.analyzer.waveform import Waveform
+from timeside.core import BlocksizePlan
+import numpy as np
+
+
+class FailingAnalyzer(Level):
+
+    @staticmethod
+    def id():
+        return "failing_analyzer"
+
+    def process(self, frames, eod=False):
+        raise ValueError('process failed')
+
+
+class ReleasedArrayDecoder(ArrayDecoder):
+
+    @staticmethod
+    def id():
+        return "released_array_dec"
+
+    def release(self):
+        self.released = True
+
+
+class TestRelease(unittest.TestCase):
+    "Release the source of a pipe"
+
+    def setUp(self):
+        self.decoder = ReleasedArrayDecoder(samples=np.random.randn(44100, 2),
+                                            samplerate=44100)
+        self.decoder.released = False
+
+    def testRun(self):
+        "Release the source after a run"
+        (self.decoder | Level()).run()
+        self.assertTrue(self.decoder.released)
+
+    def testProcessorError(self):
+        "Release the source when a processor fails"
+        pipe = self.decoder | FailingAnalyzer()
+        self.assertRaises(ValueError, pipe.run)
+        self.assertTrue(self.decoder.released)
+
+
+class TestThreadedProcessPipe(unittest.TestCase):
+    "Test the threaded fan-out mode of ProcessPipe.run"
+
+    def setUp(self):
+        self.samples = np.random.randn(44100 * 4, 2)
+
+    def run_pipe(self, threads):
+        decoder = ArrayDecoder(samples=self.samples, samplerate=44100)
+        analyzers = [Level(), MeanDCShift(), Spectrogram()]
+        pipe = decoder
+        for analyzer in analyzers:
+            pipe = pipe | analyzer
+        pipe.run(threads=threads)
+        results = {}
+        for analyzer in analyzers:
+            results.update(analyzer.results)
+        return results
+
+    def assertResultsEqual(self, results, expected):
+        self.assertEqual(sorted(results.keys()), sorted(expected.keys()))
+        for key in expected.keys():
+            self.assertTrue(np.array_equal(results[key].data,
+                                           expected[key].data))
+
+    def testOneThreadPerProcessor(self):
+        "Run each processor in its own thread"
+        self.assertResultsEqual(self.run_pipe(threads=True),
+                                self.run_pipe(threads=None))
+
+    def testThreadGroups(self):
+        "Dispatch the processors over two threads"
+        self.assertResultsEqual(self.run_pipe(threads=2),
+                                self.run_pipe(threads=None))
+
+    def testProcessorError(self):
+        "Report errors raised inside a worker thread"
+        decoder = ArrayDecoder(samples=self.samples, samplerate=44100)
+        pipe = (decoder | FailingAnalyzer() | MeanDCShift())
+        self.assertRaises(ValueError, pipe.run, threads=True)
+
+
+class TestRunMany(unittest.TestCase):
+    "Run the same processors over many sources"
+
+    def setUp(self):
+        self.sources = [np.random.randn(44100 * duration, 2)
+                        for duration in (1, 3, 2)]
+
+    def run_one(self, samples, samplerate=44100, *processors):
+        decoder = ArrayDecoder(samples=samples, samplerate=samplerate)
+        pipe = decoder
+        for processor in processors or (Level(), Spectrogram()):
+            pipe = pipe | processor
+        pipe.run()
+        return pipe.results
+
+    def assertResultsEqual(self, results, expected):
+        self.assertEqual(sorted(results.keys()), sorted(expected.keys()))
+        for key in expected.keys():
+            self.assertTrue(np.array_equal(results[key].data,
+                                           expected[key].data))
+
+    def testRunMany(self):
+        "Results of each source match those of a pipe of its own"
+        level, spectrogram = Level(), Spectrogram()
+        pipe = level | spectrogram
+        sources = [ArrayDecoder(samples=samples, samplerate=44100)
+                   for samples in self.sources]
+        runs = list(pipe.run_many(sources))
+        self.assertEqual([source for source, results in runs], sources)
+        for (source, results), samples in zip(runs, self.sources):
+            self.assertResultsEqual(results, self.run_one(samples))
+        # the processors stay in the pipe for another batch
+        self.assertEqual(pipe.processors, [level, spectrogram])
+
+    def testFormats(self):
+        "Set up the processors for the format of each source"
+        level, spectrogram, waveform = Level(), Spectrogram(), Waveform()
+        pipe = level | spectrogram | waveform
+        formats = [(44100, 2), (48000, 1), (22050, 2)]
+        sources = [ArrayDecoder(samples=np.random.randn(samplerate, channels),
+                                samplerate=samplerate)
+                   for samplerate, channels in formats]
+        for index, (source, results) in enumerate(pipe.run_many(sources)):
+            samplerate, channels = formats[index]
+            self.assertEqual(level.input_channels, channels)
+            self.assertEqual(spectrogram.input_samplerate, samplerate)
+            self.assertEqual(
+                results['waveform_analyzer'].frame_metadata.samplerate,
+                samplerate)
+            expected = self.run_one(source.samples, samplerate,
+                                    Level(), Spectrogram(), Waveform())
+            self.assertResultsEqual(results, expected)
+
+    def testTemplateSource(self):
+        "The source of the template pipe is put back after the batch"
+        decoder = ArrayDecoder(samples=self.sources[0], samplerate=44100)
+        level = Level()
+        pipe = decoder | level
+        sources = [ArrayDecoder(samples=samples, samplerate=44100)
+                   for samples in self.sources[1:]]
+        for source, results in pipe.run_many(sources):
+            self.assertIs(pipe.processors[0], source)
+            self.assertEqual(len(results), 2)
+        self.assertEqual(pipe.processors, [decoder, level])
+
+
+class TestBlocksizePlan(unittest.TestCase):
+    "Test the planning of the source blocksize"
+
+    def testAligned(self):
+        "Plan a blocksize aligned with every stepsize, within the cache"
+        plan = BlocksizePlan([('a', 2048, 1024), ('b', 1024, 256),
+                              ('c', 4096, 1536)], channels=2)
+        self.assertEqual(plan.blocksize % 3072, 0)
+        self.assertLessEqual(plan.blocksize * 2 * 4, plan.cache_size)
+        self.assertEqual(plan.blocksize, 30720)
+
+    def testLargeBlocks(self):
+        "Never plan blocks smaller than the largest frame"
+        plan = BlocksizePlan([('a', 65536, 65536), ('b', 1024, 512)],
+                             channels=2)
+        self.assertEqual(plan.blocksize, 65536)
+
+    def testPartialAlignment(self):
+        "Align with as many processors as possible"
+        plan = BlocksizePlan([('a', 1024, 1024), ('b', 1024, 1024),
+                              ('c', 1000, 1000)], channels=1)
+        self.assertEqual(plan.blocksize % 1024, 0)
+
+    def testNoRequirements(self):
+        "Keep the blocksize of the source without any requirement"
+        self.assertIsNone(BlocksizePlan([]).blocksize)
+
+    def testRun(self):
+        "Run a pipe with a planned blocksize"
+        samples = np.random.randn(44100 * 4, 2)
+        analyzer = Spectrogram(blocksize=2048, stepsize=512)
+        pipe = ArrayDecoder(samples=samples, samplerate=44100) | analyzer
+        pipe.run(blocksize='auto')
+        plan = pipe.blocksize_plan
+        self.assertEqual(plan.requirements,
+                         [('spectrogram_analyzer', 2048, 512)])
+        self.assertEqual(pipe.processors[0].blocksize(), plan.blocksize)
+        expected = Spectrogram(blocksize=2048, stepsize=512)
+        (ArrayDecoder(samples=samples, samplerate=44100) | expected).run()
+        self.assertTrue(np.array_equal(analyzer.values.array,
+                                       expected.values.array))
+
+
+if __name__ == '__main__':
+    unittest.main(testRunner=TestRunner())
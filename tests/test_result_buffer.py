@@ -0,0 +1,58 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from unit_timeside import *
+from timeside.analyzer.core import ResultBuffer
+from timeside.analyzer.spectrogram import Spectrogram
+from timeside.decoder.core import ArrayDecoder
+import numpy as np
+
+
+class TestResultBuffer(unittest.TestCase):
+    "Test the growable buffer of framewise results"
+
+    def testAppend(self):
+        "Append rows beyond the initial size"
+        rows = np.random.randn(100, 3)
+        buf = ResultBuffer(shape=(3,), size=8)
+        for row in rows:
+            buf.append(row)
+        self.assertEqual(len(buf), 100)
+        self.assertTrue(np.array_equal(buf.array, rows))
+
+    def testExtend(self):
+        "Append blocks of rows"
+        rows = np.random.randn(1000, 2).astype('float32')
+        buf = ResultBuffer(shape=None, dtype=None, size=10)
+        for index in range(0, 1000, 300):
+            buf.extend(rows[index:index + 300])
+        self.assertEqual(buf.array.dtype, np.float32)
+        self.assertTrue(np.array_equal(buf.array, rows))
+
+    def testInferredShape(self):
+        "Take the shape and type of the first row"
+        buf = ResultBuffer(shape=None, dtype=None)
+        self.assertEqual(buf.array.shape, (0,))
+        buf.append(np.arange(5, dtype='int32'))
+        self.assertEqual(buf.array.shape, (1, 5))
+        self.assertEqual(buf.array.dtype, np.int32)
+
+    def testNoCopy(self):
+        "Hand the rows out without copying them"
+        buf = ResultBuffer(size=4)
+        for value in range(3):
+            buf.append(value)
+        self.assertIs(np.asarray(buf.array).base, buf.data)
+
+    def testAnalyzerBuffer(self):
+        "Size the buffer of an analyzer from the number of input frames"
+        samples = np.random.randn(44100 * 2, 2)
+        analyzer = Spectrogram(blocksize=2048, stepsize=1024)
+        (ArrayDecoder(samples=samples, samplerate=44100) | analyzer).run()
+        nb_frames = len(analyzer.values)
+        self.assertGreaterEqual(len(analyzer.values.data), nb_frames)
+        self.assertLessEqual(len(analyzer.values.data), nb_frames + 2)
+
+
+if __name__ == '__main__':
+    unittest.main(testRunner=TestRunner())
@@ -0,0 +1,81 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from unit_timeside import *
+from timeside.decoder.core import ArrayDecoder
+from timeside.analyzer.cache import ResultCache
+from timeside.analyzer.level import Level
+from timeside.analyzer.dc import MeanDCShift
+import numpy as np
+import shutil
+import tempfile
+
+
+class CountingArrayDecoder(ArrayDecoder):
+    "ArrayDecoder counting the blocks it decodes"
+
+    blocks = 0
+
+    def process(self, frames=None, eod=False):
+        CountingArrayDecoder.blocks += 1
+        return super(CountingArrayDecoder, self).process(frames, eod)
+
+
+class TestResultCache(unittest.TestCase):
+    "Test the cache of analyzer results"
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.cache = ResultCache(self.path)
+        self.samples = np.random.randn(44100 * 2, 2) / 4
+        CountingArrayDecoder.blocks = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def run_pipe(self, *analyzers, **kwargs):
+        pipe = CountingArrayDecoder(self.samples, **kwargs)
+        for analyzer in analyzers:
+            pipe = pipe | analyzer
+        pipe.run(cache=self.cache)
+        return pipe
+
+    def testCached(self):
+        "Load the results of the cached analyzers without decoding"
+        expected = self.run_pipe(Level(), MeanDCShift()).results
+        blocks = CountingArrayDecoder.blocks
+        self.assertTrue(blocks > 0)
+
+        pipe = self.run_pipe(Level(), MeanDCShift())
+        self.assertEqual(CountingArrayDecoder.blocks, blocks)
+        self.assertEqual(sorted(pipe.results.keys()), sorted(expected.keys()))
+        for key in expected:
+            self.assertEqual(pipe.results[key], expected[key])
+
+    def testPartial(self):
+        "Only run the analyzers which are not cached"
+        self.run_pipe(Level())
+        level, dc = Level(), MeanDCShift()
+        pipe = self.run_pipe(level, dc)
+        self.assertEqual(pipe.processors[1:], [])
+        self.assertIn('level.max', level.results)
+        self.assertIn('mean_dc_shift', dc.results)
+
+    def testKey(self):
+        "Tell apart the sources, segments and parameters"
+        decoder = ArrayDecoder(self.samples)
+        key = self.cache.key(decoder, Level())
+        self.assertEqual(key, self.cache.key(ArrayDecoder(self.samples),
+                                             Level()))
+        self.assertNotEqual(key, self.cache.key(decoder, Level(True)))
+        self.assertNotEqual(key, self.cache.key(decoder, Level(),
+                                                samplerate=22050))
+        self.assertNotEqual(key, self.cache.key(ArrayDecoder(self.samples * 2),
+                                                Level()))
+        self.assertNotEqual(key, self.cache.key(
+            ArrayDecoder(self.samples, start=1), Level()))
+        self.assertIsNone(self.cache.key(decoder, decoder))
+
+
+if __name__ == '__main__':
+    unittest.main(testRunner=TestRunner())
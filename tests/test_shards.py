@@ -0,0 +1,110 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+
+from unit_timeside import *
+from timeside.decoder.core import ArrayDecoder, FileDecoder
+from timeside.analyzer import shards
+from timeside.analyzer.core import AnalyzerResult
+from timeside.analyzer.level import Level
+from timeside.analyzer.spectrogram import Spectrogram
+from timeside.analyzer.shards import ShardedPipe, Shard, stitch_result
+import numpy as np
+import os
+
+
+class TestShardedPipe(unittest.TestCase):
+    "Test the analysis of time shards of a source"
+
+    def setUp(self):
+        self.samples = np.random.randn(44100 * 12, 2)
+
+    def run_sharded(self, jobs):
+        spectrogram = Spectrogram(blocksize=2048, stepsize=1024)
+        level = Level()
+        pipe = ArrayDecoder(self.samples, 44100) | spectrogram | level
+        sharded = ShardedPipe(pipe, shard_duration=2, jobs=jobs)
+        sharded.run()
+        return sharded, spectrogram, level
+
+    def assertResults(self, jobs):
+        sharded, spectrogram, level = self.run_sharded(jobs)
+        self.assertEqual(len(sharded.shards), 6)
+        expected_spectrogram = Spectrogram(blocksize=2048, stepsize=1024)
+        expected_level = Level()
+        (ArrayDecoder(self.samples, 44100) | expected_spectrogram |
+         expected_level).run()
+
+        result = spectrogram.results['spectrogram_analyzer']
+        expected = expected_spectrogram.results['spectrogram_analyzer']
+        self.assertEqual(result.data.shape, expected.data.shape)
+        self.assertTrue(np.allclose(result.data, expected.data))
+        self.assertEqual(result.audio_metadata.start, 0)
+        self.assertEqual(result.audio_metadata.duration, 12)
+        # the level is not shardable and runs over the whole source
+        self.assertEqual(level.results['level.max'].data,
+                         expected_level.results['level.max'].data)
+
+    def testSerial(self):
+        "Run the shards one after the other"
+        self.assertResults(jobs=1)
+
+    def testProcesses(self):
+        "Run the shards in worker processes"
+        self.assertResults(jobs=3)
+
+    def testFileDecoder(self):
+        "Decode the shards of a file in worker processes"
+        source = os.path.join(os.path.dirname(__file__), "samples",
+                              "sweep.wav")
+        spectrogram = Spectrogram(blocksize=2048, stepsize=1024)
+        sharded = ShardedPipe(FileDecoder(source) | spectrogram,
+                              shard_duration=2, jobs=2)
+        self.assertFalse(shards._gst_running())
+        sharded.run()
+        self.assertGreater(len(sharded.shards), 1)
+        expected = Spectrogram(blocksize=2048, stepsize=1024)
+        (FileDecoder(source) | expected).run()
+        result = spectrogram.results['spectrogram_analyzer']
+        expected = expected.results['spectrogram_analyzer']
+        self.assertEqual(result.data.shape, expected.data.shape)
+        self.assertTrue(np.allclose(result.data, expected.data, atol=1e-4))
+
+    def testPlan(self):
+        "Split the source into overlapping shards aligned on the frames"
+        spectrogram = Spectrogram(blocksize=4096, stepsize=1536)
+        sharded = ShardedPipe(ArrayDecoder(self.samples, 44100) | spectrogram,
+                              shard_duration=2)
+        shards = sharded.plan([spectrogram], 44100, 12, 8192)
+        self.assertIsNone(shards[0].keep_start)
+        self.assertIsNone(shards[-1].keep_end)
+        for shard, next_shard in zip(shards[:-1], shards[1:]):
+            keep_end = int(round(shard.keep_end * 44100))
+            self.assertEqual(keep_end % 24576, 0)
+            self.assertEqual(shard.keep_end, next_shard.keep_start)
+            # the overlap holds a whole frame
+            end = shard.start + shard.duration
+            self.assertGreaterEqual(end - shard.keep_end, 4096 / 44100)
+            self.assertGreaterEqual(next_shard.keep_start - next_shard.start,
+                                    4096 / 44100)
+
+    def testEvents(self):
+        "Keep the events found in the range of each shard"
+        pieces = []
+        shards = [Shard(10, 6, None, 15), Shard(14, 6, 15, None)]
+        for shard, times in zip(shards, [[1., 4.5, 5.5], [0.5, 1.5, 3.]]):
+            result = AnalyzerResult.factory(data_mode='label',
+                                            time_mode='event')
+            result.audio_metadata.start = shard.start
+            result.data_object.time = times
+            result.data_object.label = np.arange(len(times))
+            pieces.append((result, shard))
+        result = stitch_result(pieces, 10, 10, True)
+        self.assertEqual(result.data_object.time.tolist(), [1., 4.5, 5.5, 7.])
+        self.assertEqual(result.data_object.label.tolist(), [0, 1, 1, 2])
+        self.assertEqual(result.time.tolist(), [11., 14.5, 15.5, 17.])
+
+
+if __name__ == '__main__':
+    unittest.main(testRunner=TestRunner())
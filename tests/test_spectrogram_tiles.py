@@ -0,0 +1,64 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+
+from unit_timeside import *
+from timeside.decoder.core import ArrayDecoder
+from timeside.grapher.spectrogram_lin import SpectrogramLinear
+from timeside.grapher.spectrogram_tiles import SpectrogramTilesLinear
+import numpy as np
+import os
+import json
+import shutil
+import tempfile
+
+try:
+    from PIL import Image
+except ImportError:
+    import Image
+
+
+class TestSpectrogramTiles(unittest.TestCase):
+    "Test the tiled spectrograms"
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        t = np.arange(8000 * 20) / 8000
+        chirp = np.sin(2 * np.pi * (100 + 50 * t) * t) * 0.5
+        self.samples = chirp[:, np.newaxis]
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def testPyramid(self):
+        "Write the tiles of every level and their manifest"
+        tiles = SpectrogramTilesLinear(self.path, samples_per_pixel=64,
+                                       height=128, tile_size=64)
+        grapher = SpectrogramLinear(width=2500, height=128)
+        (ArrayDecoder(self.samples, 8000) | tiles | grapher).run()
+
+        manifest = json.load(open(os.path.join(self.path, 'manifest.json')))
+        self.assertEqual(manifest, json.loads(json.dumps(tiles.render())))
+        widths = [level['width'] for level in manifest['levels']]
+        self.assertEqual(widths, [2500, 1250, 625, 313, 157, 79, 40])
+        for index, level in enumerate(manifest['levels']):
+            self.assertEqual(level['samples_per_pixel'], 64 << index)
+            self.assertEqual(level['columns'], int(np.ceil(level['width'] / 64)))
+
+        # the level 0 matches the full spectrogram
+        image = np.asarray(grapher.render())
+        for column in (0, 20, 39):
+            for row in (0, 1):
+                tile = Image.open(os.path.join(
+                    self.path, manifest['tiles'].format(
+                        level=0, column=column, row=row)))
+                x, y = column * 64, row * 64
+                self.assertTrue(np.array_equal(
+                    np.asarray(tile), image[y:y + 64, x:x + tile.size[0]]))
+        last = Image.open(os.path.join(self.path, '6', '0_1.png'))
+        self.assertEqual(last.size, (40, 64))
+
+
+if __name__ == '__main__':
+    unittest.main(testRunner=TestRunner())
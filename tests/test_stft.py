@@ -0,0 +1,88 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from unit_timeside import *
+from timeside.core import STFT, ProcessPipe
+from timeside.decoder.core import ArrayDecoder
+from timeside.analyzer.spectrogram import Spectrogram
+import numpy as np
+
+
+class TestSTFT(unittest.TestCase):
+    "Test the STFT shared between processors"
+
+    def setUp(self):
+        self.frames = [np.random.randn(1024, 2) for i in range(10)]
+
+    def testTransform(self):
+        "Transform windowed frames of a channel"
+        stft = STFT(1024, 1024, window='hanning', fft_size=2048, channel=1)
+        subscriber = stft.subscribe()
+        for frames in self.frames:
+            expected = np.fft.rfft(frames[:, 1] * np.hanning(1024), 2048)
+            spectrum = subscriber.process(frames)
+            self.assertTrue(np.allclose(spectrum.fft, expected))
+            self.assertTrue(np.allclose(spectrum.magnitude, np.abs(expected)))
+            self.assertTrue(np.allclose(spectrum.phase, np.angle(expected)))
+
+    def testDownmix(self):
+        "Transform the mono downmix of the frames"
+        subscriber = STFT(1024, 1024).subscribe()
+        for frames in self.frames:
+            expected = np.fft.rfft(frames.mean(axis=-1))
+            self.assertTrue(np.allclose(subscriber.process(frames).fft,
+                                        expected))
+
+    def testSharing(self):
+        "Compute each frame once for all the subscribers"
+        stft = STFT(1024, 1024)
+        first, second = stft.subscribe(), stft.subscribe()
+        first_spectra = [first.process(frames) for frames in self.frames[:5]]
+        for frames, spectrum in zip(self.frames, first_spectra):
+            self.assertIs(second.process(frames), spectrum)
+        # Frames read by both subscribers are dropped from the cache
+        self.assertEqual(len(stft.spectra), 0)
+        for frames in self.frames[5:]:
+            self.assertIs(second.process(frames), first.process(frames))
+
+    def testBatch(self):
+        "Transform several frames at once, from the cache when available"
+        stft = STFT(1024, 1024, window='hanning')
+        first, second = stft.subscribe(), stft.subscribe()
+        first_spectra = [first.process(frames) for frames in self.frames[:3]]
+        spectra = second.process_many(np.array(self.frames[:6]))
+        self.assertEqual(len(spectra), 6)
+        for spectrum, cached in zip(spectra, first_spectra):
+            self.assertIs(spectrum, cached)
+        for frames, spectrum in zip(self.frames[3:6], spectra[3:]):
+            expected = np.fft.rfft(frames.mean(axis=-1) * np.hanning(1024))
+            self.assertTrue(np.allclose(spectrum.fft, expected))
+            self.assertIs(first.process(frames), spectrum)
+
+    def testReadOnly(self):
+        "Shared spectra can not be modified"
+        spectrum = STFT(1024, 1024).subscribe().process(self.frames[0])
+        self.assertRaises(ValueError, spectrum.magnitude.__setitem__, 0, 0)
+
+    def testPipeSharing(self):
+        "Share the STFT between processors requesting the same parameters"
+        pipe = ProcessPipe()
+        first = pipe.stft(2048, 1024, fft_size=2048)
+        second = pipe.stft(2048, 1024, fft_size=2048)
+        other = pipe.stft(2048, 512, fft_size=2048)
+        self.assertIs(first.stft, second.stft)
+        self.assertIsNot(first.stft, other.stft)
+
+    def testSpectrogram(self):
+        "Run the spectrogram analyzer on the STFT of the pipe"
+        samples = np.random.randn(44100 * 2, 2)
+        analyzer = Spectrogram(blocksize=2048, stepsize=1024)
+        (ArrayDecoder(samples=samples, samplerate=44100) | analyzer).run()
+        spectrogram = analyzer.results['spectrogram_analyzer'].data
+        expected = np.abs(np.fft.rfft(samples[1024:3072].mean(axis=-1)))
+        self.assertEqual(spectrogram.shape[1], 1025)
+        self.assertTrue(np.allclose(spectrogram[1], expected))
+
+
+if __name__ == '__main__':
+    unittest.main(testRunner=TestRunner())
@@ -2,9 +2,14 @@
 
 import api
 import core
-import decoder
-import analyzer
-import grapher
-import encoder
+from plugins import lazy_package
 
 __version__ = '0.5.2'
+
+# decoder, analyzer, grapher and encoder are imported on first access
+lazy_package(__name__, {
+    'decoder': 'decoder',
+    'analyzer': 'analyzer',
+    'grapher': 'grapher',
+    'encoder': 'encoder',
+    })
@@ -1,16 +1,22 @@
 # -*- coding: utf-8 -*-
 
-from level import *
-from dc import *
-from aubio_temporal import *
-from aubio_pitch import *
-from aubio_mfcc import *
-from aubio_melenergy import *
-from aubio_specdesc import *
-from yaafe import * # TF : add Yaafe analyzer
-from spectrogram import Spectrogram
-from waveform import Waveform
-from vamp_plugin import VampSimpleHost
-from irit_speech_entropy import IRITSpeechEntropy
-from irit_speech_4hz import IRITSpeech4Hz
-from odf import OnsetDetectionFunction
+from timeside.plugins import lazy_package
+
+lazy_package(__name__, {
+    'Level': 'level',
+    'MeanDCShift': 'dc',
+    'AubioTemporal': 'aubio_temporal',
+    'AubioPitch': 'aubio_pitch',
+    'AubioMfcc': 'aubio_mfcc',
+    'AubioMelEnergy': 'aubio_melenergy',
+    'AubioSpecdesc': 'aubio_specdesc',
+    'Yaafe': 'yaafe', # TF : add Yaafe analyzer
+    'Spectrogram': 'spectrogram',
+    'Waveform': 'waveform',
+    'VampSimpleHost': 'vamp_plugin',
+    'IRITSpeechEntropy': 'irit_speech_entropy',
+    'IRITSpeech4Hz': 'irit_speech_4hz',
+    'OnsetDetectionFunction': 'odf',
+    'PeakPyramid': 'peak_pyramid',
+    'PeakPyramidReader': 'peak_pyramid',
+    })
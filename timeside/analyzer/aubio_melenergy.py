@@ -47,7 +47,7 @@ class AubioMelEnergy(Analyzer):
         self.melenergy = filterbank(self.n_filters, self.input_blocksize)
         self.melenergy.set_mel_coeffs_slaney(samplerate)
         self.block_read = 0
-        self.melenergy_results = []
+        self.melenergy_results = self.new_buffer(shape=None, dtype=None)
 
     @staticmethod
     @interfacedoc
@@ -77,5 +77,5 @@ class AubioMelEnergy(Analyzer):
         melenergy = self.new_result(data_mode='value', time_mode='framewise')
         melenergy.parameters = dict(n_filters=self.n_filters,
                                     n_coeffs=self.n_coeffs)
-        melenergy.data_object.value = self.melenergy_results
+        melenergy.data_object.value = self.melenergy_results.array
         self.process_pipe.results.add(melenergy)
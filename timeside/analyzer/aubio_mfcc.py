@@ -49,7 +49,8 @@ class AubioMfcc(Analyzer):
                          self.n_coeffs,
                          samplerate)
         self.block_read = 0
-        self.mfcc_results = numpy.zeros([self.n_coeffs, ])
+        self.mfcc_results = self.new_buffer(shape=(self.n_coeffs,))
+        self.mfcc_results.append(numpy.zeros([self.n_coeffs, ]))
 
     @staticmethod
     @interfacedoc
@@ -71,7 +72,7 @@ class AubioMfcc(Analyzer):
     def process(self, frames, eod=False):
         fftgrain = self.pvoc(frames)
         coeffs = self.mfcc(fftgrain)
-        self.mfcc_results = numpy.vstack((self.mfcc_results, coeffs))
+        self.mfcc_results.append(coeffs)
         self.block_read += 1
         return frames, eod
 
@@ -79,5 +80,5 @@ class AubioMfcc(Analyzer):
         mfcc = self.new_result(data_mode='value', time_mode='framewise')
         mfcc.parameters = dict(n_filters=self.n_filters,
                                n_coeffs=self.n_coeffs)
-        mfcc.data_object.value = self.mfcc_results
+        mfcc.data_object.value = self.mfcc_results.array
         self.process_pipe.results.add(mfcc)
@@ -45,8 +45,8 @@ class AubioPitch(Analyzer):
                        samplerate)
         self.aubio_pitch.set_unit("freq")
         self.block_read = 0
-        self.pitches = []
-        self.pitch_confidences = []
+        self.pitches = self.new_buffer(dtype=None)
+        self.pitch_confidences = self.new_buffer(dtype=None)
 
     @staticmethod
     @interfacedoc
@@ -70,8 +70,8 @@ class AubioPitch(Analyzer):
     @frames_adapter
     def process(self, frames, eod=False):
         #time = self.block_read * self.input_stepsize * 1. / self.samplerate()
-        self.pitches += [self.aubio_pitch(frames)[0]]
-        self.pitch_confidences += [self.aubio_pitch.get_confidence()]
+        self.pitches.append(self.aubio_pitch(frames)[0])
+        self.pitch_confidences.append(self.aubio_pitch.get_confidence())
         self.block_read += 1
         return frames, eod
 
@@ -84,12 +84,12 @@ class AubioPitch(Analyzer):
         pitch.id_metadata.id += '.' + "pitch"
         pitch.id_metadata.name += ' ' + "pitch"
         pitch.id_metadata.unit = "Hz"
-        pitch.data_object.value = self.pitches
+        pitch.data_object.value = self.pitches.array
         self.process_pipe.results.add(pitch)
 
         pitch_confidence = self.new_result(data_mode='value', time_mode='framewise')
         pitch_confidence.id_metadata.id += '.' + "pitch_confidence"
         pitch_confidence.id_metadata.name += ' ' + "pitch confidence"
         pitch_confidence.id_metadata.unit = None
-        pitch_confidence.data_object.value = self.pitch_confidences
+        pitch_confidence.data_object.value = self.pitch_confidences.array
         self.process_pipe.results.add(pitch_confidence)
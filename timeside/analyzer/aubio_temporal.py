@@ -20,7 +20,7 @@
 # Author: Paul Brossier <piem@piem.org>
 
 from timeside.core import implements, interfacedoc
-from timeside.analyzer.core import Analyzer
+from timeside.analyzer.core import Analyzer, ResultBuffer
 from timeside.api import IAnalyzer
 from preprocessors import downmix_to_mono, frames_adapter
 from aubio import onset, tempo
@@ -30,6 +30,7 @@ import numpy
 
 class AubioTemporal(Analyzer):
     implements(IAnalyzer)
+    shardable = False
 
     def __init__(self):
         super(AubioTemporal, self).__init__()
@@ -49,9 +50,10 @@ class AubioTemporal(Analyzer):
         self.t = tempo(
             "default", self.input_blocksize, self.input_stepsize, samplerate)
         self.block_read = 0
-        self.onsets = []
-        self.beats = []
-        self.beat_confidences = []
+        # onsets and beats are sparse, their buffers start small
+        self.onsets = ResultBuffer()
+        self.beats = ResultBuffer()
+        self.beat_confidences = ResultBuffer()
 
     @staticmethod
     @interfacedoc
@@ -76,14 +78,16 @@ class AubioTemporal(Analyzer):
     @frames_adapter
     def process(self, frames, eod=False):
         if self.o(frames):
-            self.onsets += [self.o.get_last_s()]
+            self.onsets.append(self.o.get_last_s())
         if self.t(frames):
-            self.beats += [self.t.get_last_s()]
-            self.beat_confidences += [self.t.get_confidence()]
+            self.beats.append(self.t.get_last_s())
+            self.beat_confidences.append(self.t.get_confidence())
         self.block_read += 1
         return frames, eod
 
     def post_process(self):
+        onset_times = self.onsets.array
+        beat_times = self.beats.array
 
         #---------------------------------
         #  Onsets: Event (time, "Onset")
@@ -92,8 +96,8 @@ class AubioTemporal(Analyzer):
         onsets.id_metadata.id += '.' + 'onset'
         onsets.id_metadata.name += ' ' + 'Onset'
         onsets.id_metadata.unit = 's'
-        onsets.data_object.time = self.onsets
-        onsets.data_object.label = numpy.ones(len(self.onsets))
+        onsets.data_object.time = onset_times
+        onsets.data_object.label = numpy.ones(len(onset_times))
         onsets.label_metadata.label = {1: 'Onset'}
 
         self.process_pipe.results.add(onsets)
@@ -105,10 +109,10 @@ class AubioTemporal(Analyzer):
         onsetrate.id_metadata.id += '.' + "onset_rate"
         onsetrate.id_metadata.name = " " + "Onset Rate"
         onsetrate.id_metadata.unit = "bpm"
-        if len(self.onsets) > 1:
-            periods = numpy.diff(self.onsets)
+        if len(onset_times) > 1:
+            periods = numpy.diff(onset_times)
             periods = numpy.append(periods, periods[-1])
-            onsetrate.data_object.time = self.onsets
+            onsetrate.data_object.time = onset_times
             onsetrate.data_object.duration = periods
             onsetrate.data_object.value = 60. / periods
         else:
@@ -124,8 +128,8 @@ class AubioTemporal(Analyzer):
         beats.id_metadata.id += '.' + "beat"
         beats.id_metadata.name += " " + "Beats"
         beats.id_metadata.unit = "s"
-        beats.data_object.time = self.beats
-        beats.data_object.label = numpy.ones(len(self.beats))
+        beats.data_object.time = beat_times
+        beats.data_object.label = numpy.ones(len(beat_times))
         beats.label_metadata.label = {1: 'Beat'}
 
         self.process_pipe.results.add(beats)
@@ -137,8 +141,8 @@ class AubioTemporal(Analyzer):
         beat_confidences.id_metadata.id += '.' + "beat_confidence"
         beat_confidences.id_metadata.name += " " + "Beat confidences"
         beat_confidences.id_metadata.unit = None
-        beat_confidences.data_object.time = self.beats
-        beat_confidences.data_object.value = self.beat_confidences
+        beat_confidences.data_object.time = beat_times
+        beat_confidences.data_object.value = self.beat_confidences.array
 
         self.process_pipe.results.add(beat_confidences)
 
@@ -149,10 +153,10 @@ class AubioTemporal(Analyzer):
         bpm.id_metadata.id += '.' + "bpm"
         bpm.id_metadata.name += ' ' + "bpm"
         bpm.id_metadata.unit = "bpm"
-        if len(self.beats) > 1:
-            periods = numpy.diff(self.beats)
+        if len(beat_times) > 1:
+            periods = numpy.diff(beat_times)
             periods = numpy.append(periods, periods[-1])
-            bpm.data_object.time = self.beats
+            bpm.data_object.time = beat_times
             bpm.data_object.duration = periods
             bpm.data_object.value = 60. / periods
         else:
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2007-2013 Parisson
+#
+# This file is part of TimeSide.
+
+# TimeSide is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+
+# TimeSide is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with TimeSide.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import hashlib
+import tempfile
+
+from timeside.__init__ import __version__
+from timeside.analyzer.core import Analyzer, AnalyzerResultContainer
+from timeside.decoder.utils import uri2path
+
+
+class ResultCache(object):
+    """
+    On-disk cache of analyzer results
+
+    The results of an analyzer are stored as a JSON file keyed by the content
+    of the source, the decoded segment, the channels, samplerate and
+    blocksize the pipe is run with, and the id, class, parameters and
+    TimeSide version of the analyzer. The content hash of the local files is
+    kept along with their modification time and size, so that a file is
+    only read again when it changes.
+
+    Pass the cache to ProcessPipe.run() to skip the cached analyzers.
+
+    Parameters
+    ----------
+    path : str
+        directory of the cache, created if needed
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.sources_path = os.path.join(self.path, 'sources')
+        if not os.path.isdir(self.sources_path):
+            os.makedirs(self.sources_path)
+        self.hashes = {}
+
+    def source_hash(self, source):
+        """Return the content hash of a source, or None if it has none"""
+        content_hash = getattr(source, 'content_hash', None)
+        if content_hash is None:
+            return None
+        path = uri2path(getattr(source, 'uri', None) or '')
+        if path is None:
+            return content_hash()
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        stat_key = hashlib.sha1(repr((path, stat.st_mtime,
+                                      stat.st_size))).hexdigest()
+        if stat_key not in self.hashes:
+            stat_file = os.path.join(self.sources_path, stat_key)
+            try:
+                with open(stat_file) as f:
+                    self.hashes[stat_key] = f.read()
+            except IOError:
+                self.hashes[stat_key] = content_hash()
+                self._write(stat_file, self.hashes[stat_key])
+        return self.hashes[stat_key]
+
+    def key(self, source, processor, channels=None, samplerate=None,
+            blocksize=None):
+        """Return the key of the results of processor in a pipe run on source
+        with the given channels, samplerate and blocksize, or None if they
+        can not be cached"""
+        if not isinstance(processor, Analyzer):
+            return None
+        content = self.source_hash(source)
+        if content is None:
+            return None
+        parameters = getattr(processor, 'parameters', None)
+        if parameters is None:
+            parameters = processor.get_parameters()
+        segment = None
+        if getattr(source, 'is_segment', False):
+            segment = (source.uri_start, source.uri_duration)
+        cls = processor.__class__
+        key = (content, segment, channels, samplerate, blocksize,
+               processor.id(), cls.__module__ + '.' + cls.__name__,
+               sorted(parameters.items()), __version__)
+        return hashlib.sha1(repr(key)).hexdigest()
+
+    def file(self, key):
+        return os.path.join(self.path, key + '.json')
+
+    def get(self, key):
+        """Return the AnalyzerResultContainer of an entry, or None if the
+        entry is not in the cache"""
+        try:
+            with open(self.file(key)) as f:
+                return AnalyzerResultContainer.from_json(f.read())
+        except (IOError, ValueError):
+            return None
+
+    def set(self, key, results):
+        """Store the AnalyzerResultContainer of an entry"""
+        self._write(self.file(key), results.to_json())
+
+    def _write(self, path, data):
+        # Entries only become visible once completely written
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            f.write(data)
+        os.rename(tmp_path, path)
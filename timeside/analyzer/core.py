@@ -24,6 +24,7 @@
 from __future__ import division
 
 from timeside.core import Processor
+from timeside.analyzer.preprocessors import subscribe_preprocessors
 from timeside.__init__ import __version__
 import numpy
 from collections import OrderedDict
@@ -959,12 +960,96 @@ class AnalyzerResultContainer(dict):
         return results
 
 
+class ResultBuffer(object):
+
+    '''
+    Growable buffer of framewise results
+
+    Rows are written in place into a preallocated array whose capacity is
+    doubled when it is full, so that appending a row does not copy the
+    previous ones. The rows are handed out as a view of this array.
+
+    >>> buf = ResultBuffer(shape=(2,), size=1)
+    >>> buf.append([1, 2])
+    >>> buf.extend([[3, 4], [5, 6]])
+    >>> buf.array
+    array([[ 1.,  2.],
+           [ 3.,  4.],
+           [ 5.,  6.]])
+
+    Parameters
+    ----------
+    shape : tuple
+        shape of a row, given by the first row if None
+    dtype : numpy dtype
+        type of the values, given by the first row if None
+    size : int
+        initial number of rows of the buffer
+    '''
+
+    def __init__(self, shape=(), dtype='float64', size=None):
+        self.shape = shape if shape is None else tuple(shape)
+        self.dtype = dtype if dtype is None else numpy.dtype(dtype)
+        self.size = max(size or 64, 1)
+        self.len = 0
+        self.data = None
+
+    def __len__(self):
+        return self.len
+
+    def _allocate(self, rows):
+        rows = numpy.asarray(rows)
+        if self.shape is None:
+            self.shape = rows.shape[1:]
+        if self.dtype is None:
+            self.dtype = rows.dtype
+        self.data = numpy.empty((max(self.size, len(rows)),) + self.shape,
+                                self.dtype)
+
+    def append(self, row):
+        "Append a row to the buffer"
+        if self.data is None:
+            self._allocate([row])
+        elif self.len == len(self.data):
+            self.resize(2 * len(self.data))
+        self.data[self.len] = row
+        self.len += 1
+
+    def extend(self, rows):
+        "Append several rows to the buffer"
+        if self.data is None:
+            self._allocate(rows)
+        end = self.len + len(rows)
+        if end > len(self.data):
+            self.resize(max(end, 2 * len(self.data)))
+        self.data[self.len:end] = rows
+        self.len = end
+
+    def resize(self, size):
+        "Change the capacity of the buffer"
+        data = numpy.empty((size,) + self.shape, self.dtype)
+        data[:self.len] = self.data[:self.len]
+        self.data = data
+
+    @property
+    def array(self):
+        "View of the rows of the buffer"
+        if self.data is None:
+            return numpy.empty((0,) + (self.shape or ()),
+                               self.dtype or numpy.float64)
+        return self.data[:self.len]
+
+
 class Analyzer(Processor):
 
     '''
     Generic class for the analyzers
     '''
 
+    # framewise, event and segment results can be stitched over time shards,
+    # analyzers keeping a global state must set it to False
+    shardable = True
+
     def __init__(self):
         super(Analyzer, self).__init__()
 
@@ -980,6 +1065,8 @@ class Analyzer(Processor):
         self.result_blocksize = self.input_blocksize
         self.result_stepsize = self.input_stepsize
 
+        subscribe_preprocessors(self)
+
     @property
     def results(self):
 
@@ -999,6 +1086,26 @@ class Analyzer(Processor):
     def unit():
         return ""
 
+    def new_buffer(self, shape=(), dtype='float64', stepsize=None):
+        '''
+        Create a new ResultBuffer sized for one row per step of the input
+
+        Parameters
+        ----------
+        shape : tuple
+            shape of a row, given by the first row if None
+        dtype : numpy dtype
+            type of the values, given by the first row if None
+        stepsize : int
+            number of input frames per row, input_stepsize by default
+        '''
+        if stepsize is None:
+            stepsize = self.input_stepsize
+        size = None
+        if self.source_totalframes and stepsize:
+            size = int(numpy.ceil(self.source_totalframes / stepsize)) + 1
+        return ResultBuffer(shape=shape, dtype=dtype, size=size)
+
     def new_result(self, data_mode='value', time_mode='framewise'):
         '''
         Create a new result
@@ -20,13 +20,26 @@
 # Author: Guillaume Pellerin <yomguy@parisson.com>
 
 from timeside.core import implements, interfacedoc
-from timeside.analyzer.core import Analyzer
+from timeside.analyzer.core import Analyzer, ResultBuffer
 from timeside.api import IValueAnalyzer
 import numpy
 
 
 class MeanDCShift(Analyzer):
     implements(IValueAnalyzer)
+    shardable = False
+
+    def __init__(self, framewise=False):
+        """
+        Construct a new MeanDCShift analyzer
+
+        Parameters
+        ----------
+        framewise : bool
+            also return the DC shift of each block
+        """
+        super(MeanDCShift, self).__init__()
+        self.framewise = framewise
 
     @interfacedoc
     def setup(self, channels=None,
@@ -35,7 +48,11 @@ class MeanDCShift(Analyzer):
               totalframes=None):
         super(MeanDCShift, self).setup(
             channels, samplerate, blocksize, totalframes)
-        self.values = numpy.array([0])
+        # The mean of the blocks includes an initial value of 0
+        self.sum = 0.
+        self.count = 1
+        if self.framewise:
+            self.values = ResultBuffer()
 
     @staticmethod
     @interfacedoc
@@ -54,11 +71,24 @@ class MeanDCShift(Analyzer):
 
     def process(self, frames, eod=False):
         if frames.size:
-            self.values = numpy.append(self.values, numpy.mean(frames))
+            value = numpy.mean(frames)
+            self.sum += value
+            self.count += 1
+            if self.framewise:
+                self.values.append(value)
         return frames, eod
 
     def post_process(self):
         dc_result = self.new_result(data_mode='value', time_mode='global')
         dc_result.data_object.value = numpy.round(
-            numpy.mean(100 * self.values), 3)
+            100 * self.sum / self.count, 3)
         self.process_pipe.results.add(dc_result)
+
+        if self.framewise:
+            dc_frames = self.new_result(data_mode='value',
+                                        time_mode='framewise')
+            dc_frames.id_metadata.id += '.' + "framewise"
+            dc_frames.id_metadata.name += ' ' + "per block"
+            dc_frames.data_object.value = numpy.round(
+                100 * self.values.array, 3)
+            self.process_pipe.results.add(dc_frames)
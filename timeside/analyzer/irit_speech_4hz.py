@@ -24,8 +24,7 @@ from timeside.analyzer.core import Analyzer
 from timeside.analyzer.utils import melFilterBank, computeModulation
 from timeside.analyzer.utils import segmentFromValues
 from timeside.api import IAnalyzer
-from numpy import array, hamming, dot, mean, float
-from numpy.fft import rfft
+from numpy import array, dot, mean, float
 from scipy.signal import firwin, lfilter
 
 
@@ -35,7 +34,7 @@ class IRITSpeech4Hz(Analyzer):
     Segmentor based on the analysis of the 4Hz energy modulation.
 
     Properties:
-        - energy4hz 		(list) 		: List of the 4Hz energy by frame for the modulation computation
+        - energy4hz 		(ResultBuffer) 	: Buffer of the 4Hz energy by frame for the modulation computation
         - threshold 		(float) 	: Threshold for the classification Speech/NonSpeech
         - frequency_center	(float)		: Center of the frequency range where the energy is extracted
         - frequency_width	(float)		: Width of the frequency range where the energy is extracted
@@ -46,13 +45,13 @@ class IRITSpeech4Hz(Analyzer):
         - melFilter		(numpy array)	: Mel Filter bank
         - modulLen			(float)		: Length (in second) of the modulation computation window
     '''
+    shardable = False
 
     @interfacedoc
     def setup(self, channels=None, samplerate=None, blocksize=None,
               totalframes=None):
         super(IRITSpeech4Hz, self).setup(
             channels, samplerate, blocksize, totalframes)
-        self.energy4hz = []
         # Classification
         self.threshold = 2.0
 
@@ -66,6 +65,10 @@ class IRITSpeech4Hz(Analyzer):
         self.nbFilters = 30
         self.modulLen = 2.0
         self.melFilter = melFilterBank(self.nbFilters, self.nFFT, samplerate)
+        self.energy4hz = self.new_buffer(shape=(self.nbFilters,))
+        # FFT of the hamming windowed first channel of the frames
+        self.stft = self.shared_stft(blocksize, blocksize, window='hamming',
+                                     fft_size=2 * self.nFFT, channel=0)
 
     @staticmethod
     @interfacedoc
@@ -90,12 +93,8 @@ class IRITSpeech4Hz(Analyzer):
 
         '''
 
-        frames = frames.T[0]
-        # windowing of the frame (could be a changeable property)
-        w = frames * hamming(len(frames))
-
         # Mel scale spectrum extraction
-        f = abs(rfft(w, n=2 * self.nFFT)[0:self.nFFT])
+        f = self.stft.process(frames).magnitude[0:self.nFFT]
         e = dot(f ** 2, self.melFilter)
 
         self.energy4hz.append(e)
@@ -113,8 +112,7 @@ class IRITSpeech4Hz(Analyzer):
         num = firwin(self.orderFilter, Wn, pass_zero=False)
 
         # Energy on the frequency range
-        self.energy4hz = array(self.energy4hz)
-        energy = lfilter(num, 1, self.energy4hz.T, 0)
+        energy = lfilter(num, 1, self.energy4hz.array.T, 0)
         energy = sum(energy)
 
         # Normalization
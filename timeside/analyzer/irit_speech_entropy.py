@@ -30,13 +30,14 @@ from scipy.ndimage.morphology import binary_opening
 
 class IRITSpeechEntropy(Analyzer):
     implements(IAnalyzer)
+    shardable = False
 
     @interfacedoc
     def setup(self, channels=None, samplerate=None, blocksize=None,
               totalframes=None):
         super(IRITSpeechEntropy, self).setup(
             channels, samplerate, blocksize, totalframes)
-        self.entropyValue = []
+        self.entropyValue = self.new_buffer()
         self.threshold = 0.4
         self.smoothLen = 5
         self.modulLen = 2
@@ -65,7 +66,7 @@ class IRITSpeechEntropy(Analyzer):
 
     def post_process(self):
 
-        entropyValue = array(self.entropyValue)
+        entropyValue = self.entropyValue.array
         w = self.modulLen * self.samplerate() / self.blocksize()
         modulentropy = computeModulation(entropyValue, w, False)
         confEntropy = array(modulentropy - self.threshold) / self.threshold
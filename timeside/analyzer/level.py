@@ -21,13 +21,26 @@
 # Author: Guillaume Pellerin <yomguy@parisson.com>
 
 from timeside.core import implements, interfacedoc
-from timeside.analyzer.core import Analyzer
+from timeside.analyzer.core import Analyzer, ResultBuffer
 from timeside.api import IValueAnalyzer
 import numpy as np
 
 
 class Level(Analyzer):
     implements(IValueAnalyzer)
+    shardable = False
+
+    def __init__(self, framewise=False):
+        """
+        Construct a new Level analyzer
+
+        Parameters
+        ----------
+        framewise : bool
+            also return the max and RMS levels of each block
+        """
+        super(Level, self).__init__()
+        self.framewise = framewise
 
     @interfacedoc
     def setup(self, channels=None, samplerate=None, blocksize=None,
@@ -35,8 +48,12 @@ class Level(Analyzer):
         super(Level, self).setup(channels, samplerate, blocksize, totalframes)
         # max_level
         self.max_value = 0
-        # rms_level
-        self.mean_values = np.array([])
+        # rms_level, from the sum of the mean square values of the blocks
+        self.mean_square_sum = 0.
+        self.count = 0
+        if self.framewise:
+            self.max_values = ResultBuffer()
+            self.mean_square_values = ResultBuffer()
 
     @staticmethod
     @interfacedoc
@@ -60,8 +77,12 @@ class Level(Analyzer):
             if max_value > self.max_value:
                 self.max_value = max_value
             # rms_level
-            self.mean_values = np.append(self.mean_values,
-                                            np.mean(np.square(frames)))
+            mean_square = np.mean(np.square(frames))
+            self.mean_square_sum += mean_square
+            self.count += 1
+            if self.framewise:
+                self.max_values.append(max_value)
+                self.mean_square_values.append(mean_square)
         return frames, eod
 
     def post_process(self):
@@ -79,7 +100,28 @@ class Level(Analyzer):
         rms_level.id_metadata.id += '.' + "rms"
         rms_level.id_metadata.name += ' ' + "RMS"
 
+        if self.count:
+            mean_square = self.mean_square_sum / self.count
+        else:
+            # no samples, as the mean of an empty array
+            mean_square = np.nan
         rms_level.data_object.value = np.round(20*np.log10(
-                                np.sqrt(np.mean(self.mean_values))), 3)
+            np.sqrt(mean_square)), 3)
         self.process_pipe.results.add(rms_level)
 
+        if self.framewise:
+            max_frames = self.new_result(data_mode='value',
+                                         time_mode='framewise')
+            max_frames.id_metadata.id += '.' + "max_framewise"
+            max_frames.id_metadata.name += ' ' + "Max per block"
+            max_frames.data_object.value = np.round(
+                20*np.log10(self.max_values.array), 3)
+            self.process_pipe.results.add(max_frames)
+
+            rms_frames = self.new_result(data_mode='value',
+                                         time_mode='framewise')
+            rms_frames.id_metadata.id += '.' + "rms_framewise"
+            rms_frames.id_metadata.name += ' ' + "RMS per block"
+            rms_frames.data_object.value = np.round(
+                10*np.log10(self.mean_square_values.array), 3)
+            self.process_pipe.results.add(rms_frames)
@@ -30,6 +30,7 @@ from scipy import signal
 
 class OnsetDetectionFunction(Analyzer):
     implements(IAnalyzer)
+    shardable = False
 
     def __init__(self, blocksize=1024, stepsize=None):
         super(OnsetDetectionFunction, self).__init__()
@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2013 Parisson SARL
+
+# This file is part of TimeSide.
+
+# TimeSide is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+
+# TimeSide is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with TimeSide.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import division
+
+from timeside.core import implements, interfacedoc
+from timeside.analyzer.core import Analyzer
+from timeside.api import IAnalyzer
+import numpy as np
+import struct
+
+
+# Binary layout of a pyramid file: a header, the number of pixels of each
+# level, then the (min, max) pairs of each level as little-endian integers
+PYRAMID_MAGIC = 'TSPK'
+PYRAMID_VERSION = 1
+PYRAMID_HEADER = struct.Struct('<4sBBHIIQ')
+PYRAMID_LEVEL = struct.Struct('<Q')
+
+
+def pyramid_levels(peaks):
+    """ Build the levels of a peak pyramid from its finest level.
+    Each level merges the (min, max) pairs of two pixels of the previous one,
+    up to a single pixel. """
+    levels = [peaks]
+    while len(levels[-1]) > 1:
+        previous = levels[-1]
+        if len(previous) % 2:
+            previous = np.concatenate([previous, previous[-1:]])
+        pairs = previous.reshape(-1, 2, 2)
+        level = np.empty((len(pairs), 2), dtype=peaks.dtype)
+        level[:, 0] = pairs[:, :, 0].min(axis=1)
+        level[:, 1] = pairs[:, :, 1].max(axis=1)
+        levels.append(level)
+    return levels
+
+
+class PeakPyramid(Analyzer):
+    """ Min/max peaks of the signal at 2^k times base samples per pixel,
+    quantized as int8 or int16 """
+    implements(IAnalyzer)
+    shardable = False
+
+    def __init__(self, base=256, dtype='int16', output=None):
+        """
+        Construct a new PeakPyramid analyzer
+
+        Parameters
+        ----------
+        base : int
+            number of samples per pixel of the finest level
+        dtype : 'int8' or 'int16'
+            type of the quantized peaks
+        output : str
+            path of a file to write the pyramid to
+        """
+        super(PeakPyramid, self).__init__()
+        self.base = base
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in (np.dtype('int8'), np.dtype('int16')):
+            raise ValueError('peaks must be int8 or int16, not %s' % dtype)
+        self.output = output
+
+    @interfacedoc
+    def setup(self, channels=None, samplerate=None,
+              blocksize=None, totalframes=None):
+        super(PeakPyramid, self).setup(channels, samplerate,
+                                       blocksize, totalframes)
+        self.values = self.new_buffer(shape=(2,), dtype=self.dtype,
+                                      stepsize=self.base)
+        self.remainder = None
+        self.nb_frames = 0
+        self.levels = []
+        self.result_blocksize = self.base
+        self.result_stepsize = self.base
+
+    @staticmethod
+    @interfacedoc
+    def id():
+        return "peak_pyramid"
+
+    @staticmethod
+    @interfacedoc
+    def name():
+        return "Peak Pyramid"
+
+    @staticmethod
+    @interfacedoc
+    def unit():
+        return ""
+
+    def quantize(self, lows, highs):
+        info = np.iinfo(self.dtype)
+        peaks = np.empty((len(lows), 2))
+        # round outwards so that the envelope always holds the signal
+        peaks[:, 0] = np.floor(lows * info.max)
+        peaks[:, 1] = np.ceil(highs * info.max)
+        return np.clip(peaks, info.min, info.max).astype(self.dtype)
+
+    def process(self, frames, eod=False):
+        self.nb_frames += len(frames)
+        samples = frames.reshape(len(frames), -1)
+        if self.remainder is not None and len(self.remainder):
+            samples = np.concatenate([self.remainder, samples])
+        nb_pixels = len(samples) // self.base
+        # the peaks of a pixel are taken over all its channels
+        columns = samples[:nb_pixels * self.base].reshape(
+            nb_pixels, self.base * samples.shape[1])
+        lows, highs = columns.min(axis=1), columns.max(axis=1)
+        remainder = samples[nb_pixels * self.base:]
+        if eod and len(remainder):
+            lows = np.append(lows, remainder.min())
+            highs = np.append(highs, remainder.max())
+            remainder = remainder[:0]
+        if len(lows):
+            self.values.extend(self.quantize(lows, highs))
+        self.remainder = remainder.copy()
+        return frames, eod
+
+    def post_process(self):
+        self.levels = pyramid_levels(self.values.array)
+        pyramid = self.new_result(data_mode='value', time_mode='framewise')
+        pyramid.data_object.value = self.values.array
+        self.process_pipe.results.add(pyramid)
+        if self.output:
+            self.write(self.output)
+
+    def write(self, path):
+        """ Write the pyramid to a binary file """
+        f = open(path, 'wb')
+        try:
+            f.write(PYRAMID_HEADER.pack(
+                PYRAMID_MAGIC, PYRAMID_VERSION, self.dtype.itemsize,
+                len(self.levels), self.input_samplerate, self.base,
+                self.nb_frames))
+            for level in self.levels:
+                f.write(PYRAMID_LEVEL.pack(len(level)))
+            for level in self.levels:
+                f.write(level.astype(self.dtype.newbyteorder('<')).tostring())
+        finally:
+            f.close()
+
+    def reader(self):
+        """ Return a PeakPyramidReader over the levels in memory """
+        return PeakPyramidReader(self.levels, self.input_samplerate,
+                                 self.base, self.nb_frames)
+
+
+class PeakPyramidReader(object):
+    """ Slice the peaks of a time range out of a peak pyramid, at any
+    resolution.
+
+    >>> import numpy as np
+    >>> levels = pyramid_levels(np.array([[-2, 3], [-5, 1], [0, 4]], 'int8'))
+    >>> reader = PeakPyramidReader(levels, samplerate=4, base=2,
+    ...                            totalframes=6)
+    >>> (reader.slice(width=1) * 127).round()
+    array([[-5.,  4.]], dtype=float32)
+    """
+
+    def __init__(self, levels, samplerate, base, totalframes):
+        self.levels = levels
+        self.samplerate = samplerate
+        self.base = base
+        self.totalframes = totalframes
+        self.scale = np.iinfo(levels[0].dtype).max
+
+    @classmethod
+    def open(cls, path):
+        """ Open a pyramid file written by PeakPyramid, the levels are
+        memory-mapped """
+        f = open(path, 'rb')
+        try:
+            header = PYRAMID_HEADER.unpack(f.read(PYRAMID_HEADER.size))
+            magic, version, width, nb_levels, samplerate, base, totalframes \
+                = header
+            if magic != PYRAMID_MAGIC or version != PYRAMID_VERSION:
+                raise IOError('%s is not a peak pyramid file' % path)
+            sizes = [PYRAMID_LEVEL.unpack(f.read(PYRAMID_LEVEL.size))[0]
+                     for level in range(nb_levels)]
+        finally:
+            f.close()
+        dtype = np.dtype('<i%d' % width)
+        offset = PYRAMID_HEADER.size + PYRAMID_LEVEL.size * nb_levels
+        levels = []
+        for size in sizes:
+            if not size:
+                levels.append(np.zeros((0, 2), dtype=dtype))
+                continue
+            levels.append(np.memmap(path, dtype=dtype, mode='r',
+                                    offset=offset, shape=(size, 2)))
+            offset += size * 2 * dtype.itemsize
+        return cls(levels, samplerate, base, totalframes)
+
+    def samples_per_pixel(self, level):
+        return self.base << level
+
+    def level(self, samples_per_pixel):
+        """ Return the coarsest level with at most samples_per_pixel """
+        level = 0
+        while level + 1 < len(self.levels) and \
+                self.samples_per_pixel(level + 1) <= samples_per_pixel:
+            level += 1
+        return level
+
+    def slice(self, start=0, duration=None, width=None,
+              samples_per_pixel=None):
+        """
+        Return the (min, max) peaks of a time range as an array of shape
+        (width, 2) of values between -1 and 1
+
+        Parameters
+        ----------
+        start : float
+            start of the range in seconds
+        duration : float
+            duration of the range in seconds, up to the end by default
+        width : int
+            number of pixels of the range
+        samples_per_pixel : float
+            resolution of the range when width is not given, the finest
+            level by default
+        """
+        first = min(int(round(start * self.samplerate)), self.totalframes)
+        last = self.totalframes
+        if duration is not None:
+            last = min(first + int(round(duration * self.samplerate)), last)
+        if width is None:
+            samples_per_pixel = samples_per_pixel or self.base
+            width = int(np.ceil((last - first) / samples_per_pixel))
+        else:
+            samples_per_pixel = (last - first) / width
+        if not width or not len(self.levels[0]):
+            return np.zeros((width or 0, 2), dtype='float32')
+
+        level = self.level(samples_per_pixel)
+        data = self.levels[level]
+        level_spp = self.samples_per_pixel(level)
+        edges = first + np.arange(width + 1) * samples_per_pixel
+        starts = np.floor(edges[:-1] / level_spp).astype(int)
+        starts = np.clip(starts, 0, len(data) - 1)
+        ends = np.ceil(edges[1:] / level_spp).astype(int)
+        ends = np.clip(np.maximum(ends, starts + 1), 0, len(data))
+
+        # only read the rows of the range, as the level may be memory-mapped,
+        # and reduce over [start, end) of each pixel, the last one going up
+        # to the end of the rows read
+        offset = starts[0]
+        data = data[offset:ends[-1]]
+        indices = np.empty(2 * width - 1, dtype=int)
+        indices[0::2] = starts - offset
+        indices[1::2] = ends[:-1] - offset
+        peaks = np.empty((width, 2), dtype='float32')
+        peaks[:, 0] = np.minimum.reduceat(data[:, 0], indices)[0::2]
+        peaks[:, 1] = np.maximum.reduceat(data[:, 1], indices)[0::2]
+        return peaks / self.scale
@@ -26,8 +26,17 @@
         - Downmixing to mono
         - Adapt the frames to match the input_blocksize and input_stepsize
             of the analyzer
+
+    The analyzers of a pipe subscribe in setup() to shared preprocessing
+    nodes, so that the same preprocessing of the same frames is only computed
+    once for all of them.
 '''
 
+from timeside.core import PipeNode
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+
 def downmix_to_mono(process_func):
     '''
     Pre-processing decorator that downmixes frames from multi-channel to mono
@@ -65,14 +74,17 @@ def downmix_to_mono(process_func):
     @functools.wraps(process_func)
     def wrapper(analyzer, frames, eod):
         # Pre-processing
-        if frames.ndim > 1:
-            downmix_frames = frames.mean(axis=-1)
+        node = getattr(analyzer, 'preprocessing_nodes', {}).get('downmix')
+        if node is not None:
+            downmix_frames = node.process(frames)
         else:
-            downmix_frames = frames
+            downmix_frames = downmix(frames)
         # Processing
         process_func(analyzer, downmix_frames, eod)
 
         return frames, eod
+    wrapper.preprocessors = ('downmix',) + \
+        getattr(process_func, 'preprocessors', ())
     return wrapper
 
 
@@ -121,63 +133,206 @@ def frames_adapter(process_func):
     '''
 
     import functools
-    import numpy as np
 
-    class framesBuffer(object):
-
-        def __init__(self, blocksize, stepsize):
-            self.blocksize = blocksize
-            self.stepsize = stepsize
-            self.buffer = None
+    @functools.wraps(process_func)
+    def wrapper(analyzer, frames, eod):
+        # Pre-processing
+        node = framing_node(analyzer)
 
-        def frames(self, frames, eod):
-            if self.buffer is not None:
-                stack = np.concatenate([self.buffer, frames])
-            else:
-                stack = frames.copy()
+        # Processing
+        adapted_frames, adapted_eod = node.process(frames, eod)
+        last = len(adapted_frames) - 1
+        for index, frame in enumerate(adapted_frames):
+            process_func(analyzer, frame, adapted_eod and index == last)
 
-            stack_length = len(stack)
+        return frames, eod
+    wrapper.preprocessors = ('framing',) + \
+        getattr(process_func, 'preprocessors', ())
+    return wrapper
 
-            nb_frames = (
-                stack_length - self.blocksize + self.stepsize) // self.stepsize
-            nb_frames = max(nb_frames, 0)
-            frames_length = nb_frames * self.stepsize + \
-                self.blocksize - self.stepsize
-            last_block_size = stack_length - frames_length
 
-            if eod:
-                # Final zeropadding
-                pad_shape = tuple(
-                    self.blocksize - last_block_size if i == 0 else x
-                    for i, x in enumerate(frames.shape))
-                stack = np.concatenate([stack, np.zeros(pad_shape,
-                                                        dtype=frames.dtype)])
-                nb_frames += 1
+def batch_frames_adapter(process_func):
+    '''
+    Pre-processing decorator that passes all the frames of input_blocksize
+    and input_stepsize available in a block to the decorated analyzer at once,
+    as an array of shape (number of frames, input_blocksize, ...).
 
-            self.buffer = stack[nb_frames * self.stepsize:]
+    The frames are a strided view on the frames buffer, so that they overlap
+    in memory and must not be modified. The decorated process is called only
+    when at least one frame is complete and on the end of data.
 
-            eod_list = np.repeat(False, nb_frames)
-            if eod and len(eod_list):
-                eod_list[-1] = eod
+    >>> from timeside.analyzer.preprocessors import batch_frames_adapter
+    >>> @batch_frames_adapter
+    ... def process(analyzer,frames,eod):
+    ...     analyzer.frames.append(frames.copy())
+    ...     return frames, eod
+    ...
+    >>> class Fake_Analyzer(object):
+    ...     def __init__(self):
+    ...         self.input_blocksize = 4
+    ...         self.input_stepsize = 3
+    ...         self.frames = [] # Container for the frame as viewed by process
+    >>> import numpy as np
+    >>> analyzer = Fake_Analyzer()
+    >>> frames_, eod_ = process(analyzer, np.arange(0, 12), False)
+    >>> frames_, eod_ = process(analyzer, np.arange(12, 14), True)
+    >>> analyzer.frames[0]
+    array([[0, 1, 2, 3],
+           [3, 4, 5, 6],
+           [6, 7, 8, 9]])
+    >>> analyzer.frames[1]
+    array([[ 9, 10, 11, 12],
+           [12, 13,  0,  0]])
+    '''
 
-            for index, eod in zip(xrange(0, nb_frames*self.stepsize, self.stepsize), eod_list):
-                yield (stack[index:index + self.blocksize],eod)
+    import functools
 
     @functools.wraps(process_func)
     def wrapper(analyzer, frames, eod):
         # Pre-processing
-        if not hasattr(analyzer, 'frames_buffer'):
-            analyzer.frames_buffer = framesBuffer(analyzer.input_blocksize,
-                                                  analyzer.input_stepsize)
+        node = framing_node(analyzer)
 
         # Processing
-        for adapted_frames, adapted_eod in analyzer.frames_buffer.frames(frames, eod):
+        adapted_frames, adapted_eod = node.process(frames, eod)
+        if len(adapted_frames) or adapted_eod:
             process_func(analyzer, adapted_frames, adapted_eod)
 
         return frames, eod
+    wrapper.preprocessors = ('framing',) + \
+        getattr(process_func, 'preprocessors', ())
     return wrapper
 
 
+class FramesBuffer(object):
+    '''
+    Cut a stream into frames of blocksize samples every stepsize samples
+
+    The stream is appended to a storage array, and the frames complete in the
+    storage are returned as a single strided view. The samples already framed
+    are never overwritten: when the storage is full, the samples left are
+    moved to a new storage, so that the views returned earlier stay valid.
+    '''
+
+    def __init__(self, blocksize, stepsize):
+        self.blocksize = blocksize
+        self.stepsize = stepsize
+        self.storage = None
+        self.start = 0
+        self.fill = 0
+
+    def reserve(self, length, shape, dtype):
+        """make room for length samples of the given shape and dtype after
+        the samples in the storage"""
+        dtype = np.dtype(dtype)
+        if self.storage is not None:
+            if self.storage.shape[1:] == shape:
+                dtype = np.promote_types(self.storage.dtype, dtype)
+            if self.fill + length <= len(self.storage) and \
+                    dtype == self.storage.dtype:
+                return
+            pending = self.storage[self.start:self.fill]
+        else:
+            pending = np.empty((0,) + shape, dtype=dtype)
+        capacity = max(2 * (len(pending) + length), self.blocksize)
+        self.storage = np.empty((capacity,) + shape, dtype=dtype)
+        self.storage[:len(pending)] = pending
+        self.start = 0
+        self.fill = len(pending)
+
+    def frames(self, frames, eod):
+        """Append frames and return a (frames, eod) tuple where frames is
+        an array of the frames completed, zeropadding the last frame on
+        eod"""
+        self.reserve(len(frames), frames.shape[1:], frames.dtype)
+        self.storage[self.fill:self.fill + len(frames)] = frames
+        self.fill += len(frames)
+
+        available = self.fill - self.start
+        nb_frames = max(
+            (available - self.blocksize + self.stepsize) // self.stepsize, 0)
+        if eod:
+            # Final zeropadding
+            nb_frames += 1
+            end = self.start + (nb_frames - 1) * self.stepsize + self.blocksize
+            if end > self.fill:
+                self.reserve(end - self.fill, frames.shape[1:], frames.dtype)
+                end = self.start + (nb_frames - 1) * self.stepsize + \
+                    self.blocksize
+                self.storage[self.fill:end] = 0
+                self.fill = end
+
+        storage = self.storage[self.start:]
+        adapted_frames = as_strided(
+            storage, shape=(nb_frames, self.blocksize) + storage.shape[1:],
+            strides=(self.stepsize * storage.strides[0],) + storage.strides)
+        if eod:
+            self.storage = None
+            self.start = self.fill = 0
+        else:
+            self.start += nb_frames * self.stepsize
+        return adapted_frames, eod
+
+
+def downmix(frames):
+    """Average the channels of multi-channel frames"""
+    if frames.ndim > 1:
+        return frames.mean(axis=-1)
+    return frames
+
+
+class Downmix(PipeNode):
+    """Mono downmix of the frames shared by the analyzers of a pipe"""
+
+    def compute(self, frames):
+        downmix_frames = downmix(frames)
+        if downmix_frames is not frames:
+            downmix_frames.flags.writeable = False
+        return downmix_frames
+
+
+class Framing(PipeNode):
+    """Frames of blocksize and stepsize shared by the analyzers of a pipe,
+    as a read-only view for each block"""
+
+    def __init__(self, blocksize, stepsize):
+        super(Framing, self).__init__()
+        self.frames_buffer = FramesBuffer(blocksize, stepsize)
+
+    def compute(self, frames, eod):
+        adapted_frames, eod = self.frames_buffer.frames(frames, eod)
+        adapted_frames.flags.writeable = False
+        return adapted_frames, eod
+
+
+def framing_node(analyzer):
+    """Return the subscriber of the analyzer to its framing node, creating
+    a private node if the analyzer did not subscribe in setup()"""
+    nodes = analyzer.__dict__.setdefault('preprocessing_nodes', {})
+    if 'framing' not in nodes:
+        nodes['framing'] = Framing(analyzer.input_blocksize,
+                                   analyzer.input_stepsize).subscribe()
+    return nodes['framing']
+
+
+def subscribe_preprocessors(analyzer):
+    """Subscribe the analyzer to the preprocessing nodes of its pipe
+    required by the decorators of its process method. The nodes are shared
+    by the analyzers applying the same preprocessing to the same frames."""
+    analyzer.preprocessing_nodes = {}
+    # keys of the nodes feeding the next one, with their parameters
+    upstream = ()
+    for name in getattr(analyzer.process, 'preprocessors', ()):
+        if name == 'downmix':
+            key, factory = ('downmix', upstream), Downmix
+        else:
+            blocksize = analyzer.input_blocksize
+            stepsize = analyzer.input_stepsize
+            key = ('framing', upstream, blocksize, stepsize)
+            factory = lambda: Framing(blocksize, stepsize)
+        analyzer.preprocessing_nodes[name] = analyzer.shared_node(key, factory)
+        upstream += (key,)
+
+
 if __name__ == "__main__":
     # Run doctest from __main__ and unittest from test_analyzer_preprocessors
     from tests import test_analyzer_preprocessors
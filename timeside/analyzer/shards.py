@@ -0,0 +1,339 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2013 Parisson SARL
+
+# This file is part of TimeSide.
+
+# TimeSide is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+
+# TimeSide is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with TimeSide.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import division
+
+from timeside.core import ProcessPipe
+from timeside.exceptions import Error
+from timeside.analyzer.core import AnalyzerResultContainer
+import numpy as np
+import sys
+
+
+# Jobs of the running ShardedPipe, inherited by its forked worker processes
+_jobs = []
+
+
+def gcd(a, b):
+    while b:
+        a, b = b, a % b
+    return a
+
+
+class Shard(object):
+    """ Segment of the source analyzed by one job of a ShardedPipe.
+
+    The segment [start, start + duration) is decoded, with some overlap
+    around the range [keep_start, keep_end) whose results are kept. Times
+    are in seconds from the beginning of the media, keep_start is None for
+    the first shard and keep_end for the last one, which keep everything
+    before and after them. duration is None for a last shard decoded up to
+    the end of the media. """
+
+    def __init__(self, start, duration, keep_start, keep_end):
+        self.start = start
+        self.duration = duration
+        self.keep_start = keep_start
+        self.keep_end = keep_end
+
+    def __repr__(self):
+        return '<Shard start=%r duration=%r keep=[%r, %r)>' % (
+            self.start, self.duration, self.keep_start, self.keep_end)
+
+
+def stitch_result(pieces, start, duration, is_segment):
+    """
+    Stitch together the results of an analyzer over consecutive shards
+
+    Parameters
+    ----------
+    pieces : list
+        (result, shard) pairs in time order
+    start, duration : float
+        time range of the whole source in seconds
+    is_segment : bool
+        whether the source is a segment of its media
+
+    Framewise results keep the frames starting in the range of their shard,
+    event and segment results keep the events starting in it. The first
+    result is returned with the stitched data.
+    """
+    result = pieces[0][0]
+    if result.time_mode == 'global':
+        raise Error('the global result %s can not be stitched over shards'
+                    % result.id_metadata.id)
+
+    selected = []
+    for piece, shard in pieces:
+        if result.time_mode == 'framewise':
+            frames = piece.frame_metadata
+            step = frames.stepsize / frames.samplerate
+            offset = int(round((piece.audio_metadata.start - start) / step))
+            index = offset + np.arange(len(piece))
+            times = start + index * step
+        else:
+            times = piece.audio_metadata.start + piece.data_object.time
+        mask = np.ones(len(times), dtype=bool)
+        if shard.keep_start is not None:
+            mask &= times >= shard.keep_start - 1e-9
+        if shard.keep_end is not None:
+            mask &= times < shard.keep_end - 1e-9
+        if mask.any():
+            selected.append((piece, mask, times))
+
+    for key in result.data_object.keys():
+        if not selected:
+            data = result.data_object[key][:0]
+        elif key == 'time':
+            # event times are relative to the start of the source
+            data = np.concatenate([times[mask] for piece, mask, times
+                                   in selected]) - start
+        else:
+            data = np.concatenate([piece.data_object[key][mask]
+                                   for piece, mask, times in selected])
+        result.data_object[key] = data
+
+    result.audio_metadata.start = start
+    result.audio_metadata.duration = duration
+    result.audio_metadata.is_segment = is_segment
+    return result
+
+
+def _run_job(index, channels=None, samplerate=None, blocksize=None):
+    source, processors = _jobs[index]
+    pipe = ProcessPipe(source)
+    for processor in processors:
+        pipe.processors.append(processor)
+        processor.process_pipe = pipe
+    pipe.run(channels=channels, samplerate=samplerate, blocksize=blocksize)
+    return pipe.results
+
+
+def _run_job_json(args):
+    return _run_job(*args).to_json()
+
+
+def _gst_running():
+    """Return whether the gstreamer mainloop thread runs in this process"""
+    gstutils = sys.modules.get('timeside.tools.gstutils')
+    if gstutils is None:
+        return False
+    loop_thread = gstutils._loop_thread
+    return loop_thread is not None and loop_thread.is_alive()
+
+
+def _init_worker():
+    """Drop the gstreamer state a worker process inherits from its parent:
+    the pooled decoder pipelines belong to the parent and its mainloop
+    thread does not exist in the worker"""
+    gstutils = sys.modules.get('timeside.tools.gstutils')
+    if gstutils is None:
+        return
+    gstutils._loop_thread = None
+    decoder = sys.modules.get('timeside.decoder.core')
+    if decoder is not None:
+        decoder.pipeline_pool = gstutils.PipelinePool()
+
+
+class ShardedPipe(object):
+    """
+    Run the analyzers of a pipe over time shards of its source in parallel
+    processes, and stitch their results back together
+
+    The source is split into overlapping segments aligned on the stepsizes of
+    the analyzers, so that every frame of a shard is a frame of the whole
+    source. Only the processors declaring themselves shardable (see
+    Processor.shardable) run over the shards. The other ones, and their
+    parents, run over the whole source in the calling process, at the same
+    time as the shards.
+
+    Parameters
+    ----------
+    pipe : ProcessPipe
+        the pipe to run, its source must implement IDecoder.segment()
+    shard_duration : float
+        duration of the shards in seconds
+    jobs : int
+        number of worker processes, the number of processors by default.
+        With 1, the shards are run one after the other in the calling process
+
+    The worker processes are forked from the calling process. They drop the
+    gstreamer pipelines and mainloop thread they inherit, but the GLib main
+    context of a running mainloop can not be taken over by a forked process.
+    A source decoded by gstreamer is thus only shared out to worker
+    processes if the calling process does not run the gstreamer mainloop yet
+    (see timeside.tools.gstutils.get_loop_thread), otherwise the shards are
+    run in the calling process: to analyze such sources in parallel, run the
+    ShardedPipe before any other decoding of the process.
+    overlap : float
+        duration of the context decoded before and after each shard in
+        seconds, by default the largest input blocksize of the analyzers
+
+    The results are gathered in the results attribute and the plan of the
+    last run in the shards attribute.
+    """
+
+    def __init__(self, pipe, shard_duration=600., jobs=None, overlap=None):
+        self.source = pipe.processors[0]
+        self.processors = pipe.processors[1:]
+        self.shard_duration = shard_duration
+        self.jobs = jobs
+        self.overlap = overlap
+        self.shards = []
+        self.results = AnalyzerResultContainer()
+
+    def split(self):
+        """Return the lists of the processors run over the shards and over
+        the whole source"""
+        whole = set()
+
+        def add(processor):
+            whole.add(processor)
+            for parent in processor.parents:
+                add(parent)
+
+        for processor in self.processors:
+            if not processor.shardable:
+                add(processor)
+        return ([processor for processor in self.processors
+                 if processor not in whole],
+                [processor for processor in self.processors
+                 if processor in whole])
+
+    def source_info(self, samplerate=None):
+        """Return the samplerate and the duration in seconds of the source"""
+        source = self.source
+        duration = source.uri_duration
+        if not samplerate:
+            samplerate = getattr(source, 'input_samplerate', None)
+        if not samplerate or not duration:
+            if hasattr(source, 'source_samples'):
+                duration = duration or (len(source.source_samples) /
+                                        source.input_samplerate
+                                        - source.uri_start)
+            else:
+                from timeside.decoder.utils import get_media_uri_info
+                info = get_media_uri_info(source.uri)
+                duration = duration or info['duration'] - source.uri_start
+                samplerate = samplerate or info['streams'][0]['samplerate']
+        return samplerate, duration
+
+    def plan(self, processors, samplerate, duration, blocksize):
+        """Return the shards of the source for the processors"""
+        unit = blocksize
+        context = blocksize
+        for processor in processors:
+            stepsize = getattr(processor, 'input_stepsize', None)
+            if stepsize:
+                unit = unit * int(stepsize) // gcd(unit, int(stepsize))
+            context = max(context,
+                          int(getattr(processor, 'input_blocksize', None) or 0))
+        if self.overlap is not None:
+            context = int(np.ceil(self.overlap * samplerate))
+        overlap = -(-context // unit) * unit
+        length = max(int(round(self.shard_duration * samplerate / unit)), 1) \
+            * unit
+
+        origin = self.source.uri_start
+        total = int(round(duration * samplerate))
+        shards = []
+        for first in xrange(0, total, length):
+            last = min(first + length, total)
+            begin = max(first - overlap, 0)
+            end = min(last + overlap, total)
+            if last < total:
+                shard_duration = (end - begin) / samplerate
+                keep_end = origin + last / samplerate
+            else:
+                shard_duration = keep_end = None
+                if self.source.uri_duration is not None:
+                    shard_duration = (end - begin) / samplerate
+            shards.append(Shard(origin + begin / samplerate, shard_duration,
+                                origin + first / samplerate if first else None,
+                                keep_end))
+        return shards
+
+    def run(self, channels=None, samplerate=None, blocksize=None):
+        """Run the pipe over the shards of its source, see ProcessPipe.run()
+        for the parameters"""
+        global _jobs
+        sharded, whole = self.split()
+        self.results = AnalyzerResultContainer()
+        self.shards = []
+        if sharded:
+            rate, duration = self.source_info(samplerate)
+            self.shards = self.plan(sharded, rate, duration, blocksize or
+                                    self.source.output_blocksize)
+        if len(self.shards) < 2:
+            # nothing to share out
+            self.shards = []
+            sharded, whole = [], self.processors
+
+        _jobs = [(self.source.segment(shard.start, shard.duration), sharded)
+                 for shard in self.shards]
+        options = (channels, samplerate, blocksize)
+        # a gstreamer source can not be decoded by processes forked from a
+        # process running the gstreamer mainloop
+        forkable = hasattr(self.source, 'source_samples') or \
+            not _gst_running()
+        pool = None
+        try:
+            if self.jobs == 1 or not _jobs or not forkable:
+                outputs = None
+            else:
+                import multiprocessing
+                # the pool is created before the calling process decodes
+                pool = multiprocessing.Pool(min(self.jobs or
+                                                multiprocessing.cpu_count(),
+                                                len(_jobs)),
+                                            initializer=_init_worker)
+                outputs = pool.map_async(_run_job_json,
+                                         [(index,) + options
+                                          for index in range(len(_jobs))])
+            if whole:
+                # graphers and encoders are run by the calling process
+                pipe = ProcessPipe(self.source)
+                pipe.processors.extend(whole)
+                for processor in whole:
+                    processor.process_pipe = pipe
+                pipe.run(channels=channels, samplerate=samplerate,
+                         blocksize=blocksize)
+                self.results.add(pipe.results.values())
+            if outputs is None:
+                outputs = [_run_job(index, *options)
+                           for index in range(len(_jobs))]
+            else:
+                outputs = [AnalyzerResultContainer.from_json(output)
+                           for output in outputs.get()]
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+            _jobs = []
+
+        if outputs:
+            start = self.source.uri_start
+            rate, duration = self.source_info(samplerate)
+            for key in outputs[0].keys():
+                pieces = [(output[key], shard)
+                          for output, shard in zip(outputs, self.shards)]
+                self.results.add(stitch_result(pieces, start, duration,
+                                               self.source.is_segment))
+        for processor in self.processors:
+            processor.process_pipe = self
@@ -22,7 +22,7 @@
 from timeside.core import implements, interfacedoc
 from timeside.analyzer.core import Analyzer
 from timeside.api import IAnalyzer
-from preprocessors import downmix_to_mono, frames_adapter
+from preprocessors import downmix_to_mono, batch_frames_adapter
 import numpy as np
 
 
@@ -44,8 +44,10 @@ class Spectrogram(Analyzer):
         super(Spectrogram, self).setup(channels, samplerate,
               blocksize, totalframes)
 
-        self.values = []
+        self.values = self.new_buffer(shape=None, dtype=None)
         self.FFT_SIZE = 2048
+        self.stft = self.shared_stft(self.input_blocksize, self.input_stepsize,
+                                     fft_size=self.FFT_SIZE)
 
     @staticmethod
     @interfacedoc
@@ -63,13 +65,15 @@ class Spectrogram(Analyzer):
         return ""
 
     @downmix_to_mono
-    @frames_adapter
+    @batch_frames_adapter
     def process(self, frames, eod=False):
-            self.values.append(np.abs(np.fft.rfft(frames, self.FFT_SIZE)))
-            return frames, eod
+        spectra = self.stft.process_many(frames)
+        if spectra:
+            self.values.extend([spectrum.magnitude for spectrum in spectra])
+        return frames, eod
 
     def post_process(self):
         spectrogram = self.new_result(data_mode='value', time_mode='framewise')
         spectrogram.parameters = {'FFT_SIZE': self.FFT_SIZE}
-        spectrogram.data_object.value = self.values
+        spectrogram.data_object.value = self.values.array
         self.process_pipe.results.add(spectrogram)
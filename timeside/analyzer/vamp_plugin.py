@@ -29,6 +29,7 @@ import numpy as np
 
 class VampSimpleHost(Analyzer):
     implements(IAnalyzer)
+    shardable = False
 
     def __init__(self, plugin_list=None):
         super(VampSimpleHost, self).__init__()
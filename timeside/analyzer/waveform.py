@@ -28,6 +28,7 @@ from preprocessors import downmix_to_mono, frames_adapter
 
 class Waveform(Analyzer):
     implements(IAnalyzer)  # TODO check if needed with inheritance
+    shardable = False
 
     def __init__(self):
         super(Waveform, self).__init__()
@@ -39,7 +40,7 @@ class Waveform(Analyzer):
               blocksize=None, totalframes=None):
         super(Waveform, self).setup(channels, samplerate,
               blocksize, totalframes)
-        self.values = []
+        self.values = self.new_buffer(shape=None, dtype=None, stepsize=1)
         self.result_blocksize = 1
         self.result_stepsize = 1
 
@@ -61,10 +62,10 @@ class Waveform(Analyzer):
 #    @downmix_to_mono
 #    @frames_adapter
     def process(self, frames, eod=False):
-        self.values.append(frames)
+        self.values.extend(frames)
         return frames, eod
 
     def post_process(self):
         waveform = self.new_result(data_mode='value', time_mode='framewise')
-        waveform.data_object.value = np.vstack(self.values)
+        waveform.data_object.value = self.values.array
         self.process_pipe.results.add(waveform)
@@ -33,6 +33,7 @@ import numpy
 
 class Yaafe(Analyzer):
     implements(IAnalyzer)
+    shardable = False
 
     def __init__(self, yaafeSpecification=None):
         super(Yaafe,self).__init__()
@@ -170,6 +170,14 @@ class IDecoder(IProcessor):
     def metadata(self):
         """Return the metadata embedded into the encoded stream, if any."""
 
+    def content_hash(self):
+        """Return a hash of the content of the source, or None if it can not
+        be read before decoding (eg. a remote stream)."""
+
+    def segment(self, start, duration=None):
+        """Return a new decoder of the segment of the same media starting at
+        start seconds and lasting duration seconds, up to the end if None."""
+
 class IGrapher(IProcessor):
     """Media item visualizer driver interface"""
 
@@ -21,19 +21,32 @@
 from timeside.component import *
 from timeside.api import IProcessor
 from timeside.exceptions import Error, ApiError
+from timeside.plugins import load_plugins, find_plugin, import_plugin, failed
 
 
 import re
+import sys
 import time
 import numpy
 import uuid
+import Queue
+import threading
+import collections
 
 __all__ = ['Processor', 'MetaProcessor', 'implements', 'abstract',
            'interfacedoc', 'processors', 'get_processor', 'ProcessPipe',
-           'FixedSizeInputAdapter']
+           'FixedSizeInputAdapter', 'STFT', 'BlocksizePlan']
 
 _processors = {}
 
+# Size of the per-thread frames queue of a threaded ProcessPipe
+PIPE_QUEUE_SIZE = 8
+
+# Memory budget in bytes of a block of float32 frames planned by a
+# BlocksizePlan, so that a block stays in the processor cache while it goes
+# through the processors of the pipe
+PLAN_CACHE_SIZE = 256 * 1024
+
 
 class MetaProcessor(MetaComponent):
     """Metaclass of the Processor class, used mainly for ensuring that processor
@@ -72,12 +85,18 @@ class Processor(Component):
               parents :  List of parent Processors that must be processed
                          before the current Processor
               pipe :     The current ProcessPipe in which the Processor will run
+              shardable : True if the processor only needs the local context
+                         of each frame, so that it can be run over time
+                         shards of the source and its results stitched
+                         together (see timeside.analyzer.shards)
         """
     __metaclass__ = MetaProcessor
 
     abstract()
     implements(IProcessor)
 
+    shardable = False
+
     def __init__(self):
         super(Processor, self).__init__()
 
@@ -96,14 +115,16 @@ class Processor(Component):
 
         # If empty Set default values for input_* attributes
         # may be setted by the processor during __init__()
-        if not hasattr(self, 'input_channels'):
-            self.input_channels = self.source_channels
-        if not hasattr(self, 'input_samplerate'):
-            self.input_samplerate = self.source_samplerate
-        if not hasattr(self, 'input_blocksize'):
-            self.input_blocksize = self.source_blocksize
-        if not hasattr(self, 'input_stepsize'):
-            self.input_stepsize = self.source_blocksize
+        # The defaults taken from the source are set again by every setup(),
+        # as the processor may be run over several sources
+        defaults = self.__dict__.setdefault('_source_inputs', set())
+        for name, value in (('input_channels', self.source_channels),
+                            ('input_samplerate', self.source_samplerate),
+                            ('input_blocksize', self.source_blocksize),
+                            ('input_stepsize', self.source_blocksize)):
+            if name in defaults or not hasattr(self, name):
+                setattr(self, name, value)
+                defaults.add(name)
 
 
     # default channels(), samplerate() and blocksize() implementations returns
@@ -151,6 +172,34 @@ class Processor(Component):
     def __or__(self, other):
         return ProcessPipe(self, other)
 
+    def get_parameters(self):
+        """Return the parameters of the processor as a dict, by default its
+        attributes holding plain values (numbers, strings and their lists).
+        The parameters of a processor are taken when it enters a pipe and
+        identify its results in a ResultCache."""
+        return dict((name, value) for name, value in self.__dict__.items()
+                    if not name.startswith('_') and is_plain_value(value))
+
+    def shared_stft(self, blocksize, stepsize, window=None, fft_size=None,
+                    channel=None):
+        """Return a subscriber to the STFT of the pipe matching the given
+        parameters, or to a private STFT if the processor is not in a pipe.
+        See STFT for the parameters."""
+        pipe = getattr(self, 'process_pipe', None)
+        if pipe is None:
+            return STFT(blocksize, stepsize, window, fft_size,
+                        channel).subscribe()
+        return pipe.stft(blocksize, stepsize, window, fft_size, channel)
+
+    def shared_node(self, key, factory):
+        """Return a subscriber to the PipeNode of the pipe identified by key,
+        created by calling factory on the first request, or to a private
+        node if the processor is not in a pipe."""
+        pipe = getattr(self, 'process_pipe', None)
+        if pipe is None:
+            return factory().subscribe()
+        return pipe.node(key, factory)
+
 
 class FixedSizeInputAdapter(object):
     """Utility to make it easier to write processors which require fixed-sized
@@ -216,14 +265,284 @@ class FixedSizeInputAdapter(object):
             self.len = 0
 
 
+class STFT(object):
+    """Short-time Fourier transform shared by the processors of a pipe.
+
+    A STFT is identified by the framing of its input (blocksize, stepsize),
+    the name of the numpy window function applied to each frame (None for no
+    window), the fft_size (None for the frame length) and the channel taken
+    from multi-channel frames (None for a mono downmix).
+
+    Every subscriber feeds the STFT with the same sequence of frames : the
+    transform of a frame is computed by the first subscriber reaching it and
+    then served to the other ones from a cache, which only holds the frames
+    not yet read by all the subscribers."""
+
+    def __init__(self, blocksize, stepsize, window=None, fft_size=None,
+                 channel=None):
+        self.blocksize = blocksize
+        self.stepsize = stepsize
+        self.window = window
+        self.fft_size = fft_size
+        self.channel = channel
+
+        self.windows = {}
+        self.cursors = []
+        self.spectra = collections.deque()
+        self.offset = 0
+        self.lock = threading.Lock()
+
+    def subscribe(self):
+        """Return a new STFTSubscriber. Subscribers must be created before the
+        first frame is processed"""
+        with self.lock:
+            self.cursors.append(0)
+            return STFTSubscriber(self, len(self.cursors) - 1)
+
+    def transform(self, frames):
+        """Return the STFTFrame of a single frame"""
+        return self.transform_many(frames[numpy.newaxis])[0]
+
+    def transform_many(self, frames):
+        """Return the STFTFrames of an array of frames, computed at once"""
+        if frames.ndim > 2:
+            if self.channel is None:
+                frames = frames.mean(axis=-1)
+            else:
+                frames = frames[:, :, self.channel]
+        if self.window:
+            length = frames.shape[1]
+            if length not in self.windows:
+                self.windows[length] = getattr(numpy, self.window)(length)
+            frames = frames * self.windows[length]
+        return [STFTFrame(fft)
+                for fft in numpy.fft.rfft(frames, self.fft_size, axis=-1)]
+
+    def process(self, subscriber, frames):
+        """Return the STFTFrame of the next frame of the subscriber"""
+        return self.process_many(subscriber, frames[numpy.newaxis])[0]
+
+    def process_many(self, subscriber, frames):
+        """Return the STFTFrames of the next len(frames) frames of the
+        subscriber"""
+        with self.lock:
+            position = self.cursors[subscriber] - self.offset
+            self.cursors[subscriber] += len(frames)
+            cached = max(min(len(self.spectra) - position, len(frames)), 0)
+            spectra = [self.spectra[position + index]
+                       for index in xrange(cached)]
+            if cached < len(frames):
+                computed = self.transform_many(frames[cached:])
+                self.spectra.extend(computed)
+                spectra.extend(computed)
+            # forget the frames read by every subscriber
+            while self.spectra and min(self.cursors) > self.offset:
+                self.spectra.popleft()
+                self.offset += 1
+        return spectra
+
+
+class STFTSubscriber(object):
+    """Handle of a processor on a shared STFT"""
+
+    def __init__(self, stft, index):
+        self.stft = stft
+        self.index = index
+
+    def process(self, frames):
+        """Return the STFTFrame of frames, which must be the next frame of the
+        sequence fed to the STFT"""
+        return self.stft.process(self.index, frames)
+
+    def process_many(self, frames):
+        """Return the STFTFrames of an array of frames, which must be the
+        next frames of the sequence fed to the STFT"""
+        return self.stft.process_many(self.index, frames)
+
+
+class BlocksizePlan(object):
+    """Source blocksize planned for the requirements of the processors of a
+    pipe.
+
+    The requirements are (processor, blocksize, stepsize) tuples, given by
+    the analyzers declaring their input_blocksize and input_stepsize and by
+    the graphers for which the number of frames per pixel is known. The
+    blocksize is the candidate:
+        - aligned with the stepsize of as many processors as possible, so
+          that each block completes the same number of frames and the input
+          adapters can pass the blocks through,
+        - whose float32 frames fit in cache_size bytes, if any does,
+        - and then the largest one, to spread the cost of a step of the
+          pipe over more frames.
+    It is never smaller than the largest blocksize required, so that every
+    block completes at least a frame for every processor. The blocksize is
+    None if no processor has any requirement.
+
+    >>> plan = BlocksizePlan([('pitch', 2048, 1024), ('onsets', 1024, 256)],
+    ...                      channels=2)
+    >>> plan.blocksize
+    32768
+    >>> plan.frames_per_block()
+    [('pitch', 31), ('onsets', 125)]
+    """
+
+    def __init__(self, requirements, channels=None,
+                 cache_size=PLAN_CACHE_SIZE):
+        self.requirements = list(requirements)
+        self.channels = channels or 2
+        self.cache_size = cache_size
+        self.blocksize = None
+        self.max_blocksize = max(cache_size // (4 * self.channels), 1)
+        if not self.requirements:
+            return
+
+        min_blocksize = max(blocksize for name, blocksize, stepsize
+                            in self.requirements)
+        upper = max(self.max_blocksize, min_blocksize)
+        candidates = set()
+        for name, blocksize, stepsize in self.requirements:
+            first = -(-min_blocksize // stepsize) * stepsize
+            candidates.update(xrange(first, max(upper, first) + 1, stepsize))
+        self.blocksize = max(candidates, key=self.score)
+
+    def score(self, blocksize):
+        """Return the sort key of a candidate blocksize"""
+        aligned = sum(1 for name, size, stepsize in self.requirements
+                      if not blocksize % stepsize)
+        return (aligned, blocksize <= self.max_blocksize, blocksize)
+
+    def frames_per_block(self):
+        """Return the number of frames completed by a block for each
+        requirement, once the frames buffers are filled"""
+        return [(name, (self.blocksize - blocksize) // stepsize + 1)
+                for name, blocksize, stepsize in self.requirements]
+
+    def __repr__(self):
+        return '<BlocksizePlan blocksize=%s requirements=%r>' % (
+            self.blocksize, self.requirements)
+
+
+class PipeNode(object):
+    """Computation shared by the processors of a pipe, such as the
+    preprocessing of their input frames.
+
+    Every subscriber feeds the node with the same sequence of arguments :
+    the result of a step is computed by compute() for the first subscriber
+    reaching it and then served to the other ones from a cache, which only
+    holds the results not yet read by all the subscribers.
+
+    The computation is the function given to the constructor, or the
+    compute() method of a subclass. Without either, the node shares its
+    arguments as they are.
+
+    >>> node = PipeNode(lambda frames: frames * 2)
+    >>> first, second = node.subscribe(), node.subscribe()
+    >>> first.process(1), first.process(2), second.process(10)
+    (2, 4, 2)
+    """
+
+    def __init__(self, function=None):
+        self.function = function
+        self.cursors = []
+        self.results = collections.deque()
+        self.offset = 0
+        self.lock = threading.Lock()
+
+    def subscribe(self):
+        """Return a new PipeNodeSubscriber. Subscribers must be created
+        before the first step is processed"""
+        with self.lock:
+            self.cursors.append(0)
+            return PipeNodeSubscriber(self, len(self.cursors) - 1)
+
+    def compute(self, *args):
+        """Return the result of a step, given the arguments passed to
+        process() by the first subscriber reaching it. It is only called once
+        per step and its result is shared by all the subscribers, which must
+        not modify it."""
+        if self.function is not None:
+            return self.function(*args)
+        if len(args) == 1:
+            return args[0]
+        return args
+
+    def process(self, subscriber, *args):
+        """Return the result of the next step of the subscriber"""
+        with self.lock:
+            position = self.cursors[subscriber]
+            self.cursors[subscriber] += 1
+            if position - self.offset < len(self.results):
+                result = self.results[position - self.offset]
+            else:
+                result = self.compute(*args)
+                self.results.append(result)
+            # forget the results read by every subscriber
+            while self.results and min(self.cursors) > self.offset:
+                self.results.popleft()
+                self.offset += 1
+        return result
+
+
+class PipeNodeSubscriber(object):
+    """Handle of a processor on a PipeNode"""
+
+    def __init__(self, node, index):
+        self.node = node
+        self.index = index
+
+    def process(self, *args):
+        """Return the result of the next step of the node"""
+        return self.node.process(self.index, *args)
+
+
+class STFTFrame(object):
+    """Read-only complex spectrum of a frame, with its magnitude and phase
+    computed on demand"""
+
+    def __init__(self, fft):
+        self.fft = fft
+        self.fft.flags.writeable = False
+        self._magnitude = None
+        self._phase = None
+
+    @property
+    def magnitude(self):
+        if self._magnitude is None:
+            self._magnitude = numpy.abs(self.fft)
+            self._magnitude.flags.writeable = False
+        return self._magnitude
+
+    @property
+    def phase(self):
+        if self._phase is None:
+            self._phase = numpy.angle(self.fft)
+            self._phase.flags.writeable = False
+        return self._phase
+
+
+def is_plain_value(value):
+    """Return True if value is a number, a string, None or a list of them"""
+    if isinstance(value, (list, tuple)):
+        return all(is_plain_value(item) for item in value)
+    return value is None or isinstance(value, (basestring, int, long, float,
+                                                bool, numpy.generic))
+
+
 def processors(interface=IProcessor, recurse=True):
     """Returns the processors implementing a given interface and, if recurse,
-    any of the descendants of this interface."""
+    any of the descendants of this interface. The plugins of these interfaces
+    are imported first, skipping those which can not be imported."""
+    load_plugins(interface, recurse)
     return implementations(interface, recurse)
 
 
 def get_processor(processor_id):
-    """Return a processor by its id"""
+    """Return a processor by its id, importing its plugin if needed"""
+    if not _processors.has_key(processor_id):
+        plugin = find_plugin(processor_id)
+        if plugin is not None and not import_plugin(plugin.module):
+            raise Error("Processor '%s' is not available: %s"
+                        % (processor_id, failed[plugin.module]))
     if not _processors.has_key(processor_id):
         raise Error("No processor registered with id: '%s'"
                       % processor_id)
@@ -241,6 +560,9 @@ class ProcessPipe(object):
 
     def __init__(self, *others):
         self.processors = []
+        self._stft = {}
+        self._nodes = {}
+        self.blocksize_plan = None
         self |= others
 
         from timeside.analyzer.core import AnalyzerResultContainer
@@ -255,8 +577,12 @@ class ProcessPipe(object):
                 self |= parent
             self.processors.append(other)
             other.process_pipe = self
+            if not hasattr(other, 'parameters'):
+                other.parameters = other.get_parameters()
         elif isinstance(other, ProcessPipe):
             self.processors.extend(other.processors)
+            for processor in other.processors:
+                processor.process_pipe = self
         else:
             try:
                 iter(other)
@@ -276,12 +602,56 @@ class ProcessPipe(object):
                 pipe += ' | '
         return pipe
 
-    def run(self, channels=None, samplerate=None, blocksize=None, stack=None):
+    def run(self, channels=None, samplerate=None, blocksize=None, stack=None,
+            threads=None, cache=None, keep=False):
         """Setup/reset all processors in cascade and stream audio data along
-        the pipe. Also returns the pipe itself."""
+        the pipe. Also returns the pipe itself.
+
+        If threads is set, the processors following the source are run in
+        worker threads fed by bounded queues instead of in the calling
+        thread : threads=True gives each processor its own thread and an
+        integer dispatches the processors over that many threads. Each thread
+        receives the frames of the source, so the processors must return
+        their input frames unchanged (as analyzers, graphers and encoders
+        do). post_process() and release() are still called from the calling
+        thread, in the order of the pipe.
+
+        If cache is a ResultCache, the analyzers whose results are in the
+        cache are removed from the pipe and their results are loaded from it
+        instead. The source is not even decoded if all the processors are
+        cached. The results of the other analyzers are stored in the cache.
+
+        If blocksize is 'auto', the blocksize of the source is planned for
+        the input blocksize and stepsize of the processors, see
+        BlocksizePlan. The plan is kept as the blocksize_plan attribute.
+
+        If keep is True, the processors are left in the pipe after the run
+        so that it can be run again, see run_many()."""
 
         source = self.processors[0]
         items = self.processors[1:]
+        self._stft = {}
+        self._nodes = {}
+
+        cache_keys = {}
+        if cache is not None:
+            for item in self.processors[1:]:
+                key = cache.key(source, item, channels, samplerate, blocksize)
+                if key is None:
+                    continue
+                results = cache.get(key)
+                if results is None:
+                    cache_keys[item] = key
+                else:
+                    self.results.add(results.values())
+                    items.remove(item)
+                    if not keep:
+                        self.processors.remove(item)
+            if not items and not stack:
+                return
+        if blocksize == 'auto':
+            self.blocksize_plan = self.plan_blocksize(channels)
+            blocksize = self.blocksize_plan.blocksize
         source.setup(channels=channels, samplerate=samplerate,
                      blocksize=blocksize)
 
@@ -295,27 +665,39 @@ class ProcessPipe(object):
 
         last = source
 
-        # setup/reset processors and configure properties throughout the pipe
-        for item in items:
-            item.source_mediainfo = source.mediainfo()
-            item.setup(channels=last.channels(),
-                       samplerate=last.samplerate(),
-                       blocksize=last.blocksize(),
-                       totalframes=last.totalframes())
-            last = item
-
-        # now stream audio data along the pipe
-        eod = False
-        while not eod:
-            frames, eod = source.process()
-            if self.stack:
-                self.frames_stack.append(frames)
+        # the source is released even if a processor fails, so that its
+        # pipeline and its partial cache entry are not left behind
+        try:
+            # setup/reset processors and configure properties throughout the
+            # pipe
             for item in items:
-                frames, eod = item.process(frames, eod)
+                item.source_mediainfo = source.mediainfo()
+                item.setup(channels=last.channels(),
+                           samplerate=last.samplerate(),
+                           blocksize=last.blocksize(),
+                           totalframes=last.totalframes())
+                last = item
+
+            # now stream audio data along the pipe
+            if threads and items:
+                self._run_threads(source, items, threads)
+            else:
+                eod = False
+                while not eod:
+                    frames, eod = source.process()
+                    if self.stack:
+                        self.frames_stack.append(frames)
+                    for item in items:
+                        frames, eod = item.process(frames, eod)
+
+            # Post-processing
+            for item in items:
+                item.post_process()
+        finally:
+            source.release()
 
-        # Post-processing
-        for item in items:
-            item.post_process()
+        for item, key in cache_keys.items():
+            cache.set(key, item.results)
 
         # Release processors
         if self.stack:
@@ -331,4 +713,146 @@ class ProcessPipe(object):
 
         for item in items:
             item.release()
-            self.processors.remove(item)
+            if not keep:
+                self.processors.remove(item)
+
+    def run_many(self, sources, **options):
+        """Run the processors of the pipe over each of the sources in turn and
+        yield a (source, results) pair for each of them, results being the
+        AnalyzerResultContainer of the source. The options are those of
+        run().
+
+        The processors are only created once, their state is reset by their
+        setup() for each source. They are released after each run, so their
+        release() must leave them ready for a new setup(), as those of
+        TimeSide do. The source the pipe was built with, if any, is replaced
+        by each of the sources. A source is done with once the next one is
+        requested, so graphers are to be rendered in between."""
+
+        from timeside.api import IDecoder
+        from timeside.analyzer.core import AnalyzerResultContainer
+        template = None
+        if self.processors and isinstance(self.processors[0],
+                                          tuple(implementations(IDecoder))):
+            template = self.processors.pop(0)
+        self.processors.insert(0, template)
+        try:
+            for source in sources:
+                self.processors[0] = source
+                source.process_pipe = self
+                self.results = AnalyzerResultContainer()
+                self.run(keep=True, **options)
+                yield source, self.results
+        finally:
+            if template is None:
+                del self.processors[0]
+            else:
+                self.processors[0] = template
+
+    def stft(self, blocksize, stepsize, window=None, fft_size=None,
+             channel=None):
+        """Return a subscriber to the STFT of the pipe identified by the given
+        parameters, creating it on the first request. Processors subscribe
+        during setup(), see STFT for the parameters."""
+        key = (blocksize, stepsize, window, fft_size, channel)
+        if key not in self._stft:
+            self._stft[key] = STFT(*key)
+        return self._stft[key].subscribe()
+
+    def plan_blocksize(self, channels=None):
+        """Return the BlocksizePlan of the source for the processors of the
+        pipe, planned before their setup"""
+        source = self.processors[0]
+        try:
+            totalframes = source.totalframes()
+        except (AttributeError, TypeError):
+            totalframes = None
+        requirements = []
+        for item in self.processors[1:]:
+            blocksize = getattr(item, 'input_blocksize', None)
+            stepsize = getattr(item, 'input_stepsize', None) or blocksize
+            if not blocksize:
+                # graphers need a block of frames per pixel
+                blocksize = getattr(item, 'samples_per_pixel', None)
+                width = getattr(item, 'image_width', None)
+                if not blocksize and totalframes and width:
+                    blocksize = int(round(totalframes / float(width)))
+                stepsize = blocksize
+            if blocksize:
+                requirements.append((item.id(), int(blocksize), int(stepsize)))
+        if channels is None:
+            try:
+                channels = source.channels()
+            except AttributeError:
+                pass
+        return BlocksizePlan(requirements, channels)
+
+    def node(self, key, factory):
+        """Return a subscriber to the PipeNode of the pipe identified by key,
+        creating it with factory() on the first request. Processors
+        subscribe during setup()."""
+        if key not in self._nodes:
+            self._nodes[key] = factory()
+        return self._nodes[key].subscribe()
+
+    def _run_threads(self, source, items, threads):
+        """Stream the source frames to the items dispatched over worker
+        threads and wait for all of them to reach the end of data"""
+
+        if threads is True:
+            nb_threads = len(items)
+        else:
+            nb_threads = min(int(threads), len(items))
+        workers = [ProcessThread(items[index::nb_threads])
+                   for index in range(nb_threads)]
+        for worker in workers:
+            worker.start()
+
+        eod = False
+        try:
+            while not eod:
+                frames, eod = source.process()
+                if self.stack:
+                    self.frames_stack.append(frames)
+                for worker in workers:
+                    worker.queue.put((frames, eod))
+        finally:
+            if not eod:
+                # the source failed: stop the workers before raising
+                for worker in workers:
+                    worker.queue.put(None)
+            for worker in workers:
+                worker.join()
+
+        for worker in workers:
+            if worker.error is not None:
+                raise worker.error[0], worker.error[1], worker.error[2]
+
+
+class ProcessThread(threading.Thread):
+    """Worker thread of a threaded ProcessPipe, running a group of processors
+    on the frames put in its queue until the end of data"""
+
+    def __init__(self, processors, queue_size=PIPE_QUEUE_SIZE):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.processors = processors
+        self.queue = Queue.Queue(queue_size)
+        self.error = None
+
+    def run(self):
+        eod = False
+        while not eod:
+            buf = self.queue.get()
+            if buf is None:
+                return
+            frames, eod = buf
+            if self.error is not None:
+                # keep emptying the queue so that the source never blocks
+                continue
+            try:
+                item_eod = eod
+                for item in self.processors:
+                    frames, item_eod = item.process(frames, item_eod)
+            except Exception:
+                self.error = sys.exc_info()
@@ -1,3 +1,11 @@
 # -*- coding: utf-8 -*-
 
-from core import *
+from timeside.plugins import lazy_package
+
+lazy_package(__name__, {
+    'FileDecoder': 'core',
+    'ArrayDecoder': 'core',
+    'PCMFileDecoder': 'core',
+    'MultiSegmentDecoder': 'core',
+    'SegmentDecoder': 'core',
+    })
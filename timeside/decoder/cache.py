@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2007-2013 Parisson
+#
+# This file is part of TimeSide.
+
+# TimeSide is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+
+# TimeSide is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with TimeSide.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import hashlib
+import tempfile
+import threading
+import numpy as np
+import simplejson as json
+
+from utils import uri2path, discover_uri
+
+
+class DecoderCache(object):
+    """
+    On-disk cache of decoded audio streams
+
+    Each stream is stored as a raw float32 file of shape (totalframes,
+    channels) next to a JSON file describing it, and is read back through a
+    read-only memory map. Entries are keyed by the source uri, its
+    modification time and size, the decoded segment and the output samplerate
+    and channels. When the cache grows over max_size bytes, the least recently
+    used entries are removed.
+
+    Parameters
+    ----------
+    path : str
+        directory of the cache, created if needed
+    max_size : int
+        maximum size of the cache in bytes, unbounded if None
+    """
+
+    def __init__(self, path, max_size=None):
+        self.path = path
+        self.max_size = max_size
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+
+    def key(self, uri, start, duration, samplerate, channels):
+        """Return the key of a decoded stream, or None if the source is not a
+        local file"""
+        path = uri2path(uri)
+        if path is None:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        source = (uri, stat.st_mtime, stat.st_size, start, duration,
+                  samplerate, channels)
+        return hashlib.sha1(repr(source)).hexdigest()
+
+    def files(self, key):
+        """Return the paths of the samples and info files of an entry"""
+        path = os.path.join(self.path, key)
+        return path + '.raw', path + '.json'
+
+    def get(self, key):
+        """Return the (samples, info) of an entry, samples being a read-only
+        memory map, or None if the entry is not in the cache"""
+        samples_file, info_file = self.files(key)
+        try:
+            with open(info_file) as f:
+                info = json.load(f)
+            shape = (info['totalframes'], info['channels'])
+            if info['totalframes']:
+                samples = np.memmap(samples_file, dtype='float32', mode='r',
+                                    shape=shape)
+            else:
+                samples = np.zeros(shape, dtype='float32')
+            # Mark the entry as recently used
+            os.utime(samples_file, None)
+        except (IOError, OSError, ValueError):
+            return None
+        return samples, info
+
+    def writer(self, key):
+        """Return a DecoderCacheWriter storing a new entry"""
+        return DecoderCacheWriter(self, key)
+
+    def size(self):
+        """Return the total size of the cached samples in bytes"""
+        return sum(size for _, size, _ in self.entries())
+
+    def entries(self):
+        """Return the (last use time, size, key) of the cached entries"""
+        entries = []
+        for name in os.listdir(self.path):
+            key, ext = os.path.splitext(name)
+            if ext != '.raw':
+                continue
+            try:
+                stat = os.stat(os.path.join(self.path, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, key))
+        return entries
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits in
+        max_size"""
+        if self.max_size is None:
+            return
+        entries = sorted(self.entries())
+        size = sum(size for _, size, _ in entries)
+        for _, entry_size, key in entries:
+            if size <= self.max_size:
+                break
+            for path in reversed(self.files(key)):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            size -= entry_size
+
+
+class DecoderCacheWriter(object):
+    """Write the blocks of a decoded stream to a new DecoderCache entry"""
+
+    def __init__(self, cache, key):
+        self.cache = cache
+        self.key = key
+        self.totalframes = 0
+        fd, self.tmp_path = tempfile.mkstemp(dir=cache.path, suffix='.tmp')
+        self.file = os.fdopen(fd, 'wb')
+
+    def write(self, frames):
+        if frames is None or not len(frames):
+            return
+        np.asarray(frames, dtype='float32').tofile(self.file)
+        self.totalframes += len(frames)
+
+    def commit(self, info):
+        """Store the entry with info, a JSON serializable dict which must
+        provide the number of channels"""
+        self.file.close()
+        info = dict(info, totalframes=self.totalframes)
+        samples_file, info_file = self.cache.files(self.key)
+        os.rename(self.tmp_path, samples_file)
+        # The entry is only visible once its info file exists
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache.path, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(info, f)
+        os.rename(tmp_path, info_file)
+        self.cache.evict()
+
+    def abort(self):
+        """Drop the entry being written"""
+        self.file.close()
+        try:
+            os.remove(self.tmp_path)
+        except OSError:
+            pass
+
+
+class MediaInfoCache(object):
+    """
+    Cache of the media information returned by get_media_uri_info()
+
+    The entries are kept in memory and, when a path is given, as JSON files
+    in that directory so that other processes and later runs share them.
+    They are keyed by the uri of a local file with its modification time and
+    size. Other uris are discovered each time.
+
+    Parameters
+    ----------
+    path : str
+        directory of the cache, created if needed, or None to keep the
+        entries in memory only
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        if self.path is not None and not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def key(self, uri):
+        """Return the key of a media, or None if it is not a local file"""
+        path = uri2path(uri)
+        if path is None:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return hashlib.sha1(repr((uri, stat.st_mtime,
+                                  stat.st_size))).hexdigest()
+
+    def file(self, key):
+        return os.path.join(self.path, key + '.json')
+
+    def get(self, key):
+        """Return the information of an entry, or None if the entry is not
+        in the cache"""
+        with self.lock:
+            if key in self.entries:
+                return self.entries[key]
+        if self.path is None:
+            return None
+        try:
+            with open(self.file(key)) as f:
+                info = json.load(f)
+        except (IOError, ValueError):
+            return None
+        with self.lock:
+            self.entries[key] = info
+        return info
+
+    def set(self, key, info):
+        """Store the information of an entry"""
+        with self.lock:
+            self.entries[key] = info
+        if self.path is None:
+            return
+        # The entry is only visible once completely written
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(info, f)
+        os.rename(tmp_path, self.file(key))
+
+    def info(self, uri):
+        """Return the information of a media, discovered if it is not in the
+        cache"""
+        key = self.key(uri)
+        if key is not None:
+            info = self.get(key)
+            if info is not None:
+                return info
+        info = discover_uri(uri)
+        if key is not None:
+            self.set(key, info)
+        return info
+
+    def discover(self, uris, jobs=4):
+        """Return the information of many media, in the order of uris. The
+        media which are not in the cache are discovered concurrently by jobs
+        threads. The IOError raised by a media which can not be discovered
+        is returned in place of its information."""
+        def info(uri):
+            try:
+                return self.info(uri)
+            except IOError, e:
+                return e
+
+        uris = list(uris)
+        if jobs <= 1 or len(uris) <= 1:
+            return [info(uri) for uri in uris]
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(min(jobs, len(uris)))
+        try:
+            return pool.map(info, uris)
+        finally:
+            pool.terminate()
+            pool.join()
+
+
+# Media information of the process, see get_media_uri_info()
+media_info_cache = MediaInfoCache()
@@ -30,17 +30,135 @@ from __future__ import division
 
 from timeside.core import Processor, implements, interfacedoc
 from timeside.api import IDecoder
+from timeside.exceptions import Error
 from timeside.tools import *
 
-from utils import get_uri, get_media_uri_info
+from utils import get_uri, get_media_uri_info, get_pcm_file_info, uri2path
+from utils import get_file_hash
+from cache import DecoderCache
 
+import sys
+import time
+import hashlib
 import Queue
+import collections
 from gst import _gst as gst
 import numpy as np
 
 
 GST_APPSINK_MAX_BUFFERS = 10
 QUEUE_SIZE = 10
+BLOCK_POOL_SIZE = QUEUE_SIZE + 4
+
+
+def iter_blocks(samples, blocksize):
+    "Iterate over the (frames, eod) blocks of an array of samples"
+    totalframes = len(samples)
+    nb_frames = totalframes // blocksize
+
+    if totalframes % blocksize == 0:
+        nb_frames -= 1  # Last frame must send eod=True
+
+    for index in xrange(0, nb_frames * blocksize, blocksize):
+        yield (samples[index:index+blocksize], False)
+
+    yield (samples[nb_frames * blocksize:], True)
+
+
+class BlockPool(object):
+    """
+    Pool of reusable sample blocks
+
+    A block handed out by the pool is reused once nothing else refers to it
+    anymore, either directly or through a view. Blocks still held by the
+    decoder queue or by the processors are left untouched, so that at most
+    `size` blocks are allocated while the consumers keep up.
+    """
+
+    def __init__(self, size=BLOCK_POOL_SIZE):
+        self.size = size
+        self.blocks = []
+
+    def get(self, shape, dtype='float32'):
+        for block in self.blocks:
+            # References: the pool list, the loop variable and the argument
+            if sys.getrefcount(block) <= 3 and block.shape == shape:
+                return block
+        block = np.empty(shape, dtype=dtype)
+        if len(self.blocks) < self.size:
+            self.blocks.append(block)
+        return block
+
+
+class DecoderPipeline(object):
+    """ gstreamer pipeline decoding a uri into the float32 buffers of an
+    appsink, kept in the pipeline pool between the runs of the decoders.
+
+    The source is an uridecodebin, or a gnlurisource for the segments of a
+    media. Its pads are linked by hand, so that they are linked again each
+    time the pipeline is played with a new uri. """
+
+    def __init__(self, is_segment):
+        self.pipeline = gst.Pipeline()
+        if is_segment:
+            self.source = gst.element_factory_make('gnlurisource', 'source')
+            self.source.set_property('start', 0)
+        else:
+            self.source = gst.element_factory_make('uridecodebin', 'source')
+        self.conv = gst.element_factory_make('audioconvert', 'audioconvert')
+        resample = gst.element_factory_make('audioresample', 'audioresample')
+        self.sink = gst.element_factory_make('appsink', 'sink')
+        self.sink.set_property('sync', False)
+        self.sink.set_property('async', True)
+        self.sink.set_property('max-buffers', GST_APPSINK_MAX_BUFFERS)
+        self.sink.set_property('drop', False)
+        self.sink.set_property('emit-signals', True)
+        self.pipeline.add(self.source, self.conv, resample, self.sink)
+        gst.element_link_many(self.conv, resample, self.sink)
+        self.source.connect('pad-added', self._on_pad_added_cb)
+        self.bus = self.pipeline.get_bus()
+        self.handlers = []
+
+    def _on_pad_added_cb(self, source, pad):
+        sink_pad = self.conv.get_pad('sink')
+        if sink_pad.is_linked():
+            return
+        caps = pad.get_caps()
+        if caps is not None and not caps.to_string().startswith('audio'):
+            return
+        pad.link(sink_pad)
+
+    def attach(self, decoder, uri, caps, segment=None):
+        """ Point the pipeline at the uri, or its segment given as a
+        (start, duration) pair in nanoseconds, and send its buffers and
+        messages to the decoder """
+        self.source.set_property('uri', uri)
+        if segment is not None:
+            start, duration = segment
+            self.source.set_property('duration', duration)
+            self.source.set_property('media-start', start)
+            self.source.set_property('media-duration', duration)
+        self.sink.set_property('caps', caps)
+        conv_pad = self.conv.get_pad('sink')
+        self.handlers = [
+            (conv_pad, conv_pad.connect('notify::caps',
+                                        decoder._notify_caps_cb)),
+            (self.sink, self.sink.connect('new-buffer',
+                                          decoder._on_new_buffer_cb)),
+            (self.bus, self.bus.connect('message', decoder._on_message_cb))]
+        self.bus.add_signal_watch()
+
+    def detach(self):
+        """ Stop the pipeline and disconnect it from its decoder """
+        for element, handler in self.handlers:
+            element.disconnect(handler)
+        self.handlers = []
+        self.bus.remove_signal_watch()
+        self.pipeline.set_state(gst.STATE_NULL)
+
+
+# Idle decoder pipelines of the process, keyed by whether they decode a segment
+pipeline_pool = PipelinePool()
 
 
 class FileDecoder(Processor):
@@ -62,7 +180,7 @@ class FileDecoder(Processor):
     def id():
         return "gst_dec"
 
-    def __init__(self, uri, start=0, duration=None):
+    def __init__(self, uri, start=0, duration=None, cache=None):
 
         """
         Construct a new FileDecoder
@@ -75,23 +193,45 @@ class FileDecoder(Processor):
             start time of the segment in seconds
         duration : float
             duration of the segment in seconds
+        cache : DecoderCache or str
+            cache of the decoded streams, or the path of its directory.
+            A stream found in the cache is read back without running
+            gstreamer, a new one is stored while it is decoded
+
+        Uncompressed WAV and AIFF files which do not need to be resampled
+        are read through a PCMFileDecoder instead of gstreamer.
         """
 
         super(FileDecoder, self).__init__()
 
         self.uri = get_uri(uri)
 
+        if isinstance(cache, basestring):
+            cache = DecoderCache(cache)
+        self.cache = cache
+        self.cache_writer = None
+        self.cached_frames = None
+        self.pcm_decoder = None
+
         self.uri_start = float(start)
         if duration:
             self.uri_duration = float(duration)
         else:
             self.uri_duration = duration
+        # uri_duration is set from the media on setup, keep the requested one
+        # to key the cached streams
+        self.segment_duration = self.uri_duration
 
         if start==0 and duration is None:
             self.is_segment = False
         else:
             self.is_segment = True
 
+    def cache_key(self):
+        """Return the key of the decoded stream in the cache, or None"""
+        return self.cache.key(self.uri, self.uri_start, self.segment_duration,
+                              self.output_samplerate, self.output_channels)
+
     def set_uri_default_duration(self):
         # Set the duration from the length of the file
         uri_total_duration = get_media_uri_info(self.uri)['duration']
@@ -99,14 +239,6 @@ class FileDecoder(Processor):
 
     def setup(self, channels=None, samplerate=None, blocksize=None):
 
-        if self.uri_duration is None:
-            self.set_uri_default_duration()
-
-        # a lock to wait wait for gstreamer thread to be ready
-        import threading
-        self.discovered_cond = threading.Condition(threading.Lock())
-        self.discovered = False
-
         # the output data format we want
         if blocksize:
             self.output_blocksize = blocksize
@@ -115,30 +247,44 @@ class FileDecoder(Processor):
         if channels:
             self.output_channels = int(channels)
 
-        if self.is_segment:
-            # Create the pipe with Gnonlin gnlurisource
-            self.pipe = ''' gnlurisource uri={uri}
-                            start=0
-                            duration={uri_duration}
-                            media-start={uri_start}
-                            media-duration={uri_duration}
-                            ! audioconvert name=audioconvert
-                            ! audioresample
-                            ! appsink name=sink sync=False async=True
-                            '''.format(uri = self.uri,
-                                       uri_start = np.uint64(round(self.uri_start * gst.SECOND)),
-                                       uri_duration = np.int64(round(self.uri_duration * gst.SECOND)))
-                                       # convert uri_start and uri_duration to nanoseconds
-        else:
-            # Create the pipe with standard Gstreamer uridecodbin
-            self.pipe = ''' uridecodebin name=uridecodebin uri={uri}
-                           ! audioconvert name=audioconvert
-                           ! audioresample
-                           ! appsink name=sink sync=False async=True
-                           '''.format(uri = self.uri)
+        self.cache_writer = None
+        self.cached_frames = None
+        self.pcm_decoder = None
+        self.decoder_pipeline = None
+        # time in seconds spent in each stage of the setup
+        self.setup_times = {}
+        if PCMFileDecoder.can_decode(self.uri, self.output_samplerate,
+                                     self.output_channels):
+            self._setup_pcm_decoder()
+            return
+
+        if self.cache is not None:
+            key = self.cache_key()
+            if key is not None:
+                entry = self.cache.get(key)
+                if entry is not None:
+                    self._setup_from_cache(*entry)
+                    return
+                self.cache_writer = self.cache.writer(key)
+
+        if self.uri_duration is None:
+            stage_start = time.time()
+            self.set_uri_default_duration()
+            self._setup_time('duration', stage_start)
+
+        # a lock to wait wait for gstreamer thread to be ready
+        import threading
+        self.discovered_cond = threading.Condition(threading.Lock())
+        self.discovered = False
 
-        self.pipeline = gst.parse_launch(self.pipe)
+        # a pooled pipeline of the same kind is pointed at the uri
+        stage_start = time.time()
+        self.decoder_pipeline = pipeline_pool.get(
+            self.is_segment, lambda: DecoderPipeline(self.is_segment))
+        self.pipeline = self.decoder_pipeline.pipeline
+        self._setup_time('pipeline', stage_start)
 
+        stage_start = time.time()
         if self.output_channels:
             caps_channels = int(self.output_channels)
         else:
@@ -153,56 +299,96 @@ class FileDecoder(Processor):
             width=(int)32,
             rate=(int)%s""" % (caps_channels, caps_samplerate))
 
-        self.conv = self.pipeline.get_by_name('audioconvert')
-        self.conv.get_pad("sink").connect("notify::caps", self._notify_caps_cb)
-
-        self.sink = self.pipeline.get_by_name('sink')
-        self.sink.set_property("caps", sink_caps)
-        self.sink.set_property('max-buffers', GST_APPSINK_MAX_BUFFERS)
-        self.sink.set_property("drop", False)
-        self.sink.set_property('emit-signals', True)
-        self.sink.connect("new-buffer", self._on_new_buffer_cb)
-
-        self.bus = self.pipeline.get_bus()
-        self.bus.add_signal_watch()
-        self.bus.connect('message', self._on_message_cb)
+        if self.is_segment:
+            # convert uri_start and uri_duration to nanoseconds
+            segment = (int(round(self.uri_start * gst.SECOND)),
+                       int(round(self.uri_duration * gst.SECOND)))
+        else:
+            segment = None
+        self.decoder_pipeline.attach(self, self.uri, sink_caps, segment)
 
         self.queue = Queue.Queue(QUEUE_SIZE)
 
-        import threading
-
-        class MainloopThread(threading.Thread):
-            def __init__(self, mainloop):
-                threading.Thread.__init__(self)
-                self.mainloop = mainloop
-
-            def run(self):
-                self.mainloop.run()
-        self.mainloop = gobject.MainLoop()
-        self.mainloopthread = MainloopThread(self.mainloop)
-        self.mainloopthread.start()
-        #self.mainloopthread = get_loop_thread()
-        ##self.mainloop = self.mainloopthread.mainloop
+        # the bus messages are dispatched by the mainloop thread shared by
+        # all the decoders and encoders
+        self.mainloopthread = get_loop_thread()
+        self.mainloop = self.mainloopthread.mainloop
 
         self.eod = False
 
-        self.last_buffer = None
+        # the block being assembled from the appsink buffers
+        self.block_pool = BlockPool()
+        self.block = None
+        self.block_fill = 0
+        # time in seconds spent by gstreamer waiting for the consumers
+        self.queue_stall_time = 0.
 
         # start pipeline
         self.pipeline.set_state(gst.STATE_PLAYING)
+        self._setup_time('start', stage_start)
 
+        stage_start = time.time()
         self.discovered_cond.acquire()
         while not self.discovered:
             #print 'waiting'
             self.discovered_cond.wait()
         self.discovered_cond.release()
+        self._setup_time('discovery', stage_start)
 
         if not hasattr(self, 'input_samplerate'):
+            self._release_pipeline(reuse=False)
             if hasattr(self, 'error_msg'):
                 raise IOError(self.error_msg)
             else:
                 raise IOError('no known audio stream found')
 
+    def _setup_time(self, stage, start):
+        self.setup_times[stage] = time.time() - start
+
+    def _release_pipeline(self, reuse=True):
+        # Detach the decoder from its pipeline, and give the pipeline back to
+        # the pool unless it failed
+        decoder_pipeline = self.decoder_pipeline
+        if decoder_pipeline is None:
+            return
+        self.decoder_pipeline = None
+        decoder_pipeline.detach()
+        if reuse:
+            pipeline_pool.put(self.is_segment, decoder_pipeline)
+
+    def _setup_pcm_decoder(self):
+        decoder = PCMFileDecoder(self.uri, start=self.uri_start,
+                                 duration=self.uri_duration)
+        decoder.setup(channels=self.output_channels,
+                      samplerate=self.output_samplerate,
+                      blocksize=self.output_blocksize)
+        for name in ('uri_duration', 'input_samplerate', 'input_channels',
+                     'input_width', 'input_duration', 'input_totalframes',
+                     'output_samplerate', 'output_channels', 'mimetype'):
+            setattr(self, name, getattr(decoder, name))
+        self.pcm_decoder = decoder
+
+    def _setup_from_cache(self, samples, info):
+        self.uri_duration = info['uri_duration']
+        self.input_samplerate = info['input_samplerate']
+        self.input_channels = info['input_channels']
+        self.input_width = info['input_width']
+        self.input_duration = info['input_duration']
+        self.input_totalframes = info['input_totalframes']
+        self.output_samplerate = info['samplerate']
+        self.output_channels = info['channels']
+        self.cached_frames = iter_blocks(samples, self.output_blocksize)
+
+    def _cache_info(self):
+        return dict(uri_duration=self.uri_duration,
+                    input_samplerate=self.input_samplerate,
+                    input_channels=self.input_channels,
+                    input_width=self.input_width,
+                    input_duration=self.input_duration,
+                    input_totalframes=self.input_totalframes,
+                    samplerate=self.output_samplerate,
+                    channels=self.output_channels)
+
     def _notify_caps_cb(self, pad, args):
         self.discovered_cond.acquire()
 
@@ -250,15 +436,13 @@ class FileDecoder(Processor):
     def _on_message_cb(self, bus, message):
         t = message.type
         if t == gst.MESSAGE_EOS:
-            self.queue.put(gst.MESSAGE_EOS)
-            self.pipeline.set_state(gst.STATE_NULL)
-            self.mainloop.quit()
+            # the pipeline is stopped and given back to the pool by process()
+            self._queue_put(gst.MESSAGE_EOS)
         elif t == gst.MESSAGE_ERROR:
             self.pipeline.set_state(gst.STATE_NULL)
             err, debug = message.parse_error()
             self.discovered_cond.acquire()
             self.discovered = True
-            self.mainloop.quit()
             self.error_msg = "Error: %s" % err, debug
             self.discovered_cond.notify()
             self.discovered_cond.release()
@@ -270,23 +454,54 @@ class FileDecoder(Processor):
     def _on_new_buffer_cb(self, sink):
         buf = sink.emit('pull-buffer')
         new_array = gst_buffer_to_numpy_array(buf, self.output_channels)
-        #print 'processing new buffer', new_array.shape
-        if self.last_buffer is None:
-            self.last_buffer = new_array
-        else:
-            self.last_buffer = np.concatenate((self.last_buffer, new_array), axis=0)
-        while self.last_buffer.shape[0] >= self.output_blocksize:
-            new_block = self.last_buffer[:self.output_blocksize]
-            self.last_buffer = self.last_buffer[self.output_blocksize:]
-            #print 'queueing', new_block.shape, 'remaining', self.last_buffer.shape
-            self.queue.put([new_block, False])
+        # The buffer is viewed in place, each sample is only copied once,
+        # into the pending block
+        index = 0
+        while index < len(new_array):
+            if self.block is None:
+                self.block = self.block_pool.get((self.output_blocksize,
+                                                  self.output_channels))
+                self.block_fill = 0
+            count = min(len(new_array) - index,
+                        self.output_blocksize - self.block_fill)
+            self.block[self.block_fill:self.block_fill + count] = \
+                new_array[index:index + count]
+            self.block_fill += count
+            index += count
+            if self.block_fill == self.output_blocksize:
+                self._queue_put([self.block, False])
+                self.block = None
+
+    def _queue_put(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except Queue.Full:
+            stall_start = time.time()
+            self.queue.put(item)
+            self.queue_stall_time += time.time() - stall_start
+
+    def _last_block(self):
+        if self.block is None:
+            return np.empty((0, self.output_channels), dtype='float32')
+        return self.block[:self.block_fill]
 
     @interfacedoc
     def process(self, frames=None, eod=False):
+        if self.pcm_decoder is not None:
+            return self.pcm_decoder.process()
+        if self.cached_frames is not None:
+            return self.cached_frames.next()
         buf = self.queue.get()
         if buf == gst.MESSAGE_EOS:
-            return self.last_buffer, True
-        frames, eod = buf
+            frames, eod = self._last_block(), True
+            self._release_pipeline()
+        else:
+            frames, eod = buf
+        if self.cache_writer is not None:
+            self.cache_writer.write(frames)
+            if eod:
+                self.cache_writer.commit(self._cache_info())
+                self.cache_writer = None
         return frames, eod
 
     @interfacedoc
@@ -311,7 +526,12 @@ class FileDecoder(Processor):
 
     @interfacedoc
     def release(self):
-        pass
+        # Drop a stream whose decoding was not completed
+        if getattr(self, 'cache_writer', None) is not None:
+            self.cache_writer.abort()
+            self.cache_writer = None
+        if getattr(self, 'decoder_pipeline', None) is not None:
+            self._release_pipeline()
 
     @interfacedoc
     def mediainfo(self):
@@ -348,6 +568,18 @@ class FileDecoder(Processor):
         # TODO check
         return self.tags
 
+    @interfacedoc
+    def content_hash(self):
+        path = uri2path(self.uri)
+        if path is None:
+            return None
+        return get_file_hash(path)
+
+    @interfacedoc
+    def segment(self, start, duration=None):
+        return FileDecoder(self.uri, start=start, duration=duration,
+                           cache=self.cache)
+
 
 class ArrayDecoder(Processor):
     """ Decoder taking Numpy array as input"""
@@ -388,6 +620,7 @@ class ArrayDecoder(Processor):
             samples = samples[:, np.newaxis]  # reshape to 2D array
 
         self.samples = samples  # Create a 2 dimensions array
+        self.source_samples = samples
         self.input_samplerate = samplerate
         self.input_channels = self.samples.shape[1]
 
@@ -419,15 +652,15 @@ class ArrayDecoder(Processor):
             self.output_channels = int(channels)
 
         if self.uri_duration is None:
-            self.uri_duration = (len(self.samples) / self.input_samplerate
+            self.uri_duration = (len(self.source_samples) / self.input_samplerate
                                  - self.uri_start)
 
         if self.is_segment:
-            start_index = self.uri_start * self.input_samplerate
+            start_index = int(round(self.uri_start * self.input_samplerate))
             stop_index = start_index + int(np.ceil(self.uri_duration
                                            * self.input_samplerate))
-            stop_index = min(stop_index, len(self.samples))
-            self.samples = self.samples[start_index:stop_index]
+            stop_index = min(stop_index, len(self.source_samples))
+            self.samples = self.source_samples[start_index:stop_index]
 
         if not self.output_samplerate:
             self.output_samplerate = self.input_samplerate
@@ -441,17 +674,8 @@ class ArrayDecoder(Processor):
 
     def get_frames(self):
         "Define an iterator that will return frames at the given blocksize"
-        nb_frames = self.input_totalframes // self.output_blocksize
-
-        if self.input_totalframes % self.output_blocksize == 0:
-            nb_frames -= 1  # Last frame must send eod=True
-
-        for index in xrange(0,
-                            nb_frames * self.output_blocksize,
-                            self.output_blocksize):
-            yield (self.samples[index:index+self.output_blocksize], False)
-
-        yield (self.samples[nb_frames * self.output_blocksize:], True)
+        for block in iter_blocks(self.samples, self.output_blocksize):
+            yield block
 
     @interfacedoc
     def process(self, frames=None, eod=False):
@@ -512,6 +736,452 @@ class ArrayDecoder(Processor):
     def metadata(self):
         return None
 
+    @interfacedoc
+    def content_hash(self):
+        sha1 = hashlib.sha1(repr((self.input_samplerate, self.samples.dtype.str,
+                                  self.samples.shape)))
+        sha1.update(np.ascontiguousarray(self.samples).data)
+        return sha1.hexdigest()
+
+    @interfacedoc
+    def segment(self, start, duration=None):
+        return ArrayDecoder(self.source_samples, self.input_samplerate,
+                            start=start, duration=duration)
+
+
+class PCMFileDecoder(ArrayDecoder):
+    """ Decoder memory-mapping uncompressed WAV and AIFF files """
+    implements(IDecoder)
+
+    # IProcessor methods
+
+    @staticmethod
+    @interfacedoc
+    def id():
+        return "pcm_dec"
+
+    def __init__(self, uri, start=0, duration=None):
+        """
+        Construct a new PCMFileDecoder
+
+        Parameters
+        ----------
+        uri : str
+            uri or path of a PCM WAV or AIFF file
+        start : float
+            start time of the segment in seconds
+        duration : float
+            duration of the segment in seconds
+        """
+        super(ArrayDecoder, self).__init__()
+
+        self.uri = get_uri(uri)
+        path = uri2path(self.uri)
+        info = get_pcm_file_info(path) if path else None
+        if info is None:
+            raise IOError('%s is not a PCM WAV or AIFF file' % uri)
+        self.pcm_info = info
+        self.mimetype = 'audio/x-' + info['format']
+
+        # 24-bit samples are read as bytes and converted block by block
+        if info['width'] == 24:
+            dtype = 'u1'
+            shape = (info['totalframes'], info['channels'] * 3)
+        else:
+            dtype = info['dtype']
+            shape = (info['totalframes'], info['channels'])
+        if info['totalframes']:
+            self.samples = np.memmap(path, dtype=dtype, mode='r',
+                                     offset=info['offset'], shape=shape)
+        else:
+            self.samples = np.zeros(shape, dtype=dtype)
+        self.source_samples = self.samples
+
+        self.input_samplerate = info['samplerate']
+        self.input_channels = info['channels']
+
+        self.uri_start = float(start)
+        if duration:
+            self.uri_duration = float(duration)
+        else:
+            self.uri_duration = duration
+
+        if start == 0 and duration is None:
+            self.is_segment = False
+        else:
+            self.is_segment = True
+
+        self.frames = self.get_frames()
+
+    @staticmethod
+    def can_decode(uri, samplerate=None, channels=None):
+        """Return True if uri is a PCM file which can be decoded at the given
+        samplerate and number of channels"""
+        path = uri2path(uri)
+        info = get_pcm_file_info(path) if path else None
+        if info is None:
+            return False
+        if samplerate and int(samplerate) != info['samplerate']:
+            return False
+        if channels and int(channels) not in (1, info['channels']):
+            return False
+        return True
+
+    def setup(self, channels=None, samplerate=None, blocksize=None):
+
+        # the output data format we want
+        if blocksize:
+            self.output_blocksize = blocksize
+        if samplerate:
+            self.output_samplerate = int(samplerate)
+        if channels:
+            self.output_channels = int(channels)
+
+        if (self.output_samplerate and
+                self.output_samplerate != self.input_samplerate):
+            raise ValueError('PCMFileDecoder can not resample %s to %d Hz'
+                             % (self.uri, self.output_samplerate))
+        if self.output_channels not in (None, 1, self.input_channels):
+            raise ValueError('PCMFileDecoder can not convert %s to %d channels'
+                             % (self.uri, self.output_channels))
+
+        if self.uri_duration is None:
+            self.uri_duration = (len(self.source_samples) / self.input_samplerate
+                                 - self.uri_start)
+
+        if self.is_segment:
+            start_index = int(round(self.uri_start * self.input_samplerate))
+            stop_index = start_index + int(np.ceil(self.uri_duration
+                                           * self.input_samplerate))
+            stop_index = min(stop_index, len(self.source_samples))
+            self.samples = self.source_samples[start_index:stop_index]
+
+        if not self.output_samplerate:
+            self.output_samplerate = self.input_samplerate
+
+        if not self.output_channels:
+            self.output_channels = self.input_channels
+
+        self.input_totalframes = len(self.samples)
+        self.input_duration = self.input_totalframes / self.input_samplerate
+        self.input_width = self.pcm_info['width']
+
+    def to_float(self, frames):
+        "Convert a block of raw samples to float32"
+        info = self.pcm_info
+        width = info['width']
+        if width == 24:
+            data = frames.reshape(len(frames), info['channels'], 3)
+            data = data.astype(np.int32)
+            if info['dtype'][0] == '>':
+                data = data[..., ::-1]
+            samples = data[..., 0] | (data[..., 1] << 8) | (data[..., 2] << 16)
+            samples = (samples ^ 0x800000) - 0x800000
+        elif info['dtype'] == 'u1':
+            samples = frames.astype(np.int16) - 128
+        else:
+            samples = frames
+
+        if info['dtype'][1] == 'f':
+            # float32 samples in native byte order are not copied
+            samples = samples.astype(np.float32, copy=False)
+        else:
+            samples = np.multiply(samples, 2. ** (1 - width), dtype=np.float32)
+
+        if self.output_channels == 1 and self.input_channels > 1:
+            samples = samples.mean(axis=1, dtype=np.float32)[:, np.newaxis]
+        return samples
+
+    def get_frames(self):
+        "Define an iterator that will return frames at the given blocksize"
+        for frames, eod in iter_blocks(self.samples, self.output_blocksize):
+            yield (self.to_float(frames), eod)
+
+    ## IDecoder methods
+    @interfacedoc
+    def format(self):
+        return self.mimetype
+
+    @interfacedoc
+    def content_hash(self):
+        return get_file_hash(uri2path(self.uri))
+
+    @interfacedoc
+    def segment(self, start, duration=None):
+        return PCMFileDecoder(self.uri, start=start, duration=duration)
+
+
+class MultiSegmentDecoder(object):
+    """ Decode several segments of a media in a single pass
+
+    The range of the media going from the start of the first segment to the
+    end of the last one is decoded once, and each segment is read out of it
+    by its own SegmentDecoder, a source giving the segment as a stream of
+    its own with its own mediainfo. The segment decoders are to be run in
+    order, typically by ProcessPipe.run_many() which gives the results of
+    each segment in its own container:
+
+        segments = MultiSegmentDecoder(uri, [(0, 10), (25, 5), (28, 12)])
+        for segment, results in (Level() | Spectrogram()).run_many(segments):
+            ...
+
+    The decoder of the range is released once every segment has reached its
+    end or has been released. A caller stopping before the last segment
+    releases it with release().
+    """
+
+    def __init__(self, source, segments, cache=None):
+        """
+        Construct a new MultiSegmentDecoder
+
+        Parameters
+        ----------
+        source : str or decoder
+            uri or path of the media, or a decoder of the media
+            implementing IDecoder.segment()
+        segments : list
+            (start, duration) pairs of the segments in seconds, sorted by
+            start time. A duration of None goes up to the end of the media.
+            Segments may overlap.
+        cache : DecoderCache or str
+            cache of the decoded streams when source is a uri, see
+            FileDecoder
+        """
+        if isinstance(source, basestring):
+            source = FileDecoder(source, cache=cache)
+        self.source = source
+
+        segments = [(float(start), float(duration) if duration else None)
+                    for start, duration in segments]
+        if not segments:
+            raise ValueError('no segment to decode')
+        starts = [start for start, duration in segments]
+        if starts != sorted(starts):
+            raise ValueError('segments must be sorted by start time')
+        self.start = starts[0]
+        ends = [start + duration if duration else None
+                for start, duration in segments]
+        if None in ends:
+            self.duration = None
+        else:
+            self.duration = max(ends) - self.start
+        self.segments = [SegmentDecoder(self, index, start, duration)
+                         for index, (start, duration) in enumerate(segments)]
+
+        self.decoder = None
+        self.decoding = False
+        self.options = None
+        self.index = 0
+        # indexes of the segments which may still be read
+        self.pending = set()
+
+    def __iter__(self):
+        return iter(self.segments)
+
+    def __len__(self):
+        return len(self.segments)
+
+    def setup(self, index, channels=None, samplerate=None, blocksize=None):
+        """Set up the decoder of the range on the first segment, and check
+        that the segments are read in order with the same options"""
+        if index < self.index:
+            raise Error('the segments of a MultiSegmentDecoder must be '
+                        'decoded in order')
+        # the segments skipped can not be read anymore
+        self.pending.difference_update(range(self.index, index))
+        self.index = index
+        options = (channels, samplerate, blocksize)
+        if self.decoding:
+            if options != self.options:
+                raise Error('the segments of a MultiSegmentDecoder must be '
+                            'decoded with the same channels, samplerate '
+                            'and blocksize')
+            return
+        if self.start == 0 and self.duration is None:
+            self.decoder = self.source
+        else:
+            self.decoder = self.source.segment(self.start, self.duration)
+        self.decoder.setup(channels=channels, samplerate=samplerate,
+                           blocksize=blocksize)
+        self.decoding = True
+        self.options = options
+        self.pending = set(range(index, len(self.segments)))
+        # decoded blocks with the index of their first frame in the range
+        self.blocks = collections.deque()
+        self.decoded = 0
+        self.eod = False
+
+    def frame(self, time):
+        """Return the index in the decoded range of the frame at time"""
+        return int(round((time - self.start) * self.decoder.samplerate()))
+
+    def read(self, first, last, keep):
+        """Return the frames [first, last) of the range, decoding them if
+        needed, and whether the end of the range was reached. The frames
+        before keep are not needed anymore."""
+        while not self.eod and self.decoded < last:
+            frames, self.eod = self.decoder.process()
+            if len(frames):
+                self.blocks.append((self.decoded, frames))
+                self.decoded += len(frames)
+        while self.blocks and \
+                self.blocks[0][0] + len(self.blocks[0][1]) <= keep:
+            self.blocks.popleft()
+
+        pieces = []
+        for offset, frames in self.blocks:
+            if offset >= last:
+                break
+            lo = max(first - offset, 0)
+            hi = min(last - offset, len(frames))
+            if hi > lo:
+                pieces.append(frames[lo:hi])
+        if len(pieces) == 1:
+            frames = pieces[0]
+        elif pieces:
+            frames = np.concatenate(pieces)
+        else:
+            frames = np.empty((0, self.decoder.channels()), dtype='float32')
+        return frames, self.eod and last >= self.decoded
+
+    def done(self, index):
+        """Mark the segment index as read, and release the decoder once no
+        segment may be read anymore"""
+        self.pending.discard(index)
+        if not self.pending:
+            self.release()
+
+    def release(self):
+        """Release the decoder of the range, which is set up again if a
+        segment is read afterwards"""
+        if self.decoding:
+            self.decoder.release()
+            self.decoding = False
+            self.blocks = collections.deque()
+            self.pending = set()
+
+
+class SegmentDecoder(Processor):
+    """ Segment of a MultiSegmentDecoder, read out of the range decoded in
+    a single pass for all the segments """
+    implements(IDecoder)
+
+    # IProcessor methods
+
+    @staticmethod
+    @interfacedoc
+    def id():
+        return "segment_dec"
+
+    def __init__(self, multi_decoder, index, start, duration):
+        super(SegmentDecoder, self).__init__()
+        self.multi_decoder = multi_decoder
+        self.index = index
+        self.uri = getattr(multi_decoder.source, 'uri', None)
+        self.uri_start = start
+        self.uri_duration = duration
+        self.is_segment = True
+
+    @interfacedoc
+    def setup(self, channels=None, samplerate=None, blocksize=None):
+        multi = self.multi_decoder
+        multi.setup(self.index, channels, samplerate, blocksize)
+        decoder = multi.decoder
+        self.input_samplerate = decoder.input_samplerate
+        self.output_blocksize = decoder.blocksize()
+
+        self.first = multi.frame(self.uri_start)
+        if self.uri_duration is None:
+            # up to the end of the stream
+            self.last = None
+            self.uri_duration = (decoder.uri_start + decoder.uri_duration
+                                 - self.uri_start)
+        else:
+            self.last = self.first + int(round(self.uri_duration
+                                               * decoder.samplerate()))
+        # the frames of the next segment are kept while reading this one
+        if self.index + 1 < len(multi.segments):
+            self.next_first = multi.frame(
+                multi.segments[self.index + 1].uri_start)
+        else:
+            self.next_first = None
+        self.position = self.first
+
+    @interfacedoc
+    def process(self, frames=None, eod=False):
+        last = self.position + self.output_blocksize
+        if self.last is not None:
+            last = min(last, self.last)
+        keep = self.position
+        if self.next_first is not None:
+            keep = min(keep, self.next_first)
+        frames, end = self.multi_decoder.read(self.position, last, keep)
+        self.position += len(frames)
+        eod = end or (self.last is not None and self.position >= self.last)
+        if eod:
+            self.multi_decoder.done(self.index)
+        return frames, eod
+
+    @interfacedoc
+    def channels(self):
+        return self.multi_decoder.decoder.channels()
+
+    @interfacedoc
+    def samplerate(self):
+        return self.multi_decoder.decoder.samplerate()
+
+    @interfacedoc
+    def blocksize(self):
+        return self.output_blocksize
+
+    @interfacedoc
+    def totalframes(self):
+        total = self.multi_decoder.decoder.totalframes()
+        if total is not None:
+            total = max(total - self.first, 0)
+        if self.last is None:
+            return total
+        if total is None:
+            return self.last - self.first
+        return min(self.last - self.first, total)
+
+    @interfacedoc
+    def release(self):
+        self.multi_decoder.done(self.index)
+
+    @interfacedoc
+    def mediainfo(self):
+        return dict(uri=self.uri,
+                    duration=self.uri_duration,
+                    start=self.uri_start,
+                    is_segment=self.is_segment,
+                    samplerate=self.input_samplerate)
+
+    ## IDecoder methods
+    @interfacedoc
+    def format(self):
+        return self.multi_decoder.decoder.format()
+
+    @interfacedoc
+    def encoding(self):
+        return self.multi_decoder.decoder.encoding()
+
+    @interfacedoc
+    def resolution(self):
+        return self.multi_decoder.decoder.resolution()
+
+    @interfacedoc
+    def metadata(self):
+        return self.multi_decoder.decoder.metadata()
+
+    @interfacedoc
+    def content_hash(self):
+        return self.multi_decoder.source.content_hash()
+
+    @interfacedoc
+    def segment(self, start, duration=None):
+        return self.multi_decoder.source.segment(start, duration)
+
 
 if __name__ == "__main__":
     # Run doctest from __main__ and unittest from tests
@@ -27,6 +27,7 @@
 from __future__ import division
 
 import numpy
+import threading
 
 class Noise(object):
     """A class that mimics audiolab.sndfile but generates noise instead of reading
@@ -78,6 +79,36 @@ def path2uri(path):
     return urlparse.urljoin('file:', urllib.pathname2url(path))
 
 
+def uri2path(uri):
+    """
+    Return the path name of a file uri, or None for other schemes
+
+    >>> uri2path('file:///home/john/my_file.wav')
+    '/home/john/my_file.wav'
+    """
+    import urllib
+
+    if not uri.startswith('file://'):
+        return None
+    return urllib.url2pathname(uri[len('file://'):])
+
+
+def get_file_hash(path, blocksize=2**20):
+    """
+    Return the SHA-1 hex digest of the content of a file
+    """
+    import hashlib
+
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(blocksize)
+            if not data:
+                break
+            sha1.update(data)
+    return sha1.hexdigest()
+
+
 def get_uri(source):
     """
     Check a media source as a valid file or uri and return the proper uri
@@ -106,14 +137,26 @@ def get_uri(source):
 
     return uri
 
-def get_media_uri_info(uri):
+# Timeout of the discovery of a media in nanoseconds
+GST_DISCOVER_TIMEOUT = 5000000000L
 
+# Discoverer of each thread, created on its first discovery
+_discoverers = threading.local()
+
+
+def discover_uri(uri):
+    """
+    Probe a media with the gstreamer Discoverer of the calling thread and
+    return its duration in seconds and audio streams
+    """
     from gst.pbutils import Discoverer
     from gst import SECOND as GST_SECOND
     from glib import GError
-    #import gobject
-    GST_DISCOVER_TIMEOUT = 5000000000L
-    uri_discoverer = Discoverer(GST_DISCOVER_TIMEOUT)
+
+    uri_discoverer = getattr(_discoverers, 'discoverer', None)
+    if uri_discoverer is None:
+        uri_discoverer = Discoverer(GST_DISCOVER_TIMEOUT)
+        _discoverers.discoverer = uri_discoverer
     try:
         uri_info = uri_discoverer.discover_uri(uri)
     except  GError as e:
@@ -137,6 +180,153 @@ def get_media_uri_info(uri):
     return info
 
 
+def get_media_uri_info(uri, cache=None):
+    """
+    Return the duration in seconds and the audio streams of a media
+
+    The information of a local file is only discovered again when the file
+    changes. It is kept by cache, a MediaInfoCache, or by the in-memory
+    cache of the process if None.
+    """
+    if cache is None:
+        from timeside.decoder.cache import media_info_cache as cache
+    return cache.info(uri)
+
+
+def _read_extended(data):
+    "Decode the 80-bit IEEE 754 extended float of an AIFF COMM chunk"
+    import struct
+    exponent, mantissa = struct.unpack('>HQ', data)
+    sign = -1 if exponent & 0x8000 else 1
+    exponent &= 0x7FFF
+    if exponent == 0 and mantissa == 0:
+        return 0.
+    return sign * mantissa * 2. ** (exponent - 16383 - 63)
+
+
+def _iter_chunks(f, byteorder, start, end):
+    "Iterate over the (id, data offset, size) of the chunks of a RIFF/IFF file"
+    import struct
+    offset = start
+    while offset + 8 <= end:
+        f.seek(offset)
+        chunk_id, size = struct.unpack(byteorder + '4sI', f.read(8))
+        yield chunk_id, offset + 8, size
+        # chunks are padded to an even size
+        offset += 8 + size + (size % 2)
+
+
+def _pcm_dtype(file_format, byteorder, width, is_float):
+    if is_float:
+        if width not in (32, 64):
+            return None
+        return byteorder + 'f%d' % (width // 8)
+    if width == 8:
+        # 8-bit samples are unsigned in WAV files and signed in AIFF files,
+        # whatever the byte order
+        return 'u1' if file_format == 'wav' else 'i1'
+    if width in (16, 24, 32):
+        return byteorder + 'i%d' % (width // 8)
+    return None
+
+
+def get_pcm_file_info(path):
+    """
+    Return the layout of the samples of an uncompressed WAV or AIFF file
+
+    The returned dict provides the format ('wav' or 'aiff'), samplerate,
+    channels, width in bits, numpy dtype of a sample, offset of the samples in
+    bytes and totalframes. Note that 24-bit samples have no numpy dtype and are
+    described by a 3-byte 'i3' dtype string.
+
+    Return None if the file is not a PCM WAV or AIFF file, or if its samples
+    are padded within larger containers.
+    """
+    import struct
+
+    try:
+        f = open(path, 'rb')
+    except IOError:
+        return None
+
+    with f:
+        header = f.read(12)
+        if len(header) < 12:
+            return None
+        f.seek(0, 2)
+        file_size = f.tell()
+
+        fmt = data = None
+        if header[:4] == 'RIFF' and header[8:] == 'WAVE':
+            byteorder = '<'
+            for chunk_id, offset, size in _iter_chunks(f, byteorder,
+                                                       12, file_size):
+                if chunk_id == 'fmt ':
+                    f.seek(offset)
+                    (audio_format, channels, samplerate, _, block_align,
+                     width) = struct.unpack('<HHIIHH', f.read(16))
+                    if audio_format == 0xFFFE and size >= 40:
+                        # WAVE_FORMAT_EXTENSIBLE, the format is given by the
+                        # first bytes of the sub format GUID
+                        f.seek(offset + 24)
+                        audio_format = struct.unpack('<H', f.read(2))[0]
+                    if audio_format not in (1, 3):
+                        return None
+                    # samples padded in larger containers are not supported
+                    if block_align != channels * width // 8:
+                        return None
+                    fmt = (channels, samplerate, width, audio_format == 3)
+                elif chunk_id == 'data':
+                    data = (offset, min(size, file_size - offset))
+                if fmt and data:
+                    break
+            file_format = 'wav'
+
+        elif header[:4] == 'FORM' and header[8:] in ('AIFF', 'AIFC'):
+            byteorder = '>'
+            for chunk_id, offset, size in _iter_chunks(f, byteorder,
+                                                       12, file_size):
+                if chunk_id == 'COMM':
+                    f.seek(offset)
+                    comm = f.read(size)
+                    channels, _, width = struct.unpack('>hIh', comm[:8])
+                    samplerate = _read_extended(comm[8:18])
+                    compression = comm[18:22] if header[8:] == 'AIFC' \
+                        else 'NONE'
+                    is_float = compression in ('fl32', 'FL32', 'fl64', 'FL64')
+                    if compression == 'sowt':
+                        byteorder = '<'
+                    elif compression != 'NONE' and not is_float:
+                        return None
+                    fmt = (channels, int(samplerate), width, is_float)
+                elif chunk_id == 'SSND':
+                    f.seek(offset)
+                    data_offset = struct.unpack('>I', f.read(4))[0]
+                    start = offset + 8 + data_offset
+                    data = (start, min(size - 8 - data_offset,
+                                       file_size - start))
+                if fmt and data:
+                    break
+            file_format = 'aiff'
+
+        else:
+            return None
+
+    if not (fmt and data):
+        return None
+    channels, samplerate, width, is_float = fmt
+    dtype = _pcm_dtype(file_format, byteorder, width, is_float)
+    if dtype is None or channels < 1 or samplerate < 1:
+        return None
+    frame_size = channels * width // 8
+    return dict(format=file_format,
+                samplerate=samplerate,
+                channels=channels,
+                width=width,
+                dtype=dtype,
+                offset=data[0],
+                totalframes=max(data[1], 0) // frame_size)
+
 
 if __name__ == "__main__":
     # Run doctest from __main__ and unittest from tests
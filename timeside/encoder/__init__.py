@@ -1,9 +1,14 @@
 # -*- coding: utf-8 -*-
 
-from core import *
-from ogg import VorbisEncoder
-from wav import WavEncoder
-from mp3 import Mp3Encoder
-from flac import FlacEncoder
-from m4a import AacEncoder
-from webm import WebMEncoder
+from timeside.plugins import lazy_package
+
+lazy_package(__name__, {
+    'GstEncoder': 'core',
+    'MultiEncoder': 'core',
+    'VorbisEncoder': 'ogg',
+    'WavEncoder': 'wav',
+    'Mp3Encoder': 'mp3',
+    'FlacEncoder': 'flac',
+    'AacEncoder': 'm4a',
+    'WebMEncoder': 'webm',
+    })
@@ -21,9 +21,13 @@
 
 from timeside.core import Processor, implements, interfacedoc
 from timeside.component import implements, abstract
-from timeside.api import IEncoder
+from timeside.api import IEncoder, IProcessor
 from timeside.tools import *
 
+import re
+import time
+import threading
+
 from gst import _gst as gst
 
 
@@ -49,12 +53,18 @@ class GstEncoder(Processor):
         if not self.filename and not self.streaming:
             raise Exception('Must give an output')
 
-        import threading
+        self.init_state()
+
+    def init_state(self):
+        """Initialize the state of the encoding shared by the encoders and
+        the MultiEncoder"""
         self.end_cond = threading.Condition(threading.Lock())
 
         self.eod = False
         self.metadata = None
         self.num_samples = 0
+        # set when the encoder is a branch of a MultiEncoder
+        self.multi_encoder = None
 
     @interfacedoc
     def release(self):
@@ -69,8 +79,37 @@ class GstEncoder(Processor):
     def __del__(self):
         self.release()
 
+    def sink_pipe(self):
+        """Return the description of the sink of the encoded stream"""
+        if self.filename and self.streaming:
+            return ''' ! tee name=t
+            ! queue ! filesink location=%s
+            t. ! queue ! appsink name=app sync=False
+            ''' % self.filename
+        elif self.filename:
+            return '! filesink location=%s async=False sync=False ' % self.filename
+        else:
+            return '! queue ! appsink name=app sync=False '
+
+    def build_pipe(self, encoder_pipe, extra_pipe=''):
+        """Set the pipeline description of the encoder: the appsrc feeding the
+        encoder_pipe elements followed by the sink, and the extra_pipe
+        elements such as other sources"""
+        self.encoder_pipe = encoder_pipe
+        self.extra_pipe = extra_pipe
+        self.pipe = (extra_pipe + ' appsrc name=src ! ' + encoder_pipe +
+                     self.sink_pipe())
+
     def start_pipeline(self, channels, samplerate):
+        if self.multi_encoder is not None:
+            # the MultiEncoder runs the pipeline
+            return
+        # time in seconds spent in each stage of the setup
+        self.setup_times = {}
+        stage_start = time.time()
         self.pipeline = gst.parse_launch(self.pipe)
+        self.setup_times['pipeline'] = time.time() - stage_start
+        stage_start = time.time()
         # store a pointer to appsrc in our encoder object
         self.src = self.pipeline.get_by_name('src')
         # store a pointer to appsink in our encoder object
@@ -91,27 +130,21 @@ class GstEncoder(Processor):
         self.bus.add_signal_watch()
         self.bus.connect("message", self._on_message_cb)
 
-        import threading
-        class MainloopThread(threading.Thread):
-            def __init__(self, mainloop):
-                threading.Thread.__init__(self)
-                self.mainloop = mainloop
-
-            def run(self):
-                self.mainloop.run()
-        self.mainloop = gobject.MainLoop()
-        self.mainloopthread = MainloopThread(self.mainloop)
-        self.mainloopthread.start()
+        # the bus messages are dispatched by the mainloop thread shared by
+        # all the decoders and encoders
+        self.mainloopthread = get_loop_thread()
+        self.mainloop = self.mainloopthread.mainloop
 
         # start pipeline
         self.pipeline.set_state(gst.STATE_PLAYING)
+        self.setup_times['start'] = time.time() - stage_start
 
     def _on_message_cb(self, bus, message):
         t = message.type
         if t == gst.MESSAGE_EOS:
             self.end_cond.acquire()
             self.pipeline.set_state(gst.STATE_NULL)
-            self.mainloop.quit()
+            self.bus.remove_signal_watch()
             self.end_reached = True
             self.end_cond.notify()
             self.end_cond.release()
@@ -119,7 +152,7 @@ class GstEncoder(Processor):
         elif t == gst.MESSAGE_ERROR:
             self.end_cond.acquire()
             self.pipeline.set_state(gst.STATE_NULL)
-            self.mainloop.quit()
+            self.bus.remove_signal_watch()
             self.end_reached = True
             err, debug = message.parse_error()
             self.error_msg = "Error: %s" % err, debug
@@ -142,6 +175,75 @@ class GstEncoder(Processor):
         return frames, eod
 
 
+class MultiEncoder(GstEncoder):
+    """ Encode the stream to several files at once, through a single
+    gstreamer pipeline where the appsrc feeds a tee and each branch of the
+    tee runs the encoding elements of one of the encoders. The frames are
+    pushed once and the branches encode in parallel. """
+    implements(IProcessor)
+
+    def __init__(self, encoders):
+        """
+        Construct a new MultiEncoder
+
+        Parameters
+        ----------
+        encoders : list of GstEncoder
+            encoders writing to a file, their setup() only builds their
+            part of the pipeline
+        """
+        super(GstEncoder, self).__init__()
+
+        for encoder in encoders:
+            if not encoder.filename or encoder.streaming:
+                raise ValueError("MultiEncoder only handles encoders writing to a file")
+            encoder.multi_encoder = self
+        self.encoders = encoders
+        self.filename = None
+        self.streaming = False
+
+        self.init_state()
+
+    @staticmethod
+    @interfacedoc
+    def id():
+        return "gst_multi_enc"
+
+    @interfacedoc
+    def setup(self, channels=None, samplerate=None, blocksize=None, totalframes=None):
+        super(MultiEncoder, self).setup(channels, samplerate, blocksize, totalframes)
+
+        self.pipe = 'appsrc name=src ! tee name=tee '
+        for index, encoder in enumerate(self.encoders):
+            encoder.source_mediainfo = self.source_mediainfo
+            encoder.setup(channels, samplerate, blocksize, totalframes)
+            # the elements named by several encoders, such as their muxer,
+            # are made unique to their branch
+            branch_pipe = _rename_elements(
+                encoder.extra_pipe + ' tee. ! queue ! ' + encoder.encoder_pipe,
+                '_%d' % index)
+            self.pipe += branch_pipe + encoder.sink_pipe()
+
+        self.start_pipeline(channels, samplerate)
+
+    @interfacedoc
+    def process(self, frames, eod=False):
+        frames, eod = super(MultiEncoder, self).process(frames, eod)
+        for encoder in self.encoders:
+            encoder.num_samples = self.num_samples
+        return frames, eod
+
+
+def _rename_elements(pipe, suffix):
+    """Append suffix to the names of the elements of a pipeline description
+    and to the references to these elements"""
+    for name in set(re.findall(r'\bname=(\w+)', pipe)):
+        pipe = re.sub(r'\bname=%s\b' % name, 'name=' + name + suffix, pipe)
+        pipe = re.sub(r'(^|\s)%s\.' % name, r'\g<1>' + name + suffix + '.',
+                      pipe)
+    return pipe
+
+
 if __name__ == "__main__":
     # Run doctest from __main__ and unittest from test_analyzer_preprocessors
     from tests import test_encoding, test_transcoding
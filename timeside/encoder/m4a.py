@@ -39,22 +39,10 @@ class AacEncoder(GstEncoder):
         super(AacEncoder, self).setup(channels, samplerate, blocksize, totalframes)
 
         self.streaming = False
-        self.pipe = ''' appsrc name=src
-            ! audioconvert
+        self.build_pipe('''audioconvert
             ! voaacenc
             ! mp4mux
-            '''
-
-        if self.filename and self.streaming:
-            self.pipe += ''' ! tee name=t
-            ! queue ! filesink location=%s
-            t. ! queue ! appsink name=app sync=False
-            ''' % self.filename
-
-        elif self.filename :
-            self.pipe += '! filesink location=%s async=False sync=False ' % self.filename
-        else:
-            self.pipe += '! queue ! appsink name=app sync=False '
+            ''')
 
         self.start_pipeline(channels, samplerate)
 
@@ -39,23 +39,11 @@ class Mp3Encoder(GstEncoder):
     def setup(self, channels=None, samplerate=None, blocksize=None, totalframes=None):
         super(Mp3Encoder, self).setup(channels, samplerate, blocksize, totalframes)
 
-        self.pipe = '''appsrc name=src
-                  ! audioconvert
+        self.build_pipe('''audioconvert
                   ! lamemp3enc target=quality quality=2 encoding-engine-quality=standard
                   ! xingmux
                   ! id3v2mux
-                  '''
-
-        if self.filename and self.streaming:
-            self.pipe += ''' ! tee name=t
-            ! queue ! filesink location=%s
-            t. ! queue ! appsink name=app sync=False
-            ''' % self.filename
-
-        elif self.filename :
-            self.pipe += '! filesink location=%s async=False sync=False ' % self.filename
-        else:
-            self.pipe += '! queue ! appsink name=app sync=False '
+                  ''')
 
         self.start_pipeline(channels, samplerate)
 
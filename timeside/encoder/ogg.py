@@ -31,22 +31,10 @@ class VorbisEncoder(GstEncoder):
     @interfacedoc
     def setup(self, channels=None, samplerate=None, blocksize=None, totalframes=None):
         super(VorbisEncoder, self).setup(channels, samplerate, blocksize, totalframes)
-        self.pipe = ''' appsrc name=src
-                  ! audioconvert
+        self.build_pipe('''audioconvert
                   ! vorbisenc quality=0.9
                   ! oggmux
-                  '''
-
-        if self.filename and self.streaming:
-            self.pipe += ''' ! tee name=t
-            ! queue ! filesink location=%s
-            t. ! queue ! appsink name=app sync=False
-            ''' % self.filename
-
-        elif self.filename :
-            self.pipe += '! filesink location=%s async=False sync=False ' % self.filename
-        else:
-            self.pipe += '! queue ! appsink name=app sync=False '
+                  ''')
 
         self.start_pipeline(channels, samplerate)
 
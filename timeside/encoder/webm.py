@@ -42,24 +42,13 @@ class WebMEncoder(GstEncoder):
         framerate = 30
         num_buffers = ceil(self.mediainfo()['duration'] *
                            framerate).astype(int)
-        self.pipe = ''
+        video_pipe = ''
         if self.video:
-            self.pipe += '''videotestsrc pattern=black num_buffers=%d ! ffmpegcolorspace ! queue ! vp8enc speed=2 threads=4 quality=9.0 ! queue ! mux.
+            video_pipe = '''videotestsrc pattern=black num_buffers=%d ! ffmpegcolorspace ! queue ! vp8enc speed=2 threads=4 quality=9.0 ! queue ! mux.
                          ''' % num_buffers
-        self.pipe += '''
-              appsrc name=src ! queue ! audioconvert ! vorbisenc quality=0.9 ! queue ! mux.
+        self.build_pipe('''queue ! audioconvert ! vorbisenc quality=0.9 ! queue ! mux.
               webmmux streamable=true name=mux
-                  '''
-        if self.filename and self.streaming:
-            self.pipe += ''' ! tee name=t
-            ! queue ! filesink location=%s
-            t. ! queue ! appsink name=app sync=False
-            ''' % self.filename
-
-        elif self.filename:
-            self.pipe += '! filesink location=%s async=False sync=False ' % self.filename
-        else:
-            self.pipe += '! queue ! appsink name=app sync=False '
+                  ''', video_pipe)
 
         self.start_pipeline(channels, samplerate)
 
@@ -1,8 +1,15 @@
 # -*- coding: utf-8 -*-
 
-from waveform_simple import *
-from waveform_centroid import *
-from waveform_transparent import *
-from waveform_contour import *
-from spectrogram_log import *
-from spectrogram_lin import *
+from timeside.plugins import lazy_package
+
+lazy_package(__name__, {
+    'Waveform': 'waveform_simple',
+    'WaveformCentroid': 'waveform_centroid',
+    'WaveformTransparent': 'waveform_transparent',
+    'WaveformContourBlack': 'waveform_contour',
+    'WaveformContourWhite': 'waveform_contour',
+    'SpectrogramLog': 'spectrogram_log',
+    'SpectrogramLinear': 'spectrogram_lin',
+    'SpectrogramTilesLog': 'spectrogram_tiles',
+    'SpectrogramTilesLinear': 'spectrogram_tiles',
+    })
@@ -53,6 +53,7 @@ class Spectrum(object):
         self.samplerate = samplerate
         self.window_function = window_function
         self.window = self.window_function(self.blocksize)
+        self.stft = None
         # Hanning window by default
         if self.window_function:
             self.window = self.window_function(self.blocksize)
@@ -61,29 +62,33 @@ class Spectrum(object):
             self.window = self.window_function(self.blocksize)
 
 
+    def share(self, processor, blocksize):
+        """Get the FFT of the blocksize-long frames from the STFT shared by the
+        processors of the pipe"""
+        while blocksize > self.fft_size:
+            self.fft_size = 2 * self.fft_size
+        self.stft = processor.shared_stft(blocksize, blocksize,
+                                          window=self.window_function.__name__,
+                                          fft_size=self.fft_size, channel=0)
+
     def process(self, frames, eod, spec_range=120.0):
         """ Returns a tuple containing the spectral centroid and the spectrum (dB scales) of the input audio frames.
         FFT window sizes are adatable to the input frame size."""
 
         samples = frames[:,0]
         nsamples = len(frames[:,0])
-        if nsamples != self.blocksize:
-            self.window = self.window_function(nsamples)
-        samples *= self.window
-
-        while nsamples > self.fft_size:
-            self.fft_size = 2 * self.fft_size
 
-        zeros_p = numpy.zeros(self.fft_size/2-int(nsamples/2))
-        if nsamples % 2:
-            zeros_n = numpy.zeros(self.fft_size/2-int(nsamples/2)-1)
+        if self.stft is not None:
+            fft = self.stft.process(samples).fft
         else:
-            zeros_n = numpy.zeros(self.fft_size/2-int(nsamples/2))
-        samples = numpy.concatenate((zeros_p, samples, zeros_n), axis=0)
+            if nsamples != self.blocksize:
+                self.window = self.window_function(nsamples)
+            while nsamples > self.fft_size:
+                self.fft_size = 2 * self.fft_size
+            fft = numpy.fft.rfft(samples * self.window, self.fft_size)
 
-        fft = numpy.fft.fft(samples)
         # normalized abs(FFT) between 0 and 1
-        spectrum = numpy.abs(fft[:fft.shape[0] / 2 + 1]) / float(nsamples)
+        spectrum = numpy.abs(fft) / float(nsamples)
         length = numpy.float64(spectrum.shape[0])
 
         # scale the db spectrum from [- spec_range db ... 0 db] > [0..1]
@@ -125,7 +130,6 @@ class Grapher(Processor):
         self.image_height = height
         self.bg_color = bg_color
         self.color_scheme = color_scheme
-        self.previous_x, self.previous_y = None, None
 
     @staticmethod
     def id():
@@ -154,6 +158,9 @@ class Grapher(Processor):
                                  self.lower_freq, self.higher_freq, numpy.hanning)
         self.pixel = self.image.load()
         self.draw = ImageDraw.Draw(self.image)
+        # peaks and colors of the pixel columns, drawn at once
+        self.peaks = numpy.zeros((self.image_width, 2))
+        self.peaks_colors = numpy.zeros((self.image_width, 3), dtype=numpy.uint8)
 
     @interfacedoc
     def render(self, output=None):
@@ -165,62 +172,68 @@ class Grapher(Processor):
     def watermark(self, text, font=None, color=(255, 255, 255), opacity=.6, margin=(5,5)):
         self.image = im_watermark(self.image, text, color=color, opacity=opacity, margin=margin)
 
-    def draw_peaks(self, x, peaks, line_color):
-        """Draw 2 peaks at x"""
+    def store_peaks(self, columns, colors=None):
+        """Store the peaks of the next pixel columns, given as a list of sample
+        arrays, and their colors"""
 
-        y1 = self.image_height * 0.5 - peaks[0] * (self.image_height - 4) * 0.5
-        y2 = self.image_height * 0.5 - peaks[1] * (self.image_height - 4) * 0.5
-
-        if self.previous_y:
-            self.draw.line([self.previous_x, self.previous_y, x, y1, x, y2], line_color)
+        count = min(len(columns), self.image_width - self.pixel_cursor)
+        if count <= 0:
+            return
+        columns = columns[:count]
+        x = self.pixel_cursor
+        if all(len(column) == len(columns[0]) for column in columns):
+            self.peaks[x:x + count] = column_peaks(numpy.array(columns))
         else:
-            self.draw.line([x, y1, x, y2], line_color)
+            self.peaks[x:x + count] = [peaks(column) for column in columns]
+        if colors is not None:
+            self.peaks_colors[x:x + count] = colors[:count]
+        self.pixel_cursor += count
 
-        self.draw_anti_aliased_pixels(x, y1, y2, line_color)
-        self.previous_x, self.previous_y = x, y2
+    def peaks_to_y(self):
+        """y-coordinates of the stored peaks"""
 
-    def draw_peaks_inverted(self, x, peaks, line_color):
-        """Draw 2 inverted peaks at x"""
+        peaks = self.peaks[:self.pixel_cursor]
+        return self.image_height * 0.5 - peaks * (self.image_height - 4) * 0.5
 
-        y1 = self.image_height * 0.5 - peaks[0] * (self.image_height - 4) * 0.5
-        y2 = self.image_height * 0.5 - peaks[1] * (self.image_height - 4) * 0.5
+    def begin_drawing(self):
+        """Return the image as an RGBA numpy array to draw into"""
+        return numpy.array(self.image.convert('RGBA'))
 
-        if self.previous_y and x < self.image_width-1:
-            if y1 < y2:
-                self.draw.line((x, 0, x, y1), line_color)
-                self.draw.line((x, self.image_height , x, y2), line_color)
-            else:
-                self.draw.line((x, 0, x, y2), line_color)
-                self.draw.line((x, self.image_height , x, y1), line_color)
-        else:
-            self.draw.line((x, 0, x, self.image_height), line_color)
-        self.draw_anti_aliased_pixels(x, y1, y2, line_color)
-        self.previous_x, self.previous_y = x, y1
-
-    def draw_anti_aliased_pixels(self, x, y1, y2, color):
-        """ vertical anti-aliasing at y1 and y2 """
-
-        y_max = max(y1, y2)
-        y_max_int = int(y_max)
-        alpha = y_max - y_max_int
-
-        if alpha > 0.0 and alpha < 1.0 and y_max_int + 1 < self.image_height:
-            current_pix = self.pixel[int(x), y_max_int + 1]
-            r = int((1-alpha)*current_pix[0] + alpha*color[0])
-            g = int((1-alpha)*current_pix[1] + alpha*color[1])
-            b = int((1-alpha)*current_pix[2] + alpha*color[2])
-            self.pixel[x, y_max_int + 1] = (r,g,b)
-
-        y_min = min(y1, y2)
-        y_min_int = int(y_min)
-        alpha = 1.0 - (y_min - y_min_int)
-
-        if alpha > 0.0 and alpha < 1.0 and y_min_int - 1 >= 0:
-            current_pix = self.pixel[x, y_min_int - 1]
-            r = int((1-alpha)*current_pix[0] + alpha*color[0])
-            g = int((1-alpha)*current_pix[1] + alpha*color[1])
-            b = int((1-alpha)*current_pix[2] + alpha*color[2])
-            self.pixel[x, y_min_int - 1] = (r,g,b)
+    def end_drawing(self, data):
+        """Set the image from the RGBA numpy array data"""
+        # fromarray shares the read-only memory of data
+        self.image = Image.fromarray(data, 'RGBA').copy()
+        self.pixel = self.image.load()
+        self.draw = ImageDraw.Draw(self.image)
+
+    def draw_peaks(self, line_color=None):
+        """Draw the stored peaks as a line going through the peaks of each
+        column, with the stored colors if line_color is None"""
+
+        if not self.pixel_cursor:
+            return
+        y = self.peaks_to_y()
+        top, bottom = polyline_spans(y[:, 0], y[:, 1])
+        if line_color is None:
+            line_color = self.peaks_colors[:self.pixel_cursor]
+        data = self.begin_drawing()
+        fill_columns(data, 0, top, bottom, line_color)
+        self.end_drawing(data)
+
+    def draw_peaks_inverted(self, line_color=None):
+        """Draw the outside of the stored peaks"""
+
+        if not self.pixel_cursor:
+            return
+        y = self.peaks_to_y()
+        top, bottom = y.min(axis=1), y.max(axis=1)
+        if line_color is None:
+            line_color = self.peaks_colors[:self.pixel_cursor]
+        data = self.begin_drawing()
+        fill_columns(data, 0, numpy.zeros(len(y)), top, line_color)
+        fill_columns(data, 0, bottom, numpy.ones(len(y)) * (self.image_height - 1),
+                     line_color)
+        self.end_drawing(data)
 
     def draw_peaks_contour(self):
         contour = self.contour.copy()
@@ -242,9 +255,9 @@ class Grapher(Processor):
             height = self.image_height
 
         # Multicurve rotating
+        data = self.begin_drawing()
+        x = numpy.asarray(self.x, dtype=int)
         for i in range(0,self.ndiv):
-            self.previous_x, self.previous_y = None, None
-
             bright_color = int(255*(1-float(i)/(self.ndiv*2)))
             bright_color = 255-bright_color+self.color_offset
             #line_color = self.color_lookup[int(self.centroids[j]*255.0)]
@@ -262,24 +275,15 @@ class Grapher(Processor):
             curve = (height-1)*contour
             #curve = contour*(height-2)/2+height/2
 
-            for x in self.x:
-                x = int(x)
-                y = curve[x]
-                if not x == 0:
-                    if not self.symetry:
-                        self.draw.line([self.previous_x, self.previous_y, x, y], line_color)
-                        self.draw_anti_aliased_pixels(x, y, y, line_color)
-                    else:
-                        self.draw.line([self.previous_x, self.previous_y+height, x, y+height], line_color)
-                        self.draw_anti_aliased_pixels(x, y+height, y+height, line_color)
-                        self.draw.line([self.previous_x, -self.previous_y+height, x, -y+height], line_color)
-                        self.draw_anti_aliased_pixels(x, -y+height, -y+height, line_color)
-                else:
-                    if not self.symetry:
-                        self.draw.point((x, y), line_color)
-                    else:
-                        self.draw.point((x, y+height), line_color)
-                self.previous_x, self.previous_y = x, y
+            y = curve[x]
+            if not self.symetry:
+                curves = [y]
+            else:
+                curves = [y+height, -y+height]
+            for y in curves:
+                top, bottom = polyline_spans(y, y)
+                fill_columns(data, x[0], top, bottom, line_color)
+        self.end_drawing(data)
 
 
 
@@ -49,16 +49,8 @@ class SpectrogramLinear(SpectrogramLog):
     def setup(self, channels=None, samplerate=None, blocksize=None, totalframes=None):
         super(SpectrogramLinear, self).setup(channels, samplerate, blocksize, totalframes)
 
-    def set_scale(self):
-        """generate the lookup which translates y-coordinate to fft-bin"""
+    def scale(self):
+        """frequency of each y-coordinate"""
 
-        f_min = float(self.lower_freq)
-        f_max = float(self.higher_freq)
-        y_min = f_min
-        y_max = f_max
-        for y in range(self.image_height):
-            freq = y_min + y / (self.image_height - 1.0) *(y_max - y_min)
-            fft_bin = freq / f_max * (self.fft_size/2 + 1)
-            if fft_bin < self.fft_size/2:
-                alpha = fft_bin - int(fft_bin)
-                self.y_to_bin.append((int(fft_bin), alpha * 255))
+        y = numpy.arange(self.image_height)
+        return self.lower_freq + y / (self.image_height - 1.0) * (self.higher_freq - self.lower_freq)
@@ -35,8 +35,6 @@ class SpectrogramLog(Grapher):
         super(SpectrogramLog, self).__init__(width, height, bg_color, color_scheme)
         self.lower_freq = 100
         self.colors = default_color_schemes[color_scheme]['spectrogram']
-        self.pixels = []
-        self.y_to_bin = []
 
     @staticmethod
     @interfacedoc
@@ -51,46 +49,59 @@ class SpectrogramLog(Grapher):
     @interfacedoc
     def setup(self, channels=None, samplerate=None, blocksize=None, totalframes=None):
         super(SpectrogramLog, self).setup(channels, samplerate, blocksize, totalframes)
-        self.image = self.image.convert("P")
-        self.image = self.image.transpose(Image.ROTATE_90)
-        self.image.putpalette(interpolate_colors(self.colors, True))
+        self.spectrum.share(self, self.buffer_size)
+        # one row of palette indexes per pixel column
+        self.pixels = numpy.zeros((self.image_width, self.image_height), dtype=numpy.uint8)
         self.set_scale()
 
+    def scale(self):
+        """frequency of each y-coordinate"""
+
+        y_min = math.log10(self.lower_freq)
+        y_max = math.log10(self.higher_freq)
+        y = numpy.arange(self.image_height)
+        return 10.0 ** (y_min + y / (self.image_height - 1.0) * (y_max - y_min))
+
     def set_scale(self):
         """generate the lookup which translates y-coordinate to fft-bin"""
 
-        f_min = float(self.lower_freq)
-        f_max = float(self.higher_freq)
-        y_min = math.log10(f_min)
-        y_max = math.log10(f_max)
-        for y in range(self.image_height):
-            freq = math.pow(10.0, y_min + y / (self.image_height - 1.0) *(y_max - y_min))
-            fft_bin = freq / f_max * (self.fft_size/2 + 1)
-            if fft_bin < self.fft_size/2:
-                alpha = fft_bin - int(fft_bin)
-                self.y_to_bin.append((int(fft_bin), alpha * 255))
-
-    def draw_spectrum(self, x, spectrum):
-        for (index, alpha) in self.y_to_bin:
-            self.pixels.append( int( ((255.0-alpha) * spectrum[index] + alpha * spectrum[index + 1] )) )
-        for y in range(len(self.y_to_bin), self.image_height):
-            self.pixels.append(0)
+        fft_bins = self.scale() / float(self.higher_freq) * (self.fft_size/2 + 1)
+        fft_bins = fft_bins[fft_bins < self.fft_size/2]
+        # each pixel interpolates 2 consecutive bins
+        self.bin_index = fft_bins.astype(int)
+        self.bin_weight = (fft_bins - self.bin_index) * 255
+
+    def spectrum_pixels(self, spectra):
+        """palette indexes of the y-coordinates of each of the spectra"""
+
+        spectra = numpy.asarray(spectra)
+        return ((255.0 - self.bin_weight) * spectra[:, self.bin_index] +
+                self.bin_weight * spectra[:, self.bin_index + 1])
+
+    def draw_spectrum(self, x, spectra):
+        """draw the columns of spectra starting at x"""
+
+        values = self.spectrum_pixels(spectra)
+        self.pixels[x:x + len(values), :len(self.bin_index)] = values
 
     @interfacedoc
     def process(self, frames, eod=False):
         if len(frames) != 1:
             chunk = frames[:,0].copy()
             chunk.shape = (len(chunk),1)
+            spectra = []
             for samples, end in self.pixels_adapter.process(chunk, eod):
-                if self.pixel_cursor < self.image_width:
+                if self.pixel_cursor + len(spectra) < self.image_width:
                     (spectral_centroid, db_spectrum) = self.spectrum.process(samples, True)
-                    self.draw_spectrum(self.pixel_cursor, db_spectrum)
-                    self.pixel_cursor += 1
+                    spectra.append(db_spectrum)
+            if spectra:
+                self.draw_spectrum(self.pixel_cursor, spectra)
+                self.pixel_cursor += len(spectra)
         return frames, eod
 
     @interfacedoc
     def post_process(self):
         """ Apply last 2D transforms"""
-        self.image.putdata(self.pixels)
-        self.image = self.image.transpose(Image.ROTATE_90)
-
+        # lowest frequencies at the bottom of the image
+        self.image = Image.fromarray(self.pixels.T[::-1].copy(), 'P')
+        self.image.putpalette(interpolate_colors(self.colors, True))
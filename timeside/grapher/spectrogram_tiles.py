@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2013 Parisson SARL
+
+# This file is part of TimeSide.
+
+# TimeSide is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+
+# TimeSide is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with TimeSide.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import simplejson as json
+import tempfile
+
+from timeside.core import implements, interfacedoc
+from timeside.api import IGrapher
+from timeside.grapher.core import *
+from timeside.grapher.spectrogram_log import SpectrogramLog
+from timeside.grapher.spectrogram_lin import SpectrogramLinear
+
+
+class TileLevel(object):
+    """ Columns of one level of a tile pyramid, waiting for their tile to
+    be complete """
+
+    def __init__(self, index, tile_size, height):
+        self.index = index
+        self.columns = numpy.zeros((tile_size, height), dtype='float32')
+        self.fill = 0
+        # number of columns received and of tiles saved
+        self.width = 0
+        self.tiles = 0
+        # last column of an odd count, waiting for its pair
+        self.pending = None
+
+
+class SpectrogramTilesLog(SpectrogramLog):
+    """ Builds a pyramid of fixed size spectrogram tiles and a JSON manifest.
+    The level 0 has samples_per_pixel frames per column and each following
+    level halves the time resolution. Tiles are saved as soon as they are
+    complete, so that the memory used only depends on the tile size."""
+
+    implements(IGrapher)
+
+    scale_name = 'log'
+
+    @interfacedoc
+    def __init__(self, output=None, samples_per_pixel=256, height=256,
+                 tile_size=256, format='png', bg_color=(0,0,0),
+                 color_scheme='default'):
+        super(SpectrogramTilesLog, self).__init__(tile_size, height, bg_color,
+                                                  color_scheme)
+        self.output = output
+        self.samples_per_pixel = samples_per_pixel
+        self.tile_size = tile_size
+        self.format = format
+        self.manifest = None
+
+    @staticmethod
+    @interfacedoc
+    def id():
+        return "spectrogram_tiles_log"
+
+    @staticmethod
+    @interfacedoc
+    def name():
+        return "Spectrogram tiles"
+
+    @interfacedoc
+    def setup(self, channels=None, samplerate=None, blocksize=None, totalframes=None):
+        # The width of the pyramid follows the stream, so skip the setup of
+        # the fixed size image
+        super(Grapher, self).setup(channels, samplerate, blocksize, totalframes)
+        self.sample_rate = samplerate
+        self.higher_freq = self.sample_rate/2
+        self.buffer_size = self.samples_per_pixel
+        self.pixels_adapter = FixedSizeInputAdapter(self.buffer_size, 1, pad=False)
+        self.spectrum = Spectrum(self.fft_size, self.sample_rate, blocksize, totalframes,
+                                 self.lower_freq, self.higher_freq, numpy.hanning)
+        self.spectrum.share(self, self.buffer_size)
+        self.set_scale()
+        self.palette = interpolate_colors(self.colors, True)
+        if not self.output:
+            self.output = tempfile.mkdtemp()
+        self.levels = []
+        self.nb_frames = 0
+
+    def save_tile(self, level):
+        """save the columns of the level as its next column of tiles"""
+
+        pixels = level.columns[:level.fill].astype(numpy.uint8)
+        image = Image.fromarray(pixels.T[::-1].copy(), 'P')
+        image.putpalette(self.palette)
+        if self.format != 'png':
+            image = image.convert('RGB')
+        directory = os.path.join(self.output, str(level.index))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        for row, top in enumerate(range(0, self.image_height, self.tile_size)):
+            bottom = min(top + self.tile_size, self.image_height)
+            tile = image.crop((0, top, level.fill, bottom))
+            tile.save(os.path.join(directory, '%d_%d.%s' % (level.tiles, row, self.format)))
+        level.tiles += 1
+        level.fill = 0
+
+    def add_columns(self, index, columns):
+        """add columns to a level and their averaged pairs to the next one"""
+
+        if index == len(self.levels):
+            self.levels.append(TileLevel(index, self.tile_size, self.image_height))
+        level = self.levels[index]
+        level.width += len(columns)
+
+        start = 0
+        while start < len(columns):
+            count = min(len(columns) - start, self.tile_size - level.fill)
+            level.columns[level.fill:level.fill + count] = columns[start:start + count]
+            level.fill += count
+            start += count
+            if level.fill == self.tile_size:
+                self.save_tile(level)
+
+        if level.pending is not None:
+            columns = numpy.concatenate([level.pending[numpy.newaxis], columns])
+        nb_pairs = len(columns) // 2
+        level.pending = columns[-1].copy() if len(columns) % 2 else None
+        if nb_pairs:
+            pairs = columns[:2 * nb_pairs]
+            self.add_columns(index + 1, (pairs[0::2] + pairs[1::2]) / 2)
+
+    @interfacedoc
+    def process(self, frames, eod=False):
+        self.nb_frames += len(frames)
+        if len(frames) != 1:
+            chunk = frames[:,0].copy()
+            chunk.shape = (len(chunk),1)
+            spectra = [self.spectrum.process(samples, True)[1]
+                       for samples, end in self.pixels_adapter.process(chunk, eod)]
+            if spectra:
+                columns = numpy.zeros((len(spectra), self.image_height), dtype='float32')
+                columns[:, :len(self.bin_index)] = self.spectrum_pixels(spectra)
+                self.add_columns(0, columns)
+        return frames, eod
+
+    @interfacedoc
+    def post_process(self):
+        """ Save the last tiles, down to the first level fitting in a tile,
+        and write the manifest"""
+        index = 0
+        while index < len(self.levels):
+            level = self.levels[index]
+            if level.fill:
+                self.save_tile(level)
+            if level.width <= self.tile_size:
+                break
+            if level.pending is not None:
+                self.add_columns(index + 1, level.pending[numpy.newaxis])
+                level.pending = None
+            index += 1
+        del self.levels[index + 1:]
+
+        self.manifest = {
+            'version': 1,
+            'tile_size': self.tile_size,
+            'height': self.image_height,
+            'format': self.format,
+            'tiles': '{level}/{column}_{row}.' + self.format,
+            'scale': self.scale_name,
+            'lower_freq': self.lower_freq,
+            'higher_freq': self.higher_freq,
+            'samplerate': self.sample_rate,
+            'totalframes': self.nb_frames,
+            'levels': [{'samples_per_pixel': self.samples_per_pixel << level.index,
+                        'width': level.width,
+                        'columns': level.tiles} for level in self.levels],
+            }
+        f = open(os.path.join(self.output, 'manifest.json'), 'w')
+        json.dump(self.manifest, f, indent=1)
+        f.close()
+
+    @interfacedoc
+    def render(self, output=None):
+        """Return the manifest of the tiles and write it to the output if
+        specified"""
+        if output:
+            f = open(output, 'w')
+            json.dump(self.manifest, f, indent=1)
+            f.close()
+            return
+        return self.manifest
+
+
+class SpectrogramTilesLinear(SpectrogramTilesLog, SpectrogramLinear):
+    """ Builds a pyramid of spectrogram tiles with a linear frequency scale,
+    the scale of SpectrogramLinear."""
+
+    implements(IGrapher)
+
+    scale_name = 'linear'
+
+    @staticmethod
+    @interfacedoc
+    def id():
+        return "spectrogram_tiles_lin"
+
+    @staticmethod
+    @interfacedoc
+    def name():
+        return "Spectrogram tiles linear"
@@ -187,6 +187,72 @@ def peaks(samples):
         return (max_value, min_value)
 
 
+def column_peaks(columns):
+    """ Vectorized peaks() over the rows of a 2D array of samples.
+    Returns an array of shape (len(columns), 2) holding the peaks of each row
+    in the order they were found. """
+    rows = numpy.arange(len(columns))
+    max_index = numpy.argmax(columns, axis=1)
+    min_index = numpy.argmin(columns, axis=1)
+    max_value = columns[rows, max_index]
+    min_value = columns[rows, min_index]
+    min_first = min_index < max_index
+    return numpy.array([numpy.where(min_first, min_value, max_value),
+                        numpy.where(min_first, max_value, min_value)]).T
+
+
+def polyline_spans(first, last):
+    """ Vertical span covered in each column by a polyline going through
+    (x, first[x]) then (x, last[x]) for each column x: each column holds its
+    own points and half of the segments joining it to its neighbours.
+    Returns the (top, bottom) arrays of the spans. """
+    top = numpy.minimum(first, last)
+    bottom = numpy.maximum(first, last)
+    middle = (last[:-1] + first[1:]) * 0.5
+    for span, extend in ((top, numpy.minimum), (bottom, numpy.maximum)):
+        span[1:] = extend(span[1:], middle)
+        span[:-1] = extend(span[:-1], middle)
+    return top, bottom
+
+
+def fill_columns(data, x, top, bottom, colors):
+    """ Fill the columns of the RGBA array data starting at x between the rows
+    top and bottom with colors, an (r,g,b) tuple or an array of one color per
+    column. The pixels right above and below each span are blended with the
+    color according to the fractional part of top and bottom. """
+    height = data.shape[0]
+    top = numpy.asarray(top, dtype=float)
+    bottom = numpy.asarray(bottom, dtype=float)
+    count = len(top)
+    region = data[:, x:x + count]
+
+    rgba = numpy.empty((count, 4))
+    rgba[:, :3] = numpy.clip(numpy.broadcast_to(numpy.asarray(colors), (count, 3)), 0, 255)
+    rgba[:, 3] = 255
+
+    top_int = numpy.floor(top).astype(int)
+    bottom_int = numpy.floor(bottom).astype(int)
+    if count:
+        # fill whole pixels at once through a 32-bit view of the RGBA data
+        pixels = data.view(numpy.uint32)[:, x:x + count, 0]
+        pixel_colors = rgba.astype(numpy.uint8).view(numpy.uint32)[:, 0]
+        low = max(top_int.min(), 0)
+        high = min(bottom_int.max() + 1, height)
+        rows = numpy.arange(low, high)[:, numpy.newaxis]
+        mask = (rows >= top_int) & (rows <= bottom_int)
+        numpy.copyto(pixels[low:high], pixel_colors, where=mask)
+
+    # vertical anti-aliasing
+    columns = numpy.arange(count)
+    for rows, alpha in ((bottom_int + 1, bottom - bottom_int),
+                        (top_int - 1, 1.0 - (top - top_int))):
+        valid = (alpha > 0.0) & (alpha < 1.0) & (rows >= 0) & (rows < height)
+        rows, cols = rows[valid], columns[valid]
+        alpha = alpha[valid, numpy.newaxis]
+        current = region[rows, cols]
+        region[rows, cols] = (1 - alpha) * current + alpha * rgba[cols]
+
+
 def color_from_value(self, value):
     """ given a value between 0 and 1, return an (r,g,b) tuple """
     return ImageColor.getrgb("hsl(%d,%d%%,%d%%)" % (int( (1.0 - value) * 360 ), 80, 50))
@@ -37,6 +37,8 @@ class WaveformCentroid(Waveform):
         self.lower_freq = 200
         colors = default_color_schemes[color_scheme]['waveform']
         self.color_lookup = interpolate_colors(colors)
+        # peaks are colored by the centroid of each pixel column
+        self.line_color = None
 
     @staticmethod
     @interfacedoc
@@ -51,16 +53,18 @@ class WaveformCentroid(Waveform):
     @interfacedoc
     def setup(self, channels=None, samplerate=None, blocksize=None, totalframes=None):
         super(WaveformCentroid, self).setup(channels, samplerate, blocksize, totalframes)
+        self.spectrum.share(self, self.buffer_size)
 
     @interfacedoc
     def process(self, frames, eod=False):
         if len(frames) != 1:
             buffer = frames[:,0].copy()
             buffer.shape = (len(buffer),1)
+            columns, colors = [], []
             for samples, end in self.pixels_adapter.process(buffer, eod):
-                if self.pixel_cursor < self.image_width:
+                if self.pixel_cursor + len(columns) < self.image_width:
                     (spectral_centroid, db_spectrum) = self.spectrum.process(samples, True)
-                    line_color = self.color_lookup[int(spectral_centroid*255.0)]
-                    self.draw_peaks(self.pixel_cursor, peaks(samples), line_color)
-                    self.pixel_cursor += 1
+                    colors.append(self.color_lookup[int(spectral_centroid*255.0)])
+                    columns.append(samples[:,0].copy())
+            self.store_peaks(columns, colors)
         return frames, eod
@@ -59,14 +59,15 @@ class WaveformContourBlack(Waveform):
         if len(frames) != 1:
             buffer = frames[:,0].copy()
             buffer.shape = (len(buffer),1)
-            for samples, end in self.pixels_adapter.process(buffer, eod):
-                if self.pixel_cursor < self.image_width:
-                    self.contour[self.pixel_cursor] = numpy.max(peaks(samples))
-                    self.pixel_cursor += 1
-        if eod:
-            self.draw_peaks_contour()
+            self.store_peaks([samples[:,0].copy() for samples, end
+                              in self.pixels_adapter.process(buffer, eod)])
         return frames, eod
 
+    def draw_waveform(self):
+        """Draw the contour of all the pixel columns"""
+        self.contour = self.peaks.max(axis=1)
+        self.draw_peaks_contour()
+
 
 
 class WaveformContourWhite(WaveformContourBlack):
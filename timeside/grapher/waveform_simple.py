@@ -54,17 +54,17 @@ class Waveform(Grapher):
         if len(frames) != 1:
             buffer = frames[:,0]
             buffer.shape = (len(buffer),1)
-            for samples, end in self.pixels_adapter.process(buffer, eod):
-                if self.pixel_cursor < self.image_width-1:
-                    self.draw_peaks(self.pixel_cursor, peaks(samples), self.line_color)
-                    self.pixel_cursor += 1
-            if self.pixel_cursor == self.image_width-1:
-                self.draw_peaks(self.pixel_cursor, peaks(samples), self.line_color)
-                self.pixel_cursor += 1
+            self.store_peaks([samples[:,0].copy() for samples, end
+                              in self.pixels_adapter.process(buffer, eod)])
         return frames, eod
 
+    def draw_waveform(self):
+        """Draw the stored peaks of all the pixel columns"""
+        self.draw_peaks(self.line_color)
+
     @interfacedoc
     def post_process(self, output=None):
+        self.draw_waveform()
         a = 1
         for x in range(self.image_width):
             self.pixel[x, self.image_height/2] = tuple(map(lambda p: p+a, self.pixel[x, self.image_height/2]))
@@ -55,11 +55,10 @@ class WaveformTransparent(Waveform):
         if len(frames) != 1:
             buffer = frames[:,0]
             buffer.shape = (len(buffer),1)
-            for samples, end in self.pixels_adapter.process(buffer, eod):
-                if self.pixel_cursor < self.image_width-1:
-                    self.draw_peaks_inverted(self.pixel_cursor, peaks(samples), self.line_color)
-                    self.pixel_cursor += 1
-            if self.pixel_cursor == self.image_width-1:
-                self.draw_peaks_inverted(self.pixel_cursor, peaks(samples), self.line_color)
-                self.pixel_cursor += 1
+            self.store_peaks([samples[:,0].copy() for samples, end
+                              in self.pixels_adapter.process(buffer, eod)])
         return frames, eod
+
+    def draw_waveform(self):
+        """Draw the outside of the stored peaks of all the pixel columns"""
+        self.draw_peaks_inverted(self.line_color)
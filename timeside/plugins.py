@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2013 Parisson SARL
+
+# This file is part of TimeSide.
+
+# TimeSide is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+
+# TimeSide is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with TimeSide.  If not, see <http://www.gnu.org/licenses/>.
+
+# The processors of TimeSide are only imported when they are needed, so that
+# importing timeside does not pull in GStreamer, aubio, yaafe, scipy, etc...
+#
+# The processors shipped with TimeSide are listed up front below with the
+# module defining them. get_processor() and processors() from timeside.core
+# import these modules on demand, and the packages of timeside are lazy
+# modules importing their submodules on the first access to one of their
+# attributes. A module which can not be imported, usually because of a
+# missing optional dependency, is skipped and its error kept in the failed
+# dictionary.
+
+import sys
+import types
+import importlib
+
+from timeside.api import IProcessor, IDecoder, IEncoder, IGrapher, \
+    IAnalyzer, IValueAnalyzer
+
+__all__ = ['Plugin', 'PLUGINS', 'failed', 'import_plugin', 'load_plugins',
+           'find_plugin', 'LazyModule', 'lazy_package']
+
+
+class Plugin(object):
+    """Metadata of a processor, known without importing its module"""
+
+    def __init__(self, id, module, name, interface):
+        self.id = id
+        self.module = module
+        self.name = name
+        self.interface = interface
+
+    def __repr__(self):
+        return '<Plugin %s: %s.%s>' % (self.id, self.module, self.name)
+
+
+PLUGINS = [
+    Plugin('gst_dec', 'timeside.decoder.core', 'FileDecoder', IDecoder),
+    Plugin('array_dec', 'timeside.decoder.core', 'ArrayDecoder', IDecoder),
+    Plugin('pcm_dec', 'timeside.decoder.core', 'PCMFileDecoder', IDecoder),
+    Plugin('segment_dec', 'timeside.decoder.core', 'SegmentDecoder',
+           IDecoder),
+
+    Plugin('level', 'timeside.analyzer.level', 'Level', IValueAnalyzer),
+    Plugin('mean_dc_shift', 'timeside.analyzer.dc', 'MeanDCShift',
+           IValueAnalyzer),
+    Plugin('aubio_temporal', 'timeside.analyzer.aubio_temporal',
+           'AubioTemporal', IAnalyzer),
+    Plugin('aubio_pitch', 'timeside.analyzer.aubio_pitch', 'AubioPitch',
+           IAnalyzer),
+    Plugin('aubio_mfcc', 'timeside.analyzer.aubio_mfcc', 'AubioMfcc',
+           IAnalyzer),
+    Plugin('aubio_melenergy', 'timeside.analyzer.aubio_melenergy',
+           'AubioMelEnergy', IAnalyzer),
+    Plugin('aubio_specdesc', 'timeside.analyzer.aubio_specdesc',
+           'AubioSpecdesc', IAnalyzer),
+    Plugin('yaafe', 'timeside.analyzer.yaafe', 'Yaafe', IAnalyzer),
+    Plugin('spectrogram_analyzer', 'timeside.analyzer.spectrogram',
+           'Spectrogram', IAnalyzer),
+    Plugin('waveform_analyzer', 'timeside.analyzer.waveform', 'Waveform',
+           IAnalyzer),
+    Plugin('vamp_simple_host', 'timeside.analyzer.vamp_plugin',
+           'VampSimpleHost', IAnalyzer),
+    Plugin('irit_speech_entropy', 'timeside.analyzer.irit_speech_entropy',
+           'IRITSpeechEntropy', IAnalyzer),
+    Plugin('irit_speech_4hz', 'timeside.analyzer.irit_speech_4hz',
+           'IRITSpeech4Hz', IAnalyzer),
+    Plugin('odf', 'timeside.analyzer.odf', 'OnsetDetectionFunction',
+           IAnalyzer),
+    Plugin('peak_pyramid', 'timeside.analyzer.peak_pyramid', 'PeakPyramid',
+           IAnalyzer),
+
+    Plugin('waveform_simple', 'timeside.grapher.waveform_simple', 'Waveform',
+           IGrapher),
+    Plugin('waveform_centroid', 'timeside.grapher.waveform_centroid',
+           'WaveformCentroid', IGrapher),
+    Plugin('waveform_transparent', 'timeside.grapher.waveform_transparent',
+           'WaveformTransparent', IGrapher),
+    Plugin('waveform_contour_black', 'timeside.grapher.waveform_contour',
+           'WaveformContourBlack', IGrapher),
+    Plugin('waveform_contour_white', 'timeside.grapher.waveform_contour',
+           'WaveformContourWhite', IGrapher),
+    Plugin('spectrogram_log', 'timeside.grapher.spectrogram_log',
+           'SpectrogramLog', IGrapher),
+    Plugin('spectrogram_lin', 'timeside.grapher.spectrogram_lin',
+           'SpectrogramLinear', IGrapher),
+    Plugin('spectrogram_tiles_log', 'timeside.grapher.spectrogram_tiles',
+           'SpectrogramTilesLog', IGrapher),
+    Plugin('spectrogram_tiles_lin', 'timeside.grapher.spectrogram_tiles',
+           'SpectrogramTilesLinear', IGrapher),
+
+    Plugin('gst_multi_enc', 'timeside.encoder.core', 'MultiEncoder',
+           IProcessor),
+    Plugin('gst_vorbis_enc', 'timeside.encoder.ogg', 'VorbisEncoder',
+           IEncoder),
+    Plugin('gst_wav_enc', 'timeside.encoder.wav', 'WavEncoder', IEncoder),
+    Plugin('gst_mp3_enc', 'timeside.encoder.mp3', 'Mp3Encoder', IEncoder),
+    Plugin('gst_flac_enc', 'timeside.encoder.flac', 'FlacEncoder', IEncoder),
+    Plugin('gst_aac_enc', 'timeside.encoder.m4a', 'AacEncoder', IEncoder),
+    Plugin('gst_webm_enc', 'timeside.encoder.webm', 'WebMEncoder', IEncoder),
+    ]
+
+# Modules which could not be imported, with their error message
+failed = {}
+
+
+def import_plugin(module):
+    """Import a module of processors, return whether it could be imported"""
+    if module in sys.modules:
+        return sys.modules[module] is not None
+    if module in failed:
+        return False
+    try:
+        importlib.import_module(module)
+    except ImportError, e:
+        failed[module] = str(e)
+        return False
+    return True
+
+
+def load_plugins(interface=IProcessor, recurse=True):
+    """Import the modules of the plugins implementing interface and, if
+    recurse, any of the descendants of this interface"""
+    for plugin in PLUGINS:
+        if plugin.interface is interface or \
+                (recurse and issubclass(plugin.interface, interface)):
+            import_plugin(plugin.module)
+
+
+def find_plugin(processor_id):
+    """Return the plugin of a processor id, or None if it is unknown"""
+    for plugin in PLUGINS:
+        if plugin.id == processor_id:
+            return plugin
+    return None
+
+
+class LazyModule(types.ModuleType):
+    """Package importing its submodules on the first access to their
+    attributes.
+
+    The lazy attributes maps the names exported by the package to the
+    submodule defining them. Any other missing attribute, as well as
+    __all__, imports all the submodules and exports their public names like
+    a "from submodule import *" would."""
+
+    def __getattr__(self, name):
+        lazy = self.__dict__.get('_lazy_attributes', {})
+        if name in lazy:
+            module = importlib.import_module(self.__name__ + '.' + lazy[name])
+            if lazy[name] == name:
+                value = module
+            else:
+                value = getattr(module, name)
+            setattr(self, name, value)
+            return value
+        if name.startswith('__') and name != '__all__':
+            raise AttributeError(name)
+        self._load_all()
+        if name == '__all__':
+            return [key for key in self.__dict__ if not key.startswith('_')]
+        try:
+            return self.__dict__[name]
+        except KeyError:
+            raise AttributeError("'module' object has no attribute '%s'"
+                                 % name)
+
+    def __dir__(self):
+        return sorted(set(self.__dict__) |
+                      set(self.__dict__.get('_lazy_attributes', {})))
+
+    def _load_all(self):
+        if self.__dict__.get('_lazy_loaded'):
+            return
+        self._lazy_loaded = True
+        lazy = self.__dict__.get('_lazy_attributes', {})
+        for submodule in sorted(set(lazy.values())):
+            name = self.__name__ + '.' + submodule
+            if not import_plugin(name):
+                continue
+            module = sys.modules[name]
+            if submodule in lazy:
+                continue
+            names = getattr(module, '__all__', None)
+            if names is None:
+                names = [key for key in module.__dict__
+                         if not key.startswith('_')]
+            for key in names:
+                if key not in self.__dict__:
+                    setattr(self, key, getattr(module, key))
+        # the names given to the package take precedence
+        for key, submodule in lazy.items():
+            name = self.__name__ + '.' + submodule
+            if key != submodule and sys.modules.get(name) is not None:
+                setattr(self, key, getattr(sys.modules[name], key))
+
+
+def lazy_package(name, attributes):
+    """Turn the module of a package into a LazyModule, given the names it
+    exports and the submodule defining each of them. A name mapped to itself
+    is a submodule."""
+    module = sys.modules[name]
+    package = LazyModule(name, module.__doc__)
+    package.__dict__.update(module.__dict__)
+    package._lazy_attributes = attributes
+    # keep the globals of the original module alive
+    package._lazy_module = module
+    sys.modules[name] = package
+    return package
@@ -37,44 +37,285 @@
 # Author: Guillaume Pellerin <yomguy@parisson.com>
 
 import os
+import time
+import contextlib
+import errno
+import hashlib
+import tempfile
+import threading
 import xml.dom.minidom
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
 
 class Cache(object):
-    
-    def __init__(self, dir, params=None):
+    """
+    On-disk cache of binary files such as rendered images and encoded streams
+
+    Files are stored in a sharded layout, dir/ab/cd/file where abcd are the
+    first digits of the SHA-1 of the file name, and are written to a temporary
+    file renamed once complete, so that readers never see a partial file.
+    Files of the former flat layout, dir/file, are still found.
+
+    The paths, sizes and last access times of the files are kept in an index
+    file, a journal to which each process appends the files it writes, reads
+    or removes, under a lock file shared by the processes. Every process
+    holds the index in memory and only reads the lines appended since its
+    last read, so that no operation walks the cache directory. The directory
+    is only walked once, to create the index file of a former cache, and the
+    journal is compacted once it holds too many stale lines. Files copied
+    into the directory by other means are indexed when they are looked up.
+
+    When the cache grows over max_size bytes, the least recently used files
+    are removed, under the lock file so that a single process evicts at a
+    time. The file just written is never evicted, even if it is larger than
+    max_size. The hits and misses of exists() are counted.
+
+    Parameters
+    ----------
+    dir : str
+        directory of the cache
+    params : object
+        any parameters of the owner of the cache
+    max_size : int
+        maximum size of the cache in bytes, unbounded if None
+    """
+
+    shard_levels = 2
+    lock_file = '.lock'
+    index_file = '.index'
+    # number of stale lines of the index file triggering its compaction
+    compact_lines = 1000
+
+    def __init__(self, dir, params=None, max_size=None):
         self.dir = dir
         self.params = params
-        self.files = self.get_files()
-        
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.index = {}
+        self.index_size = 0
+        self.index_loaded = False
+        # position of this process in the index file
+        self.index_inode = None
+        self.index_offset = 0
+        self.index_lines = 0
+        self.lock = threading.RLock()
+        if not os.path.isdir(self.dir):
+            os.makedirs(self.dir)
+
+    @property
+    def files(self):
+        return self.get_files()
+
     def get_files(self):
-        list = []
-        for root, dirs, files in os.walk(self.dir):
-            for file in files:
-                list.append(file)
-        return list
-    
+        self.load_index()
+        with self.lock:
+            self.refresh_index()
+            return self.index.keys()
+
+    def path(self, file):
+        """Return the path of a file in the sharded layout"""
+        digest = hashlib.sha1(file).hexdigest()
+        shards = [digest[2*level:2*level + 2]
+                  for level in range(self.shard_levels)]
+        return os.path.join(self.dir, *(shards + [file]))
+
+    @contextlib.contextmanager
+    def locked(self):
+        """Hold the lock file of the cache, shared by the processes, and the
+        lock of the instance"""
+        lock = open(os.path.join(self.dir, self.lock_file), 'a')
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            with self.lock:
+                yield
+        finally:
+            lock.close()
+
+    def load_index(self):
+        """Read the index file, creating it by walking the cache directory
+        if it does not exist yet"""
+        with self.lock:
+            if self.index_loaded:
+                return
+        with self.locked():
+            if self.index_loaded:
+                return
+            if os.path.exists(os.path.join(self.dir, self.index_file)):
+                self.refresh_index()
+            else:
+                for root, dirs, files in os.walk(self.dir):
+                    for file in files:
+                        if file in (self.lock_file, self.index_file) or \
+                                file.endswith('.tmp'):
+                            continue
+                        path = os.path.join(root, file)
+                        # a file of the sharded layout wins over a legacy one
+                        if file in self.index and path != self.path(file):
+                            continue
+                        self._stat(file, path)
+                self.compact_index()
+            self.index_loaded = True
+
+    def refresh_index(self):
+        """Apply the lines appended to the index file since the last read"""
+        path = os.path.join(self.dir, self.index_file)
+        try:
+            f = open(path, 'rb')
+        except IOError:
+            return
+        with f:
+            inode = os.fstat(f.fileno()).st_ino
+            if inode != self.index_inode:
+                # the index file was compacted, read it again
+                self.index = {}
+                self.index_size = 0
+                self.index_inode = inode
+                self.index_offset = 0
+                self.index_lines = 0
+            f.seek(self.index_offset)
+            data = f.read()
+        # only read complete lines
+        data = data[:data.rfind('\n') + 1]
+        self.index_offset += len(data)
+        for line in data.splitlines():
+            fields = line.split('\t')
+            if fields[0] == '+' and len(fields) == 5:
+                self._set(fields[1], os.path.join(self.dir, fields[2]),
+                          int(fields[3]), float(fields[4]))
+            elif fields[0] == '-' and len(fields) == 2:
+                self._remove(fields[1])
+            self.index_lines += 1
+
+    def append_index(self, files):
+        """Append the current entries of files to the index file, removing
+        those which are not indexed, while holding locked()"""
+        lines = []
+        for file in files:
+            entry = self.index.get(file)
+            if entry is None:
+                lines.append('-\t%s\n' % file)
+            else:
+                path, size, atime = entry
+                lines.append('+\t%s\t%s\t%d\t%r\n' % (
+                    file, os.path.relpath(path, self.dir), size, atime))
+        with open(os.path.join(self.dir, self.index_file), 'ab') as f:
+            f.write(''.join(lines))
+        self.refresh_index()
+        if self.index_lines > len(self.index) + self.compact_lines:
+            self.compact_index()
+
+    def compact_index(self):
+        """Rewrite the index file from the index, while holding locked()"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            for file, (path, size, atime) in self.index.items():
+                f.write('+\t%s\t%s\t%d\t%r\n' % (
+                    file, os.path.relpath(path, self.dir), size, atime))
+            self.index_offset = f.tell()
+            self.index_inode = os.fstat(f.fileno()).st_ino
+        os.rename(tmp_path, os.path.join(self.dir, self.index_file))
+        self.index_lines = len(self.index)
+
+    def _stat(self, file, path):
+        """Add a file to the index, return False if it does not exist"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        self._set(file, path, stat.st_size, stat.st_mtime)
+        return True
+
+    def _set(self, file, path, size, atime):
+        self._remove(file)
+        self.index[file] = [path, size, atime]
+        self.index_size += size
+
+    def _remove(self, file):
+        entry = self.index.pop(file, None)
+        if entry is not None:
+            self.index_size -= entry[1]
+
+    def find(self, file):
+        """Return the path of a cached file, or None if it is not cached"""
+        self.load_index()
+        with self.lock:
+            entry = self.index.get(file)
+            if entry is not None and os.path.exists(entry[0]):
+                return entry[0]
+        # the file may have been written by another process, or by other
+        # means than the cache
+        with self.locked():
+            self.refresh_index()
+            self._remove(file)
+            for path in (self.path(file), os.path.join(self.dir, file)):
+                if self._stat(file, path):
+                    self.append_index([file])
+                    return path
+            if entry is not None:
+                self.append_index([file])
+        return None
+
+    def touch(self, file):
+        """Mark a file as recently used"""
+        with self.locked():
+            entry = self.index.get(file)
+            if entry is None:
+                return
+            entry[2] = time.time()
+            self.append_index([file])
+        try:
+            os.utime(entry[0], None)
+        except OSError:
+            pass
+
     def exists(self, file):
-        self.files = self.get_files()
-        return file in self.files
-            
+        found = self.find(file) is not None
+        with self.lock:
+            if found:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return found
+
+    def size(self):
+        """Return the total size of the cached files in bytes"""
+        self.load_index()
+        with self.lock:
+            self.refresh_index()
+            return self.index_size
+
+    def stream_writer(self, file):
+        """Return a CacheWriter, a file object storing file once closed"""
+        return CacheWriter(self, file)
+
     def write_bin(self, data, file):
-        path = self.dir + os.sep + file
-        f = open(path, 'w')
-        f.write(data)
-        f.close()
+        writer = self.stream_writer(file)
+        try:
+            writer.write(data)
+        except:
+            writer.abort()
+            raise
+        writer.close()
 
     def read_bin(self, file):
-        path = self.dir + os.sep + file
-        f = open(path,  'r')
+        path = self.find(file) or self.path(file)
+        f = open(path, 'rb')
         data = f.read()
         f.close()
+        self.touch(file)
         return data
-        
+
     def read_stream_bin(self, file):
-        path = self.dir + os.sep + file
+        path = self.find(file) or self.path(file)
         chunk_size = 0x1000
-        f = open(path,  'r')
+        f = open(path, 'rb')
+        self.touch(file)
         while True:
             _chunk = f.read(chunk_size)
             if not len(_chunk):
@@ -85,10 +326,60 @@ class Cache(object):
     def write_stream_bin(self, chunk, file_object):
         file_object.write(chunk)
 
+    def commit(self, file, tmp_path):
+        """Move a complete temporary file to the path of file"""
+        path = self.path(file)
+        directory = os.path.dirname(path)
+        try:
+            os.makedirs(directory)
+        except OSError, e:
+            if e.errno != errno.EEXIST:
+                raise
+        os.rename(tmp_path, path)
+        legacy_path = os.path.join(self.dir, file)
+        if os.path.exists(legacy_path):
+            os.remove(legacy_path)
+        self.load_index()
+        with self.locked():
+            self.refresh_index()
+            self._set(file, path, os.path.getsize(path), time.time())
+            self.append_index([file])
+        self.evict(keep=file)
+
+    def evict(self, keep=None):
+        """Remove the least recently used files until the cache fits in
+        max_size, but the file keep"""
+        if self.max_size is None:
+            return
+        self.load_index()
+        with self.lock:
+            self.refresh_index()
+            if self.index_size <= self.max_size:
+                return
+        with self.locked():
+            # the other processes may have evicted files meanwhile
+            self.refresh_index()
+            entries = sorted(self.index.items(), key=lambda e: e[1][2])
+            removed = []
+            for file, (path, size, atime) in entries:
+                if self.index_size <= self.max_size:
+                    break
+                if file == keep:
+                    continue
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                self._remove(file)
+                removed.append(file)
+            if removed:
+                self.append_index(removed)
+
     def read_analyzer_xml(self, file):
         list = []
-        path = self.dir + os.sep + file
+        path = self.find(file) or self.path(file)
         doc = xml.dom.minidom.parse(path)
+        self.touch(file)
         for data in doc.documentElement.getElementsByTagName('data') :
             name = data.getAttribute('name')
             id = data.getAttribute('id')
@@ -96,9 +387,8 @@ class Cache(object):
             value = data.getAttribute('value')
             list.append({'name': name, 'id': id, 'unit': unit, 'value': value})
         return list
-        
+
     def write_analyzer_xml(self, data_list, file):
-        path = self.dir + os.sep + file
         doc = xml.dom.minidom.Document()
         root = doc.createElement('telemeta')
         doc.appendChild(root)
@@ -113,6 +403,32 @@ class Cache(object):
             node.setAttribute('unit', unit)
             node.setAttribute('value', str(value))
             root.appendChild(node)
-        f = open(path, "w")
-        f.write(xml.dom.minidom.Document.toprettyxml(doc))
-        f.close()
+        self.write_bin(xml.dom.minidom.Document.toprettyxml(doc), file)
+
+
+class CacheWriter(object):
+    """File object writing a new file of a Cache, which only becomes visible
+    once the writer is closed"""
+
+    def __init__(self, cache, file):
+        self.cache = cache
+        self.file = file
+        fd, self.tmp_path = tempfile.mkstemp(dir=cache.dir, suffix='.tmp')
+        self.file_object = os.fdopen(fd, 'wb')
+
+    def write(self, data):
+        self.file_object.write(data)
+
+    def close(self):
+        if self.file_object.closed:
+            return
+        self.file_object.close()
+        self.cache.commit(self.file, self.tmp_path)
+
+    def abort(self):
+        """Drop the file being written"""
+        self.file_object.close()
+        try:
+            os.remove(self.tmp_path)
+        except OSError:
+            pass
@@ -1,4 +1,5 @@
-from numpy import array, getbuffer, frombuffer
+from numpy import array, getbuffer, frombuffer, ascontiguousarray
+import threading
 
 import pygst
 pygst.require('0.10')
@@ -6,11 +7,18 @@ import gst
 import gobject
 gobject.threads_init()
 
+# Number of idle pipelines of each kind kept by a PipelinePool
+PIPELINE_POOL_SIZE = 4
+
 
 def numpy_array_to_gst_buffer(frames, CHUNK_SIZE, num_samples, SAMPLE_RATE):
+    """ numpy array to gstreamer buffer conversion
+
+    Contiguous float32 frames are handed to gstreamer as they are, so that
+    the samples are only copied once, into the gstreamer buffer """
     from gst import Buffer
-    """ gstreamer buffer to numpy array conversion """
-    buf = Buffer(getbuffer(frames.astype("float32")))
+    frames = ascontiguousarray(frames, dtype='float32')
+    buf = Buffer(getbuffer(frames))
     #Set its timestamp and duration
     buf.timestamp = gst.util_uint64_scale(num_samples, gst.SECOND, SAMPLE_RATE)
     buf.duration = gst.util_uint64_scale(CHUNK_SIZE, gst.SECOND, SAMPLE_RATE)
@@ -18,8 +26,88 @@ def numpy_array_to_gst_buffer(frames, CHUNK_SIZE, num_samples, SAMPLE_RATE):
     return buf
 
 
-def gst_buffer_to_numpy_array(buf, chan):
-    """ gstreamer buffer to numpy array conversion """
-    samples = frombuffer(buf.data, dtype='float32')
-    samples.resize([len(samples)/chan, chan])
-    return samples
+def gst_buffer_to_numpy_array(buf, chan, out=None):
+    """ gstreamer buffer to numpy array conversion
+
+    Return a read-only (frames, chan) view of the buffer memory, or copy
+    the samples into the first rows of out when given and return them """
+    samples = frombuffer(buf, dtype='float32')
+    nb_frames = len(samples) // chan
+    samples = samples[:nb_frames * chan].reshape(nb_frames, chan)
+    if out is None:
+        return samples
+    out[:nb_frames] = samples
+    return out[:nb_frames]
+
+
+class MainloopThread(threading.Thread):
+    """ Thread running a gobject mainloop, which dispatches the messages of
+    the gstreamer buses watched by the decoders and encoders """
+
+    def __init__(self, mainloop):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.mainloop = mainloop
+
+    def run(self):
+        self.mainloop.run()
+
+
+_loop_thread = None
+_loop_lock = threading.Lock()
+
+
+def get_loop_thread():
+    """ Return the mainloop thread shared by the whole process, started on
+    the first call and again if it is not running anymore (eg. in a forked
+    process) """
+    global _loop_thread
+    _loop_lock.acquire()
+    try:
+        if _loop_thread is None or not _loop_thread.is_alive():
+            _loop_thread = MainloopThread(gobject.MainLoop())
+            _loop_thread.start()
+        return _loop_thread
+    finally:
+        _loop_lock.release()
+
+
+class PipelinePool(object):
+    """ Idle gstreamer pipelines, reset and used again instead of being
+    built from scratch. Pipelines are pooled by kind, a key telling apart
+    the pipelines built in different ways, and at most size pipelines of
+    each kind are kept. """
+
+    def __init__(self, size=PIPELINE_POOL_SIZE):
+        self.size = size
+        self.pipelines = {}
+        self.lock = threading.Lock()
+
+    def get(self, kind, factory):
+        """ Return an idle pipeline of the kind, or a new one built by
+        factory() """
+        self.lock.acquire()
+        try:
+            idle = self.pipelines.get(kind)
+            if idle:
+                return idle.pop()
+        finally:
+            self.lock.release()
+        return factory()
+
+    def put(self, kind, pipeline):
+        """ Give back a pipeline in the NULL state """
+        self.lock.acquire()
+        try:
+            idle = self.pipelines.setdefault(kind, [])
+            if len(idle) < self.size:
+                idle.append(pipeline)
+        finally:
+            self.lock.release()
+
+    def clear(self):
+        self.lock.acquire()
+        try:
+            self.pipelines = {}
+        finally:
+            self.lock.release()